@@ -34,6 +34,24 @@ def chinese_to_arabic(chinese_num):
 def get_db_connection():
     return mysql.connector.connect(**DB_CONFIG)
     
+def get_data_version():
+    """返回民法典数据的版本标识（表校验和），数据重建后会变化"""
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("CHECKSUM TABLE catalog, law_articles")
+        return ";".join(f"{table}:{checksum}" for table, checksum in cursor.fetchall())
+    except mysql.connector.Error as e:
+        print(f"数据库错误: {e}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+    
 def format_db_results(results):
     """将数据库查询结果格式化为前端需要的结构化列表"""
     formatted = []
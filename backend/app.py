@@ -5,16 +5,29 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(BASE_DIR))
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from legal_advisor import LegalAdvisor
 from flask_cors import CORS  
 import time
 from datetime import datetime
 import json
+import argparse
+import threading
+
+# 启动参数（可对比冷启动与预热后的首个请求耗时）
+parser = argparse.ArgumentParser()
+parser.add_argument('--warmup', action='store_true', help='启动时预热生成模型后再开始服务')
+parser.add_argument('--static-cache', action='store_true', help='预分配静态KV缓存')
+parser.add_argument('--compile', action='store_true', help='用torch.compile编译模型前向')
+parser.add_argument('--replicas', type=int, default=0, help='生成模型副本进程数（0表示在主进程内生成）')
+parser.add_argument('--threads-per-replica', type=int, default=None, help='每个副本绑定的CPU核心/线程数')
+args, _ = parser.parse_known_args()
 
 app = Flask(__name__)
 CORS(app)  # 添加这行，启用CORS
-advisor = LegalAdvisor()
+# 生成副本以spawn方式启动时会重新导入本模块，所以只在主进程中创建LegalAdvisor
+advisor = None
+first_request_done = False
 
 
 
@@ -40,6 +53,26 @@ def log_message():
         print(f"日志记录错误: {str(e)}")
         return jsonify({"error": "日志记录失败"}), 500
 
+def log_first_request(elapsed):
+    """记录启动后首个请求的耗时，用于比较冷启动与预热"""
+    global first_request_done
+    if not first_request_done:
+        first_request_done = True
+        print(f"首个请求耗时: {elapsed:.2f}s（{'已预热' if args.warmup else '冷启动'}）")
+
+@app.before_request
+def require_advisor():
+    """模型加载（及预热、编译）完成前，除健康检查和日志外的接口都返回503"""
+    if advisor is None and request.endpoint not in ('health', 'log_message'):
+        return jsonify({"error": "服务正在启动，请稍后重试"}), 503
+
+@app.route('/health', methods=['GET'])
+def health():
+    """就绪探针：LegalAdvisor 构造完成（含可选的预热和编译）后才返回ready，之前返回503"""
+    if advisor is None:
+        return jsonify({"status": "loading", "warmup": args.warmup}), 503
+    return jsonify({"status": "ready", "warmup": args.warmup})
+
 @app.route('/ask', methods=['POST'])
 def ask_question():
     data = request.get_json()
@@ -58,35 +91,97 @@ def ask_question():
         
         if advisor.is_search_query(question) or web_search == True:
             print("联网搜索")
-            response, _ ,raw_results = advisor.handle_search_query(question)
+            response, info ,raw_results = advisor.handle_search_query(question)
             print(f"response 类型: {type(response)}")
             print(f"raw_results 类型: {type(raw_results)}")
             print(raw_results)
             
         elif advisor.is_database_query(question):
             print("MySQL")
-            response, _ ,db_results = advisor.handle_database_query(question)
+            response, info ,db_results = advisor.handle_database_query(question)
             print(f"response 类型: {type(response)}")
             print(f"db_results 类型: {type(db_results)}")
             print(db_results)
             
         else:
             print("Chroma")
-            response, _ ,vec_results = advisor.handle_vector_query(question)
+            response, info ,vec_results = advisor.handle_vector_query(question)
             print(f"response 类型: {type(response)}")
             print(f"vec_results 类型: {type(vec_results)}") 
             print(vec_results)     
         
+        log_first_request(time.time() - start_time)
         return jsonify({
             "answer": response,
             "time": f"{time.time()-start_time:.2f}s",
             "search_results": raw_results,
             "vector_results": vec_results,  
-            "database_results": db_results           
+            "database_results": db_results,
+            "generation": info.get("generation"),
+            "packing": info.get("packing")
         })
     
     except Exception as e:
         return jsonify({"error": f"处理问题时出错: {str(e)}"}), 500
 
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """语义答案缓存各路由的命中统计，以及查询向量缓存的命中率（检索器尚未加载时为null）"""
+    stats = advisor.answer_cache.stats() if advisor.answer_cache is not None else {}
+    # 不通过 advisor.retriever 读取，避免统计请求触发嵌入模型和索引的加载
+    retriever = advisor.loaded_retriever
+    stats["query_embedding"] = retriever.cache_stats() if retriever is not None else None
+    return jsonify(stats)
+
+@app.route('/generation_stats', methods=['GET'])
+def generation_stats():
+    """各路由的平均生成长度、当前长度上限，以及按路由/prompt长度区间汇总的生成耗时"""
+    return jsonify({
+        "length": advisor.length_tracker.stats(),
+        "timing": advisor.generation_stats.summary()
+    })
+
+@app.route('/ask_stream', methods=['POST'])
+def ask_question_stream():
+    """流式问答（SSE）：先推送检索结果，再逐段推送生成的文本"""
+    data = request.get_json()
+    question = data.get('question', '').strip()
+    web_search = data.get('web_search', False)
+
+    if not question:
+        return jsonify({"error": "问题不能为空"}), 400
+
+    def generate():
+        try:
+            for event in advisor.stream_query(question, web_search=web_search == True):
+                if event["event"] == "done":
+                    print(f"首字耗时: {event['first_token_time']}, 总耗时: {event['time']}")
+                    log_first_request(float(event['time'].rstrip('s')))
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            error = {"event": "error", "error": f"处理问题时出错: {str(e)}"}
+            yield f"data: {json.dumps(error, ensure_ascii=False)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def load_advisor():
+    global advisor
+    advisor = LegalAdvisor(
+        batch_generation=True,  # 并发请求共享解码批次
+        warmup=args.warmup,
+        static_cache=args.static_cache,
+        compile_model=args.compile,
+        generation_replicas=args.replicas,
+        threads_per_replica=args.threads_per_replica
+    )
+    print(f"法律顾问服务已就绪（{'已预热' if args.warmup else '冷启动'}）")
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # 先开始监听，模型在后台加载；加载完成前 /health 返回503，探针据此判断是否可以接流量
+    threading.Thread(target=load_advisor, daemon=True).start()
+    # 自动重载会让父进程也加载一份模型和副本进程，多副本时关闭
+    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=not args.replicas)
\ No newline at end of file
@@ -0,0 +1,149 @@
+# 按token预算打包检索上下文
+# 三个路由的检索结果先拆成以法条（或段落）为单位的片段，按相关度排序后在预算内尽量多放，
+# 只在法条/句子边界处截断，最后按原文顺序拼接
+
+import re
+
+# 以"第X条"开头的行是一个新法条
+ARTICLE_START = re.compile(r'^第[零一二三四五六七八九十百千万0-9]+条')
+# 句末标点，截断时在这些位置断开
+SENTENCE_END = re.compile(r'(?<=[。；！？\n])')
+
+
+class ContextPacker:
+    def __init__(self, tokenizer, max_tokens=1500):
+        """
+        参数:
+            tokenizer: 生成模型的分词器，用来精确计算token数
+            max_tokens: 背景信息的token预算
+        """
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+
+    def pack_database(self, rows, query):
+        """打包MySQL查询结果（条文查询或章节查询）"""
+        units = []
+        for rank, row in enumerate(rows):
+            if '条文内容' in row:
+                # 章节查询：整章条文被GROUP_CONCAT成一段，拆成单条后按与问题的相关度排序
+                for article in (row['条文内容'] or '').split('\n'):
+                    if article.strip():
+                        units.append(self._unit(
+                            f"{article.strip()} [{row['位置']}]",
+                            _query_overlap(query, article) - rank,
+                            len(units)
+                        ))
+            else:
+                units.append(self._unit(
+                    f"第{row['条文编号']}条 [{row['位置']}]: {row['内容']}",
+                    -rank,
+                    len(units)
+                ))
+        return self._pack(units, "数据库查询结果", query)
+
+    def pack_vector(self, results, query):
+        """打包向量检索结果，块内按法条拆开"""
+        units = []
+        for result in results:
+            metadata = result.get('metadata', {})
+            location = " > ".join(
+                metadata[key] for key in ('section0', 'section1', 'section2', 'section3')
+                if metadata.get(key)
+            )
+            for article in _split_articles(result['content']):
+                units.append(self._unit(
+                    f"{article} [{location}]" if location else article,
+                    result.get('similarity', 0) + 0.1 * _query_overlap(query, article),
+                    len(units)
+                ))
+        return self._pack(units, "检索到的相关法律条文", query)
+
+    def pack_search(self, search_result, query):
+        """打包联网搜索结果（文本或字典），按段落拆分"""
+        if isinstance(search_result, dict):
+            search_result = "\n".join(
+                str(search_result.get(key, '')) for key in ('source', 'title', 'content')
+            )
+        paragraphs = [p.strip() for p in str(search_result).split('\n') if p.strip()]
+        units = [
+            # 网页正文越靠前越相关，同时参考与问题的字面重合度
+            self._unit(paragraph, _query_overlap(query, paragraph) - 0.01 * i, i)
+            for i, paragraph in enumerate(paragraphs)
+        ]
+        return self._pack(units, "联网搜索结果", query)
+
+    def _unit(self, text, score, order):
+        return {"text": text, "score": score, "order": order}
+
+    def _pack(self, units, title, query):
+        """返回 (上下文文本, 统计报告)"""
+        if not units:
+            return "", {"tokens_used": 0, "tokens_dropped": 0, "units_used": 0, "units_dropped": 0}
+
+        token_counts = [
+            len(ids) for ids in
+            self.tokenizer([unit["text"] for unit in units], add_special_tokens=False)["input_ids"]
+        ]
+        for unit, count in zip(units, token_counts):
+            unit["tokens"] = count
+
+        budget = self.max_tokens
+        selected = []
+        for unit in sorted(units, key=lambda u: u["score"], reverse=True):
+            if unit["tokens"] <= budget:
+                selected.append(unit)
+                budget -= unit["tokens"]
+            elif not selected:
+                # 最相关的片段本身就超出预算时，按句子截断而不是整条丢掉
+                truncated = self._truncate(unit, budget)
+                if truncated is not None:
+                    selected.append(truncated)
+                    budget -= truncated["tokens"]
+
+        selected.sort(key=lambda u: u["order"])
+        tokens_used = sum(unit["tokens"] for unit in selected)
+        report = {
+            "tokens_used": tokens_used,
+            "tokens_dropped": sum(token_counts) - tokens_used,
+            "units_used": len(selected),
+            "units_dropped": len(units) - len(selected)
+        }
+        print(f"[上下文打包] 使用 {tokens_used} tokens, 丢弃 {report['tokens_dropped']} tokens "
+              f"({report['units_used']}/{len(units)} 个片段)")
+        context = f"{title}:\n\n" + "\n\n".join(unit["text"] for unit in selected)
+        return context, report
+
+    def _truncate(self, unit, budget):
+        """在句子边界处截断片段，使其不超过预算"""
+        text = ""
+        for sentence in SENTENCE_END.split(unit["text"]):
+            candidate = text + sentence
+            if len(self.tokenizer(candidate, add_special_tokens=False)["input_ids"]) > budget:
+                break
+            text = candidate
+        if not text:
+            return None
+        tokens = len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+        return {**unit, "text": text, "tokens": tokens}
+
+
+def _split_articles(content):
+    """把向量库的分块拆成单个法条，丢掉【标题】【编】等层级行（位置信息另行附加）"""
+    articles = []
+    for line in content.split('\n'):
+        line = line.strip()
+        if not line or line.startswith('【'):
+            continue
+        if ARTICLE_START.match(line) or not articles:
+            articles.append(line)
+        else:
+            articles[-1] += "\n" + line
+    return articles
+
+
+def _query_overlap(query, text):
+    """问题中的字符二元组在文本中出现的比例"""
+    bigrams = {query[i:i + 2] for i in range(len(query) - 1)}
+    if not bigrams:
+        return 0.0
+    return sum(1 for bigram in bigrams if bigram in text) / len(bigrams)
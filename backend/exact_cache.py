@@ -0,0 +1,155 @@
+# 持久化精确缓存（SQLite）
+# 上下文缓存: (路由, 规范化问题) -> 检索结果和prompt
+# 答案缓存:   (路由, 规范化问题, 上下文哈希) -> 回答
+# 数据保存在本地文件中，重启后端后依然有效；向量库或MySQL数据重建后自动失效
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# 问题末尾不影响语义的标点
+TRAILING_PUNCTUATION = "?？!！。.~～ "
+
+
+def normalize_question(question):
+    """规范化问题文本：全角转半角、合并空白、去掉末尾标点、小写"""
+    text = unicodedata.normalize("NFKC", question)
+    text = re.sub(r'\s+', ' ', text).strip().rstrip(TRAILING_PUNCTUATION)
+    return text.lower()
+
+
+def context_hash(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class ExactAnswerCache:
+    def __init__(self, db_path, version_sources=None, version_check_interval=10, ttl=None, on_invalidate=None):
+        """
+        参数:
+            db_path: SQLite文件路径
+            version_sources: {路由: 返回数据版本的函数}，只有提供了版本来源的路由才缓存检索结果
+            version_check_interval: 数据版本的检查间隔（秒），避免每个请求都查询版本
+            ttl: 答案的有效期（秒），None表示只随数据版本失效
+            on_invalidate: 某路由数据版本变化时的回调，参数为路由名
+        """
+        self.version_sources = version_sources or {}
+        self.version_check_interval = version_check_interval
+        self.ttl = ttl
+        self.on_invalidate = on_invalidate
+        self._checked_at = {}  # 路由 -> 上次检查版本的时间
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS context_cache (
+                route TEXT NOT NULL,
+                question TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                results TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (route, question)
+            );
+            CREATE TABLE IF NOT EXISTS answer_cache (
+                route TEXT NOT NULL,
+                question TEXT NOT NULL,
+                context_hash TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (route, question, context_hash)
+            );
+            CREATE TABLE IF NOT EXISTS data_versions (
+                route TEXT PRIMARY KEY,
+                version TEXT
+            );
+        """)
+        self._conn.commit()
+
+    def get_context(self, route, question):
+        """返回缓存的 (prompt, 检索结果)，未命中返回None"""
+        if route not in self.version_sources:
+            return None
+        self._check_version(route)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT prompt, results FROM context_cache WHERE route = ? AND question = ?",
+                (route, normalize_question(question))
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def put_context(self, route, question, prompt, results):
+        if route not in self.version_sources:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO context_cache VALUES (?, ?, ?, ?, ?)",
+                (route, normalize_question(question), prompt,
+                 json.dumps(results, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+
+    def get_answer(self, route, question, prompt):
+        self._check_version(route)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, created_at FROM answer_cache "
+                "WHERE route = ? AND question = ? AND context_hash = ?",
+                (route, normalize_question(question), context_hash(prompt))
+            ).fetchone()
+        if row is None:
+            return None
+        if self.ttl is not None and row[1] < time.time() - self.ttl:
+            return None
+        return row[0]
+
+    def put_answer(self, route, question, prompt, answer):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answer_cache VALUES (?, ?, ?, ?, ?)",
+                (route, normalize_question(question), context_hash(prompt), answer, time.time())
+            )
+            self._conn.commit()
+
+    def clear(self, route=None):
+        with self._lock:
+            if route is None:
+                self._conn.execute("DELETE FROM context_cache")
+                self._conn.execute("DELETE FROM answer_cache")
+            else:
+                self._conn.execute("DELETE FROM context_cache WHERE route = ?", (route,))
+                self._conn.execute("DELETE FROM answer_cache WHERE route = ?", (route,))
+            self._conn.commit()
+
+    def _check_version(self, route):
+        """数据版本变化时清空该路由的缓存"""
+        version_source = self.version_sources.get(route)
+        if version_source is None:
+            return
+        now = time.time()
+        if now - self._checked_at.get(route, 0) < self.version_check_interval:
+            return
+        self._checked_at[route] = now
+
+        version = version_source()
+        if version is None:
+            return  # 数据源不可用时保留缓存
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM data_versions WHERE route = ?", (route,)
+            ).fetchone()
+            if row is not None and row[0] == version:
+                return
+            self._conn.execute("DELETE FROM context_cache WHERE route = ?", (route,))
+            self._conn.execute("DELETE FROM answer_cache WHERE route = ?", (route,))
+            self._conn.execute("INSERT OR REPLACE INTO data_versions VALUES (?, ?)", (route, version))
+            self._conn.commit()
+        if row is not None:
+            print(f"{route} 数据已更新，精确缓存已失效")
+            if self.on_invalidate is not None:
+                self.on_invalidate(route)
@@ -0,0 +1,65 @@
+# 生成长度预算
+# 每个路由有固定的 max_new_tokens 上限，并根据观测到的回答长度学习一个更紧的上限
+
+import threading
+from collections import defaultdict, deque
+import numpy as np
+
+
+class AnswerLengthTracker:
+    def __init__(self, route_budgets, default_budget, window=200, min_samples=20,
+                 percentile=95, headroom=1.25, margin=32):
+        """
+        参数:
+            route_budgets: {路由: max_new_tokens}，学习到的上限不会超过它
+            default_budget: 未配置路由使用的上限
+            window: 每个路由保留最近多少次回答的长度
+            min_samples: 样本数达到后才启用学习到的上限
+            percentile / headroom / margin: 上限 = 长度分位数 * headroom + margin
+        """
+        self.route_budgets = dict(route_budgets or {})
+        self.default_budget = default_budget
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self.headroom = headroom
+        self.margin = margin
+        self._lengths = defaultdict(lambda: deque(maxlen=window))
+        self._totals = defaultdict(lambda: {"count": 0, "tokens": 0})
+        self._learned = {}  # 路由 -> 学习到的上限，每次记录时更新一次
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _route_key(route):
+        """没有路由的请求统一记在 "default" 下"""
+        return route or "default"
+
+    def budget(self, route):
+        """当前路由的 max_new_tokens"""
+        route = self._route_key(route)
+        budget = self.route_budgets.get(route, self.default_budget)
+        with self._lock:
+            learned = self._learned.get(route)
+        # 被截断的回答长度等于上限，分位数*headroom会让上限回升，不会越学越短
+        return budget if learned is None else min(budget, learned)
+
+    def record(self, route, num_tokens):
+        route = self._route_key(route)
+        with self._lock:
+            lengths = self._lengths[route]
+            lengths.append(num_tokens)
+            self._totals[route]["count"] += 1
+            self._totals[route]["tokens"] += num_tokens
+            if len(lengths) >= self.min_samples:
+                self._learned[route] = int(np.percentile(lengths, self.percentile) * self.headroom) + self.margin
+
+    def stats(self):
+        with self._lock:
+            routes = list(self._totals)
+        return {
+            route: {
+                "count": self._totals[route]["count"],
+                "avg_tokens": self._totals[route]["tokens"] / self._totals[route]["count"],
+                "budget": self.budget(route)
+            }
+            for route in routes
+        }
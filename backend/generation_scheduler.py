@@ -0,0 +1,288 @@
+# 连续批处理生成调度器
+# 所有并发请求共享一个解码批次，请求在token边界加入/离开批次
+
+import queue
+import threading
+import torch
+from transformers import DynamicCache
+from transformers.generation.logits_process import (
+    LogitsProcessorList,
+    TemperatureLogitsWarper,
+    TopKLogitsWarper,
+    TopPLogitsWarper
+)
+
+
+class GenerationRequest:
+    """一次排队中的生成请求"""
+
+    def __init__(self, input_ids, max_new_tokens, streamer=None, past_key_values=None, stop_strings=None):
+        self.input_ids = input_ids          # 形状 [1, L] 的prompt token
+        self.max_new_tokens = max_new_tokens
+        self.streamer = streamer            # 可选，与 model.generate 的 streamer 接口一致
+        self.past_key_values = past_key_values  # 可选，已prefill的前缀KV缓存
+        self.stop_strings = stop_strings or []  # 生成文本出现这些字符串时结束
+        self.output_ids = []                # 已生成的token
+        self.error = None
+        self._done = threading.Event()
+
+    def finish(self, error=None):
+        self.error = error
+        if self.streamer is not None:
+            self.streamer.end()
+        self._done.set()
+
+    def result(self, timeout=None):
+        """阻塞等待生成完成，返回生成的token列表"""
+        if not self._done.wait(timeout):
+            raise TimeoutError("生成请求超时")
+        if self.error is not None:
+            raise self.error
+        return self.output_ids
+
+
+class GenerationScheduler:
+    """连续批处理调度器
+
+    后台线程循环执行：
+    1. 接纳新请求：单独prefill，得到第一个token后把KV缓存左填充并入运行批次
+    2. 批量解码一步：所有运行中的序列各生成一个token
+    3. 移除已结束（EOS或达到长度上限）的序列，并裁掉全为填充的左侧列
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size=8):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+
+        generation_config = model.generation_config
+        eos_token_id = generation_config.eos_token_id
+        if eos_token_id is None:
+            eos_token_id = tokenizer.eos_token_id
+        self.eos_token_ids = set(eos_token_id if isinstance(eos_token_id, list) else [eos_token_id])
+        self.do_sample = bool(generation_config.do_sample)
+        self.logits_warpers = self._build_logits_warpers(generation_config)
+
+        self._pending = queue.Queue()
+        self._active = []             # 运行批次中的请求，顺序与批次维一致
+        self._cache = None            # 运行批次的 DynamicCache
+        self._attention_mask = None   # [B, T]，左侧填充处为0
+        self._next_tokens = None      # [B, 1]，已采样但尚未写入KV缓存的token
+        self._stopped = False
+
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, input_ids, max_new_tokens, streamer=None, past_key_values=None, stop_strings=None):
+        """提交一个prompt（[1, L]的token张量），返回 GenerationRequest
+
+        past_key_values 为prompt开头部分的KV缓存时，只prefill剩余的token
+        """
+        request = GenerationRequest(input_ids, max_new_tokens, streamer, past_key_values, stop_strings)
+        self._pending.put(request)
+        return request
+
+    def generate(self, input_ids, max_new_tokens, streamer=None, past_key_values=None, stop_strings=None):
+        """提交并等待完成，返回生成的token列表"""
+        return self.submit(input_ids, max_new_tokens, streamer, past_key_values, stop_strings).result()
+
+    def is_idle(self):
+        """没有运行中和排队中的请求"""
+        return not self._active and self._pending.empty()
+
+    def shutdown(self):
+        self._stopped = True
+        self._pending.put(None)
+        self._thread.join()
+
+    def _build_logits_warpers(self, generation_config):
+        warpers = LogitsProcessorList()
+        if not self.do_sample:
+            return warpers
+        if generation_config.temperature is not None and generation_config.temperature != 1.0:
+            warpers.append(TemperatureLogitsWarper(generation_config.temperature))
+        if generation_config.top_k is not None and generation_config.top_k != 0:
+            warpers.append(TopKLogitsWarper(generation_config.top_k))
+        if generation_config.top_p is not None and generation_config.top_p < 1.0:
+            warpers.append(TopPLogitsWarper(generation_config.top_p))
+        return warpers
+
+    def _loop(self):
+        while not self._stopped:
+            # 批次为空时阻塞等待新请求
+            block = not self._active
+            try:
+                self._admit_pending(block)
+                if self._active:
+                    self._decode_step()
+            except Exception as e:
+                # 出错时让批次中的请求全部失败，调度器继续服务后续请求
+                for request in self._active:
+                    request.finish(e)
+                self._reset_batch()
+
+    def _admit_pending(self, block):
+        while len(self._active) < self.max_batch_size:
+            try:
+                request = self._pending.get(block=block)
+            except queue.Empty:
+                return
+            block = False
+            if request is None:
+                return
+            try:
+                self._prefill(request)
+            except Exception as e:
+                request.finish(e)
+
+    @torch.no_grad()
+    def _prefill(self, request):
+        input_ids = request.input_ids.to(self.model.device)
+        if request.streamer is not None:
+            request.streamer.put(input_ids.cpu())
+
+        cache = request.past_key_values if request.past_key_values is not None else DynamicCache()
+        cached_len = cache.get_seq_length()
+        outputs = self.model(
+            input_ids=input_ids[:, cached_len:],
+            attention_mask=torch.ones_like(input_ids),
+            past_key_values=cache,
+            use_cache=True
+        )
+        next_token = self._sample(input_ids, outputs.logits[:, -1, :])
+        if self._append_token(request, next_token[0].item()):
+            return
+
+        self._merge_into_batch(
+            request,
+            outputs.past_key_values,
+            torch.ones_like(input_ids),
+            next_token.view(1, 1)
+        )
+
+    @torch.no_grad()
+    def _decode_step(self):
+        attention_mask = torch.cat(
+            [self._attention_mask, self._attention_mask.new_ones((len(self._active), 1))],
+            dim=1
+        )
+        # 左填充时每个序列的位置编号从第一个真实token开始计
+        position_ids = attention_mask.sum(dim=1, keepdim=True) - 1
+        outputs = self.model(
+            input_ids=self._next_tokens,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=self._cache,
+            use_cache=True
+        )
+        self._cache = outputs.past_key_values
+        self._attention_mask = attention_mask
+
+        next_tokens = self._sample(self._next_tokens, outputs.logits[:, -1, :])
+        self._next_tokens = next_tokens.view(-1, 1)
+
+        keep = []
+        for row, request in enumerate(self._active):
+            if not self._append_token(request, next_tokens[row].item()):
+                keep.append(row)
+        if len(keep) < len(self._active):
+            self._select_rows(keep)
+
+    def _sample(self, input_ids, logits):
+        logits = logits.float()
+        if not self.do_sample:
+            return logits.argmax(dim=-1)
+        logits = self.logits_warpers(input_ids, logits)
+        probs = torch.softmax(logits, dim=-1)
+        return torch.multinomial(probs, num_samples=1).squeeze(1)
+
+    def _append_token(self, request, token_id):
+        """记录新token，返回该请求是否已结束"""
+        request.output_ids.append(token_id)
+        if request.streamer is not None:
+            request.streamer.put(torch.tensor([token_id]))
+        if (token_id in self.eos_token_ids
+                or len(request.output_ids) >= request.max_new_tokens
+                or self._hit_stop_string(request)):
+            request.finish()
+            return True
+        return False
+
+    def _hit_stop_string(self, request):
+        if not request.stop_strings:
+            return False
+        # 只解码末尾几个token。字节级BPE中一个字符可能被拆成多个token，但每个普通token至少对应一个字节，
+        # 窗口取最长停止字符串的UTF-8字节数（多留一个token给前面的残余字节），一定能覆盖整个停止字符串
+        window = max(len(stop.encode("utf-8")) for stop in request.stop_strings) + 1
+        tail = self.tokenizer.decode(request.output_ids[-window:], skip_special_tokens=True)
+        return any(stop in tail for stop in request.stop_strings)
+
+    def _merge_into_batch(self, request, cache, attention_mask, next_token):
+        if not self._active:
+            self._active = [request]
+            self._cache = cache
+            self._attention_mask = attention_mask
+            self._next_tokens = next_token
+            return
+
+        batch_len = self._attention_mask.shape[1]
+        new_len = attention_mask.shape[1]
+        target_len = max(batch_len, new_len)
+
+        keys, values = [], []
+        for layer_idx in range(len(self._cache.key_cache)):
+            keys.append(torch.cat([
+                _left_pad(self._cache.key_cache[layer_idx], target_len - batch_len, dim=2),
+                _left_pad(cache.key_cache[layer_idx], target_len - new_len, dim=2)
+            ], dim=0))
+            values.append(torch.cat([
+                _left_pad(self._cache.value_cache[layer_idx], target_len - batch_len, dim=2),
+                _left_pad(cache.value_cache[layer_idx], target_len - new_len, dim=2)
+            ], dim=0))
+
+        self._cache = _build_cache(keys, values)
+        self._attention_mask = torch.cat([
+            _left_pad(self._attention_mask, target_len - batch_len, dim=1),
+            _left_pad(attention_mask, target_len - new_len, dim=1)
+        ], dim=0)
+        self._next_tokens = torch.cat([self._next_tokens, next_token], dim=0)
+        self._active.append(request)
+
+    def _select_rows(self, rows):
+        if not rows:
+            self._reset_batch()
+            return
+
+        index = torch.tensor(rows, device=self._attention_mask.device)
+        attention_mask = self._attention_mask.index_select(0, index)
+        # 裁掉所有剩余序列都是填充的左侧列
+        start = int((attention_mask.sum(dim=0) > 0).nonzero()[0].item())
+
+        keys = [k.index_select(0, index)[:, :, start:] for k in self._cache.key_cache]
+        values = [v.index_select(0, index)[:, :, start:] for v in self._cache.value_cache]
+        self._cache = _build_cache(keys, values)
+        self._attention_mask = attention_mask[:, start:]
+        self._next_tokens = self._next_tokens.index_select(0, index)
+        self._active = [self._active[row] for row in rows]
+
+    def _reset_batch(self):
+        self._active = []
+        self._cache = None
+        self._attention_mask = None
+        self._next_tokens = None
+
+
+def _left_pad(tensor, pad_len, dim):
+    """在指定维度左侧补零"""
+    if pad_len <= 0:
+        return tensor
+    shape = list(tensor.shape)
+    shape[dim] = pad_len
+    return torch.cat([tensor.new_zeros(shape), tensor], dim=dim)
+
+
+def _build_cache(keys, values):
+    cache = DynamicCache()
+    for layer_idx, (key, value) in enumerate(zip(keys, values)):
+        cache.update(key, value, layer_idx)
+    return cache
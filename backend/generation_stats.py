@@ -0,0 +1,96 @@
+# 单次生成的耗时拆分与汇总
+# prefill 耗时 = 开始生成到第一个新token（连续批处理时包含排队时间），
+# decode 耗时 = 第一个新token到生成结束，按路由和prompt长度区间分别累计
+
+import threading
+import time
+from collections import defaultdict
+from transformers.generation.streamers import BaseStreamer
+
+# prompt长度区间的分界（token数）
+PROMPT_TOKEN_BUCKETS = (512, 1024, 2048)
+
+
+class GenerationTimer(BaseStreamer):
+    """包装streamer记录时间点：model.generate 和 GenerationScheduler 都先put整段prompt，再逐个put新token"""
+
+    def __init__(self, streamer=None):
+        self.streamer = streamer
+        self.start_time = time.perf_counter()
+        self.first_token_time = None
+        self.end_time = None
+        self._prompt_seen = False
+
+    def put(self, value):
+        if not self._prompt_seen:
+            self._prompt_seen = True
+        elif self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+        if self.streamer is not None:
+            self.streamer.put(value)
+
+    def end(self):
+        self.end_time = time.perf_counter()
+        if self.streamer is not None:
+            self.streamer.end()
+
+    def stats(self, prompt_tokens, generated_tokens):
+        end_time = self.end_time or time.perf_counter()
+        first_token_time = self.first_token_time or end_time
+        prefill_time = first_token_time - self.start_time
+        decode_time = end_time - first_token_time
+        # 第一个token由prefill产生，解码速度按其余token计算
+        decode_tokens = max(generated_tokens - 1, 0)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "generated_tokens": generated_tokens,
+            "prefill_time": round(prefill_time, 4),
+            "decode_time": round(decode_time, 4),
+            "tokens_per_s": round(decode_tokens / decode_time, 2) if decode_time > 0 else 0.0
+        }
+
+
+def prompt_bucket(prompt_tokens):
+    lower = 0
+    for upper in PROMPT_TOKEN_BUCKETS:
+        if prompt_tokens < upper:
+            return f"{lower}-{upper}"
+        lower = upper
+    return f">={lower}"
+
+
+class GenerationStats:
+    """在内存中按 路由 和 路由/prompt长度区间 累计生成耗时"""
+
+    def __init__(self):
+        self._totals = defaultdict(lambda: defaultdict(float))
+        self._lock = threading.Lock()
+
+    def record(self, route, stats):
+        route = route or "default"
+        with self._lock:
+            for key in (route, f"{route}/{prompt_bucket(stats['prompt_tokens'])}"):
+                totals = self._totals[key]
+                totals["count"] += 1
+                for field in ("prompt_tokens", "generated_tokens", "prefill_time", "decode_time"):
+                    totals[field] += stats[field]
+        print(f"[生成耗时] 路由 {route}: prompt {stats['prompt_tokens']} tokens, "
+              f"prefill {stats['prefill_time']:.3f}s, 解码 {stats['generated_tokens']} tokens / "
+              f"{stats['decode_time']:.3f}s ({stats['tokens_per_s']:.1f} tokens/s)")
+
+    def summary(self):
+        with self._lock:
+            totals = {key: dict(value) for key, value in self._totals.items()}
+        summary = {}
+        for key, total in totals.items():
+            count = total["count"]
+            decode_tokens = max(total["generated_tokens"] - count, 0)
+            summary[key] = {
+                "count": int(count),
+                "avg_prompt_tokens": round(total["prompt_tokens"] / count, 1),
+                "avg_generated_tokens": round(total["generated_tokens"] / count, 1),
+                "avg_prefill_time": round(total["prefill_time"] / count, 4),
+                "avg_decode_time": round(total["decode_time"] / count, 4),
+                "tokens_per_s": round(decode_tokens / total["decode_time"], 2) if total["decode_time"] > 0 else 0.0
+            }
+        return summary
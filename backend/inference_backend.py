@@ -0,0 +1,74 @@
+# 推理后端
+# torch: 原始权重（device_map="auto"，有GPU时使用GPU）
+# int8:  CPU上对Linear层做动态int8量化的torch模型
+# onnx:  导出后由ONNX Runtime执行的模型（需要 optimum[onnxruntime]）
+#
+# 导出ONNX模型（在项目根目录运行）:
+#   python backend/inference_backend.py --model ./model/Qwen3-0.6B --output ./model/Qwen3-0.6B-onnx
+
+import argparse
+import os
+import torch
+from transformers import AutoModelForCausalLM
+
+INFERENCE_BACKENDS = ("torch", "int8", "onnx")
+
+
+def load_model(model_path, backend="torch", onnx_model_path=None):
+    """按推理后端加载生成模型
+
+    参数:
+        model_path: 原始模型路径
+        backend: "torch" / "int8" / "onnx"
+        onnx_model_path: ONNX模型目录，不存在时从model_path现场导出
+    """
+    if backend == "torch":
+        return AutoModelForCausalLM.from_pretrained(
+            model_path,
+            torch_dtype="auto",
+            device_map="auto"
+        )
+
+    if backend == "int8":
+        model = AutoModelForCausalLM.from_pretrained(model_path, torch_dtype=torch.float32)
+        model.eval()
+        # 动态量化：权重int8存储，激活在运行时量化，只支持CPU
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    if backend == "onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForCausalLM
+        except ImportError:
+            raise ImportError("ONNX后端需要安装 optimum: pip install optimum[onnxruntime]")
+        if onnx_model_path and os.path.exists(os.path.join(onnx_model_path, "model.onnx")):
+            return ORTModelForCausalLM.from_pretrained(onnx_model_path, use_cache=True)
+        print("未找到导出的ONNX模型，正在从原始权重导出...")
+        model = ORTModelForCausalLM.from_pretrained(model_path, export=True, use_cache=True)
+        if onnx_model_path:
+            model.save_pretrained(onnx_model_path)
+        return model
+
+    raise ValueError(f"不支持的推理后端: {backend}，可选: {', '.join(INFERENCE_BACKENDS)}")
+
+
+def supports_kv_cache_reuse(backend):
+    """前缀KV缓存与连续批处理需要直接操作torch的DynamicCache，ONNX后端不支持"""
+    return backend in ("torch", "int8")
+
+
+def export_onnx(model_path, output_dir):
+    from optimum.onnxruntime import ORTModelForCausalLM
+    from transformers import AutoTokenizer
+
+    model = ORTModelForCausalLM.from_pretrained(model_path, export=True, use_cache=True)
+    model.save_pretrained(output_dir)
+    AutoTokenizer.from_pretrained(model_path).save_pretrained(output_dir)
+    print(f"ONNX模型已导出至: {output_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="导出ONNX Runtime推理模型")
+    parser.add_argument("--model", default="./model/Qwen3-0.6B")
+    parser.add_argument("--output", default="./model/Qwen3-0.6B-onnx")
+    args = parser.parse_args()
+    export_onnx(args.model, args.output)
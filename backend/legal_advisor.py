@@ -1,29 +1,205 @@
 # 从原始main.py中提取LegalAdvisor类，稍作修改
+import os
 import time
-from transformers import AutoModelForCausalLM, AutoTokenizer
-from my_knowledge_base.vector_db import search_vector_db
+from threading import Thread, Lock
+import torch
+from transformers import AutoTokenizer, TextIteratorStreamer, StaticCache
+from my_knowledge_base.vector_db import get_retriever, peek_retriever, get_query_encoder, get_index_version, get_index_path
 from prompt_templates import construct_prompt_template
+from generation_scheduler import GenerationScheduler
+from prefix_cache import PrefixKVCache
+from inference_backend import load_model, supports_kv_cache_reuse
+from semantic_cache import SemanticAnswerCache
+from generation_budget import AnswerLengthTracker
+from generation_stats import GenerationTimer, GenerationStats
+from context_packer import ContextPacker
+from prompt_assembler import PromptAssembler
+from exact_cache import ExactAnswerCache
+from worker_pool import GenerationWorkerPool
 import api_integration.case_search as case_search 
-from MySQL.search import search_law 
+from MySQL.search import search_law, get_data_version
 import re
 
+# 持久化精确缓存的默认位置（backend目录下，与启动时的工作目录无关）
+EXACT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "answer_cache.sqlite3")
+
+# 使用语义答案缓存的路由；联网搜索的结果随时间变化，不按语义复用旧回答
+SEMANTIC_CACHE_ROUTES = ("database", "vector")
+
+# 人设要求每个回答以这句话结尾，生成到这里即可停止
+ANSWER_STOP_STRINGS = ("(*^▽^*)",)
+
+# 预热时用来拼接不同长度背景信息的法条
+WARMUP_ARTICLE = "第一千零八十七条　离婚时，夫妻的共同财产由双方协议处理；协议不成的，由人民法院根据财产的具体情况，按照照顾子女、女方和无过错方权益的原则判决。"
+
+# 路由对应的服务名称与前端结果字段
+ROUTE_SERVICES = {"search": "search", "database": "database", "vector": "law"}
+ROUTE_RESULT_FIELDS = {
+    "search": "search_results",
+    "database": "database_results",
+    "vector": "vector_results"
+}
+
 class LegalAdvisor:
     def __init__(self, 
                  model_path="../model/Qwen3-0.6B", 
                  embedding_model_path="../embedding_model/ChatLaw-Text2Vec",
                  vector_db_path="../my_knowledge_base/vector_db/chroma_data",
                  context_chunks=3,
-                 max_new_tokens=1024):
+                 query_embedding_cache_size=1024,
+                 vector_index_backend="chroma",
+                 hybrid_retrieval=False,
+                 context_token_budget=1500,
+                 max_new_tokens=1024,
+                 route_max_new_tokens=None,
+                 stop_strings=ANSWER_STOP_STRINGS,
+                 inference_backend="torch",
+                 onnx_model_path="../model/Qwen3-0.6B-onnx",
+                 batch_generation=False,
+                 max_batch_size=8,
+                 prefix_cache=True,
+                 prompt_lookup_routes=("database", "vector"),
+                 prompt_lookup_num_tokens=10,
+                 semantic_cache=True,
+                 semantic_cache_threshold=0.92,
+                 semantic_cache_size=1000,
+                 semantic_cache_ttl=3600,
+                 exact_cache_path=EXACT_CACHE_PATH,
+                 static_cache=False,
+                 static_cache_len=4096,
+                 compile_model=False,
+                 warmup=False,
+                 warmup_lengths=(128, 512, 1500),
+                 generation_replicas=0,
+                 threads_per_replica=None):
         self.tokenizer = AutoTokenizer.from_pretrained(model_path)
-        self.model = AutoModelForCausalLM.from_pretrained(
-            model_path,
-            torch_dtype="auto",
-            device_map="auto"
-        )
+        # 固定的模板片段预先分词，每个请求只分词检索内容和问题
+        self.prompt_assembler = PromptAssembler(self.tokenizer)
+        self.inference_backend = inference_backend
+        # 多副本生成：每个副本进程加载自己的模型并绑定CPU核心，主进程只负责检索、缓存和分发
+        self.worker_pool = None
+        if generation_replicas:
+            self.worker_pool = GenerationWorkerPool(
+                generation_replicas,
+                threads_per_replica,
+                advisor_kwargs={
+                    "model_path": model_path,
+                    "context_token_budget": None,
+                    "max_new_tokens": max_new_tokens,
+                    "route_max_new_tokens": route_max_new_tokens,
+                    "stop_strings": stop_strings,
+                    "inference_backend": inference_backend,
+                    "onnx_model_path": onnx_model_path,
+                    "batch_generation": batch_generation,
+                    "max_batch_size": max_batch_size,
+                    "prefix_cache": prefix_cache,
+                    "prompt_lookup_routes": prompt_lookup_routes,
+                    "prompt_lookup_num_tokens": prompt_lookup_num_tokens,
+                    "semantic_cache": False,
+                    "exact_cache_path": None,
+                    "static_cache": static_cache,
+                    "static_cache_len": static_cache_len,
+                    "compile_model": compile_model,
+                    "warmup": warmup,
+                    "warmup_lengths": warmup_lengths
+                }
+            )
+            self.model = None
+            # 以下优化都在副本进程内生效
+            prefix_cache = batch_generation = static_cache = compile_model = warmup = False
+            prompt_lookup_routes = ()
+        else:
+            # 推理后端: torch / int8（CPU动态量化）/ onnx（ONNX Runtime）
+            self.model = load_model(model_path, inference_backend, onnx_model_path)
+        if not supports_kv_cache_reuse(inference_backend) and (prefix_cache or batch_generation):
+            print(f"{inference_backend} 后端不支持前缀KV缓存和连续批处理，已关闭")
+            prefix_cache = False
+            batch_generation = False
+        if inference_backend == "onnx":
+            prompt_lookup_routes = ()  # ORT模型不支持辅助解码
+            static_cache = compile_model = False
+
+        # 预先分配的静态KV缓存：直接调用generate时复用，避免每个请求重新分配显存/内存
+        self.static_cache = None
+        self._static_cache_lock = Lock()
+        if static_cache:
+            self.static_cache = StaticCache(
+                config=self.model.config,
+                max_batch_size=1,
+                max_cache_len=static_cache_len,
+                device=self.model.device,
+                dtype=self.model.dtype
+            )
+            prompt_lookup_routes = ()  # 辅助解码需要动态缓存
+        if compile_model:
+            if not static_cache:
+                print("未开启静态KV缓存，输入长度变化会导致torch.compile反复重新编译")
+            mode = "reduce-overhead" if self.model.device.type == "cuda" else "default"
+            self.model.forward = torch.compile(self.model.forward, mode=mode)
         self.embedding_model_path = embedding_model_path
         self.vector_db_path = vector_db_path
         self.context_chunks = context_chunks
+        self.query_embedding_cache_size = query_embedding_cache_size
+        # 向量索引后端：chroma / flat（NumPy平铺索引）/ faiss（IVF索引）
+        self.vector_index_backend = vector_index_backend
+        # 向量检索与BM25关键词检索做倒数排名融合（需先构建BM25索引）
+        self.hybrid_retrieval = hybrid_retrieval
+        # 背景信息按token预算打包，None表示直接把检索结果原样放进提示
+        self.context_packer = ContextPacker(self.tokenizer, context_token_budget) if context_token_budget else None
         self.max_new_tokens = max_new_tokens
+        # 各路由的生成长度上限（未配置的路由使用max_new_tokens），并根据实际回答长度自动收紧
+        self.length_tracker = AnswerLengthTracker(
+            route_max_new_tokens if route_max_new_tokens is not None
+            else {"search": 768, "database": 512, "vector": 512},
+            default_budget=max_new_tokens
+        )
+        # 每次生成的prompt长度、prefill/解码耗时，按路由和prompt长度区间汇总
+        self.generation_stats = GenerationStats()
+        self.stop_strings = list(stop_strings or [])
+        # 这些路由的回答大量引用检索内容，默认开启prompt lookup解码
+        self.prompt_lookup_routes = set(prompt_lookup_routes or ())
+        self.prompt_lookup_num_tokens = prompt_lookup_num_tokens
+
+        # 人设前缀的KV缓存：启动时计算一次，每个请求只prefill检索内容和问题
+        self.prefix_cache = None
+        if prefix_cache:
+            self.prefix_cache = PrefixKVCache(self.model, self.tokenizer, self.prompt_assembler.head_text)
+            print(f"已缓存提示前缀: {len(self.prefix_cache)} tokens")
+
+        # 连续批处理：并发请求共享同一个解码批次
+        self.scheduler = None
+        if batch_generation:
+            self.scheduler = GenerationScheduler(self.model, self.tokenizer, max_batch_size=max_batch_size)
+        # 开启连续批处理时，同一时间只允许一个请求绕过调度器直接generate
+        self._direct_slot = Lock()
+        self._dispatch_lock = Lock()
+
+        # 持久化精确缓存：相同问题在重启后也能直接返回，数据重建后自动失效
+        self.exact_cache = None
+        if exact_cache_path:
+            self.exact_cache = ExactAnswerCache(
+                exact_cache_path,
+                version_sources={
+                    "vector": self._vector_data_version,
+                    "database": get_data_version
+                },
+                on_invalidate=self._on_data_changed
+            )
+
+        # 语义答案缓存：措辞不同的相同问题跳过检索和生成
+        self.answer_cache = None
+        if semantic_cache:
+            self.answer_cache = SemanticAnswerCache(
+                embedding_model_path,
+                threshold=semantic_cache_threshold,
+                max_entries=semantic_cache_size,
+                ttl=semantic_cache_ttl,
+                # 与向量检索共用同一个查询编码器（ONNX导出目录时为量化编码器），不加载第二份模型，也不打开索引
+                embed_texts=lambda texts: get_query_encoder(self.embedding_model_path)(texts)
+            )
+
+        if warmup:
+            self.warmup(warmup_lengths)
     
     def is_search_query(self, query):
         search_keywords = ['最新', '最近', '新闻', '案例', '事件', '政策', '变化', '更新', '发生', '具体','近期']
@@ -41,57 +217,363 @@ class LegalAdvisor:
             for keyword in db_keywords
         )
     
+    def route_query(self, query, web_search=False):
+        """选择问题的处理路由: search / database / vector"""
+        if self.is_search_query(query) or web_search:
+            return "search"
+        if self.is_database_query(query):
+            return "database"
+        return "vector"
+
     #联网搜索
     def handle_search_query(self, query):
-        search_result = case_search.search_and_extract(query)
-        prompt = construct_prompt_template(search_result, query)
-        raw_resluts = self.format_search_results(search_result)
-        response = self._generate_response(prompt)
-        return response, {"service": "search"}, raw_resluts
+        return self._answer_query("search", query)
 
     #数据库搜索
     def handle_database_query(self, query):
-        database_results = search_law(query)      
-        prompt = construct_prompt_template(database_results, query)
-        db_results = self.format_db_results(database_results)
-        response = self._generate_response(prompt)
-        return response, {"service": "database"},db_results
+        return self._answer_query("database", query)
 
     #向量数据库
     def handle_vector_query(self, query):
-        vec_results = self.retrieve_context(query)
-        prompt = construct_prompt_template(vec_results, query)
+        return self._answer_query("vector", query)
+
+    def _answer_query(self, route, query):
+        """检索并生成回答，返回 (回答, 服务信息, 前端展示结果)"""
+        packing = {}
+        cached, prompt, results, embedding = self._lookup_or_prepare(route, query, packing)
+        if cached is not None:
+            return cached
+
+        stats = {}
+        response = self._generate_response(prompt, route, stats)
+        answer = (response, {"service": ROUTE_SERVICES[route]}, results)
+        self._remember_answer(route, query, prompt, answer, embedding)
+        # 生成耗时和上下文打包报告只属于本次请求，不写入缓存
+        return response, {**answer[1], "generation": stats, "packing": packing or None}, results
+
+    def _lookup_or_prepare(self, route, query, packing=None):
+        """依次查找 精确缓存 → 语义缓存，都未命中时执行检索
+
+        返回 (命中的回答或None, prompt, 检索结果, 问题向量)；传入packing字典时，本次执行了检索和打包则填入打包报告
+        """
+        context = None
+        if self.exact_cache is not None:
+            context = self.exact_cache.get_context(route, query)
+            if context is not None:
+                cached = self._lookup_exact_answer(route, query, *context)
+                if cached is not None:
+                    return cached, context[0], context[1], None
+
+        cached, embedding = self._lookup_answer_cache(route, query)
+        if cached is not None:
+            return cached, None, cached[2], embedding
+
+        if context is None:
+            # vector路由直接用语义缓存算好的问题向量检索，不再重复编码
+            context = self._prepare_query(route, query, embedding, packing)
+            if self.exact_cache is not None:
+                self.exact_cache.put_context(route, query, *context)
+                # 联网搜索等不缓存检索结果的路由，检索内容相同时也能命中答案
+                cached = self._lookup_exact_answer(route, query, *context)
+                if cached is not None:
+                    return cached, context[0], context[1], embedding
+        prompt, results = context
+        return None, prompt, results, embedding
+
+    def _lookup_exact_answer(self, route, query, prompt, results):
+        response = self.exact_cache.get_answer(route, query, prompt)
+        if response is None:
+            return None
+        return response, {"service": ROUTE_SERVICES[route], "cache": "exact"}, results
+
+    def _remember_answer(self, route, query, prompt, answer, embedding=None):
+        """把新生成的回答写入精确缓存和语义缓存"""
+        if self.exact_cache is not None:
+            self.exact_cache.put_answer(route, query, prompt, answer[0])
+        self._store_answer_cache(route, query, answer, embedding)
+
+    def _lookup_answer_cache(self, route, query):
+        """返回 (语义缓存命中的回答或None, 问题向量)"""
+        if self.answer_cache is None or route not in SEMANTIC_CACHE_ROUTES:
+            return None, None
+        cached, embedding = self.answer_cache.lookup(route, query)
+        if cached is not None:
+            response, info, results = cached
+            cached = (response, {**info, "cache": "semantic"}, results)
+        return cached, embedding
+
+    def _store_answer_cache(self, route, query, answer, embedding=None):
+        if self.answer_cache is not None and route in SEMANTIC_CACHE_ROUTES:
+            self.answer_cache.store(route, query, answer, embedding)
+
+    def _on_data_changed(self, route):
+        """向量库或MySQL数据重建后，语义缓存中该路由的回答也随之失效"""
+        if self.answer_cache is not None:
+            self.answer_cache.clear(route)
+
+    def _prepare_search_query(self, query, packing=None):
+        search_result = case_search.search_and_extract(query)
+        context = self._pack_context("search", search_result, query, packing)
+        prompt = construct_prompt_template(context, query)
+        return prompt, self.format_search_results(search_result)
+
+    def _prepare_database_query(self, query, packing=None):
+        database_results = search_law(query)
+        context = self._pack_context("database", database_results, query, packing)
+        prompt = construct_prompt_template(context, query)
+        return prompt, self.format_db_results(database_results)
+
+    def _prepare_vector_query(self, query, embedding=None, packing=None):
+        vec_results = self.retrieve_context(query, embedding)
+        context = self._pack_context("vector", vec_results, query, packing)
+        prompt = construct_prompt_template(context, query)
         # vec_results = self.format_vector_results(vec_results)
-        response = self._generate_response(prompt)
-        return response, {"service": "law"}, vec_results
-    
+        return prompt, vec_results
+
+    def _pack_context(self, route, raw_results, query, packing=None):
+        """把检索结果按token预算打包成背景信息文本；传入packing字典时填入打包报告（使用/丢弃的token数和片段数）"""
+        if self.context_packer is None:
+            return raw_results
+        if route == "search":
+            context, report = self.context_packer.pack_search(raw_results, query)
+        elif route == "database":
+            context, report = self.context_packer.pack_database(raw_results, query)
+        else:
+            context, report = self.context_packer.pack_vector(raw_results, query)
+        if packing is not None:
+            packing.update(report)
+        return context
+
+    #流式问答
+    def stream_query(self, query, web_search=False):
+        """流式处理问题：先返回检索结果，再逐段返回生成的文本
+
+        依次产出事件字典:
+            {"event": "results", "service": ..., "<路由>_results": [...]}
+            {"event": "token", "text": "..."}
+            {"event": "done", "time": "1.23s", "first_token_time": "0.45s", "generation": {...}, "packing": {...}}
+        """
+        start_time = time.time()
+        route = self.route_query(query, web_search)
+        packing = {}
+        cached, prompt, results, embedding = self._lookup_or_prepare(route, query, packing)
+        if cached is not None:
+            response = cached[0]
+        yield {
+            "event": "results",
+            "service": ROUTE_SERVICES[route],
+            ROUTE_RESULT_FIELDS[route]: results,
+            "retrieval_time": f"{time.time()-start_time:.2f}s"
+        }
+
+        first_token_time = None
+        stats = {}
+        if cached is not None:
+            first_token_time = time.time() - start_time
+            yield {"event": "token", "text": response}
+        else:
+            pieces = []
+            for text in self._stream_response(prompt, route, stats):
+                if first_token_time is None:
+                    first_token_time = time.time() - start_time
+                pieces.append(text)
+                yield {"event": "token", "text": text}
+            answer = ("".join(pieces), {"service": ROUTE_SERVICES[route]}, results)
+            self._remember_answer(route, query, prompt, answer, embedding)
+
+        total_time = time.time() - start_time
+        yield {
+            "event": "done",
+            "time": f"{total_time:.2f}s",
+            "first_token_time": f"{(first_token_time if first_token_time is not None else total_time):.2f}s",
+            "generation": stats or None,
+            "packing": packing or None
+        }
+
+    def _prepare_query(self, route, query, embedding=None, packing=None):
+        """执行路由对应的检索，返回 (prompt, 前端展示结果)；embedding 为已算好的问题向量（只用于vector路由）"""
+        if route == "search":
+            return self._prepare_search_query(query, packing)
+        if route == "database":
+            return self._prepare_database_query(query, packing)
+        return self._prepare_vector_query(query, embedding, packing)
+
     #AI生成
-    def _generate_response(self, prompt):
-        messages = [{"role": "user", "content": prompt}]
-        text = self.tokenizer.apply_chat_template(
-            messages,
-            tokenize=False,
-            add_generation_prompt=True,
-            enable_thinking=False
-        )
-        model_inputs = self.tokenizer([text], return_tensors="pt").to(self.model.device)
-        
-        generated_ids = self.model.generate(
-            **model_inputs,
-            max_new_tokens=self.max_new_tokens
-        )
-        return self.tokenizer.decode(
-            generated_ids[0][len(model_inputs.input_ids[0]):], 
+    def _prefix_past_key_values(self, input_ids):
+        """返回可复用的前缀KV缓存拷贝，不可用时返回None（走完整prefill）"""
+        if self.prefix_cache is None:
+            return None
+        return self.prefix_cache.get(input_ids)
+
+    def _build_model_inputs(self, prompt):
+        return self.prompt_assembler.encode(prompt, device=self.model.device)
+
+    def _generate_response(self, prompt, route=None, stats=None, max_new_tokens=None):
+        """生成回答文本；传入stats字典时填入本次生成的token数和耗时
+
+        多副本时由主进程的长度跟踪器（汇总全部副本的回答长度）决定 max_new_tokens，随任务下发给副本
+        """
+        if self.worker_pool is not None:
+            response, worker_stats = self.worker_pool.generate(prompt, route, self.length_tracker.budget(route))
+            self._record_generation(route, worker_stats, stats)
+            return response
+        model_inputs = self._build_model_inputs(prompt)
+        output_ids = self._run_generation(model_inputs, route, max_new_tokens=max_new_tokens, stats=stats)
+        return self.tokenizer.decode(output_ids, skip_special_tokens=True)
+
+    def _stream_response(self, prompt, route=None, stats=None, max_new_tokens=None):
+        """在后台线程中生成，边解码边产出文本片段"""
+        if self.worker_pool is not None:
+            worker_stats = yield from self.worker_pool.stream(prompt, route, self.length_tracker.budget(route))
+            self._record_generation(route, worker_stats, stats)
+            return
+        model_inputs = self._build_model_inputs(prompt)
+        streamer = TextIteratorStreamer(
+            self.tokenizer,
+            skip_prompt=True,
             skip_special_tokens=True
         )
+        errors = []
 
-    def retrieve_context(self, query):
-        results = search_vector_db(
-            query=query,
-            vector_db_path=self.vector_db_path,
-            embedding_model_path=self.embedding_model_path,
-            k=self.context_chunks
+        def run_generate():
+            try:
+                self._run_generation(model_inputs, route, streamer=streamer, max_new_tokens=max_new_tokens, stats=stats)
+            except Exception as e:
+                errors.append(e)
+                streamer.end()  # 结束迭代，避免调用方一直阻塞
+
+        thread = Thread(target=run_generate, daemon=True)
+        thread.start()
+        for text in streamer:
+            if text:
+                yield text
+        thread.join()
+        if errors:
+            raise errors[0]
+
+    def _run_generation(self, model_inputs, route=None, streamer=None, max_new_tokens=None, record=True, stats=None):
+        """执行生成，返回新生成的token列表"""
+        input_ids = model_inputs.input_ids
+        timer = GenerationTimer(streamer)
+        streamer = timer
+        use_prompt_lookup = route in self.prompt_lookup_routes
+        if max_new_tokens is None:
+            max_new_tokens = self.length_tracker.budget(route)
+
+        # 空闲时单请求直接generate（prompt lookup、静态缓存）降低延迟；有并发请求时交给连续批处理提高吞吐。
+        # 检查空闲和占用直连名额在同一把锁内完成，同时到达的请求只有一个能直连，其余进入调度器
+        direct_speedup = use_prompt_lookup or self.static_cache is not None
+        direct = self.scheduler is None
+        future = None
+        if not direct:
+            with self._dispatch_lock:
+                direct = direct_speedup and self.scheduler.is_idle() and self._direct_slot.acquire(blocking=False)
+                if not direct:
+                    future = self.scheduler.submit(
+                        input_ids,
+                        max_new_tokens,
+                        streamer,
+                        self._prefix_past_key_values(input_ids),
+                        self.stop_strings
+                    )
+        if future is not None:
+            output_ids = future.result()
+        else:
+            try:
+                output_ids = self._generate_direct(model_inputs, max_new_tokens, use_prompt_lookup, streamer)
+            finally:
+                if self.scheduler is not None:
+                    self._direct_slot.release()
+
+        if record:
+            self._record_generation(route, timer.stats(input_ids.shape[1], len(output_ids)), stats)
+        return output_ids
+
+    def _record_generation(self, route, generation, stats=None):
+        self.length_tracker.record(route, generation["generated_tokens"])
+        self.generation_stats.record(route, generation)
+        if stats is not None:
+            stats.update(generation)
+
+    def _generate_direct(self, model_inputs, max_new_tokens, use_prompt_lookup, streamer=None):
+        input_ids = model_inputs.input_ids
+        generate_kwargs = {}
+        if use_prompt_lookup:
+            # 回答常常逐字引用检索到的法条，从prompt中按n-gram匹配草拟后续token，一次前向验证多个
+            generate_kwargs["prompt_lookup_num_tokens"] = self.prompt_lookup_num_tokens
+        if self.stop_strings:
+            generate_kwargs["stop_strings"] = self.stop_strings
+            generate_kwargs["tokenizer"] = self.tokenizer
+
+        # 静态缓存同一时间只能给一个请求用，被占用或长度不够时退回动态缓存
+        static_cache = None
+        if (self.static_cache is not None
+                and input_ids.shape[1] + max_new_tokens <= self.static_cache.max_cache_len
+                and self._static_cache_lock.acquire(blocking=False)):
+            static_cache = self.static_cache
+        try:
+            if static_cache is not None:
+                static_cache.reset()
+                if self.prefix_cache is not None and self.prefix_cache.matches(input_ids):
+                    self.prefix_cache.copy_into(static_cache)
+                past_key_values = static_cache
+            else:
+                past_key_values = self._prefix_past_key_values(input_ids)
+
+            generated_ids = self.model.generate(
+                **model_inputs,
+                max_new_tokens=max_new_tokens,
+                past_key_values=past_key_values,
+                streamer=streamer,
+                **generate_kwargs
+            )
+        finally:
+            if static_cache is not None:
+                self._static_cache_lock.release()
+        return generated_ids[0][input_ids.shape[1]:].tolist()
+
+    def warmup(self, lengths=(128, 512, 1500), max_new_tokens=16):
+        """用不同长度的代表性提示跑几次生成，提前完成内核初始化、内存分配和编译"""
+        start_time = time.time()
+        article_tokens = len(self.tokenizer(WARMUP_ARTICLE)["input_ids"])
+        for length in lengths:
+            context = "检索到的相关法律条文:\n\n" + "\n".join([WARMUP_ARTICLE] * max(1, length // article_tokens))
+            model_inputs = self._build_model_inputs(construct_prompt_template(context, "离婚时财产怎么分？"))
+            # vector路由覆盖prompt lookup，search路由覆盖普通解码/连续批处理
+            for route in ("vector", "search"):
+                self._run_generation(model_inputs, route, max_new_tokens=max_new_tokens, record=False)
+        print(f"生成模型预热完成，耗时 {time.time()-start_time:.2f}s")
+
+    def _vector_data_version(self):
+        """vector路由缓存所依赖的数据版本：向量索引，混合检索时加上BM25索引"""
+        version = get_index_version(get_index_path(self.vector_db_path, self.vector_index_backend))
+        if self.hybrid_retrieval and version is not None:
+            version = f"{version}|{get_index_version(get_index_path(self.vector_db_path, 'bm25'))}"
+        return version
+
+    @property
+    def retriever(self):
+        """进程内共享的向量检索器，第一次向量查询时加载"""
+        return get_retriever(
+            self.vector_db_path,
+            self.embedding_model_path,
+            self.query_embedding_cache_size,
+            self.vector_index_backend,
+            self.hybrid_retrieval
+        )
+
+    @property
+    def loaded_retriever(self):
+        """已加载的检索器，还没有向量查询时为None"""
+        return peek_retriever(
+            self.vector_db_path,
+            self.embedding_model_path,
+            self.vector_index_backend,
+            self.hybrid_retrieval
         )
+
+    def retrieve_context(self, query, embedding=None):
+        results = self.retriever.search(query, k=self.context_chunks, query_embedding=embedding)
         return results
     
     def format_db_results(self, results):
@@ -0,0 +1,47 @@
+# 固定提示前缀的KV缓存
+# 人设提示在每个请求中完全相同，启动时prefill一次，之后每个请求复用一份拷贝，只需prefill检索内容和问题
+
+import copy
+import torch
+from transformers import DynamicCache
+
+
+class PrefixKVCache:
+    def __init__(self, model, tokenizer, prefix_text):
+        """
+        参数:
+            prefix_text: 套用对话模板后的固定前缀文本（含 <|im_start|>user 等标记）
+        """
+        self.prefix_ids = tokenizer([prefix_text], return_tensors="pt").input_ids.to(model.device)
+        with torch.no_grad():
+            cache = DynamicCache()
+            model(input_ids=self.prefix_ids, past_key_values=cache, use_cache=True)
+        self.cache = cache
+
+    def __len__(self):
+        return self.prefix_ids.shape[1]
+
+    def matches(self, input_ids):
+        """检查prompt的token是否以缓存的前缀开头"""
+        prefix_len = len(self)
+        return (
+            input_ids.shape[1] > prefix_len
+            and torch.equal(input_ids[0, :prefix_len], self.prefix_ids[0])
+        )
+
+    def get(self, input_ids):
+        """前缀匹配时返回一份缓存拷贝（generate会原地追加），否则返回None"""
+        if not self.matches(input_ids):
+            return None
+        return copy.deepcopy(self.cache)
+
+    def copy_into(self, static_cache):
+        """把前缀KV写入预分配的静态缓存开头（静态缓存应已reset）"""
+        cache_position = torch.arange(len(self), device=self.prefix_ids.device)
+        for layer_idx in range(len(self.cache.key_cache)):
+            static_cache.update(
+                self.cache.key_cache[layer_idx],
+                self.cache.value_cache[layer_idx],
+                layer_idx,
+                {"cache_position": cache_position}
+            )
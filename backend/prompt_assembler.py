@@ -0,0 +1,58 @@
+# 预分词的提示拼装
+# 对话模板开头 + 人设前缀、以及结尾的模板标记每个请求都相同，启动时分词一次；
+# 每个请求只对检索内容和问题所在的中间部分分词，再直接拼接token ID，结果与完整套模板分词一致
+
+import torch
+from transformers import BatchEncoding
+from prompt_templates import construct_prompt_template, PROMPT_PREFIX
+
+# 渲染模板时占位，用来定位用户内容在对话模板中的位置
+SENTINEL = "\x00PROMPT_BODY\x00"
+
+# 用于启动时自检的示例
+SAMPLE_CONTEXT = "检索到的相关法律条文:\n\n第一千零八十七条　离婚时，夫妻的共同财产由双方协议处理。 [第五编　婚姻家庭]"
+SAMPLE_QUERY = "离婚时财产怎么分？"
+
+
+class PromptAssembler:
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        text = self._chat_text(PROMPT_PREFIX + SENTINEL)
+        self.head_text, tail_text = text.split(SENTINEL)
+        # 开头在"【背景信息"之后、"】"之前截断，结尾从 <|im_end|> 特殊标记开始，
+        # 这两个位置在完整提示的分词中都是token边界
+        self.head_ids = self._encode(self.head_text)
+        self.tail_ids = self._encode(tail_text)
+
+        # 自检：与原来的 tokenizer([chat_text]) 结果逐个token比较
+        self.enabled = True
+        sample = construct_prompt_template(SAMPLE_CONTEXT, SAMPLE_QUERY)
+        self.enabled = self.encode_ids(sample) == self.tokenizer([self._chat_text(sample)])["input_ids"][0]
+        if not self.enabled:
+            print("预分词拼装结果与完整分词不一致，已退回完整分词")
+
+    def encode(self, prompt, device=None):
+        """返回与 tokenizer(apply_chat_template(prompt)) 相同的模型输入"""
+        input_ids = torch.tensor([self.encode_ids(prompt)], device=device)
+        return BatchEncoding({
+            "input_ids": input_ids,
+            "attention_mask": torch.ones_like(input_ids)
+        })
+
+    def encode_ids(self, prompt):
+        if not self.enabled or not prompt.startswith(PROMPT_PREFIX):
+            # 不是由统一模板构造的提示，走完整分词
+            return self.tokenizer([self._chat_text(prompt)])["input_ids"][0]
+        body = prompt[len(PROMPT_PREFIX):]
+        return self.head_ids + self._encode(body) + self.tail_ids
+
+    def _encode(self, text):
+        return self.tokenizer(text, add_special_tokens=False)["input_ids"]
+
+    def _chat_text(self, content):
+        return self.tokenizer.apply_chat_template(
+            [{"role": "user", "content": content}],
+            tokenize=False,
+            add_generation_prompt=True,
+            enable_thinking=False
+        )
@@ -0,0 +1,119 @@
+# 语义答案缓存
+# 用ChatLaw-Text2Vec对问题编码，措辞不同但语义相同的问题直接返回已生成的答案
+
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+# 条文编号等数字不同的问题语义向量往往非常接近（如"第5条"与"第6条"），必须完全一致才能命中
+NUMBER_PATTERN = re.compile(r'[零一二三四五六七八九十百千0-9]+')
+
+
+class SemanticAnswerCache:
+    """按路由划分命名空间的语义缓存，LRU + TTL 淘汰"""
+
+    def __init__(self, embedding_model_path, threshold=0.92, max_entries=1000, ttl=3600, embedding_model=None,
+                 embed_texts=None):
+        """
+        参数:
+            embedding_model_path: 句向量模型路径（与向量检索使用同一个模型）
+            threshold: 余弦相似度阈值，达到才算命中
+            max_entries: 每个命名空间最多缓存的问题数
+            ttl: 缓存有效期（秒），None表示不过期
+            embedding_model: 已加载的SentenceTransformer，传入时不再重复加载
+            embed_texts: 批量编码函数（文本列表 -> 向量列表），传入时与检索器共用同一个嵌入模型，不再单独加载
+        """
+        self.embed_texts = embed_texts
+        self.model = None
+        if embed_texts is None:
+            self.model = embedding_model or SentenceTransformer(embedding_model_path)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._namespaces = defaultdict(OrderedDict)  # 路由 -> {问题: 缓存项}
+        self._counters = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._lock = threading.Lock()
+
+    def embed(self, question):
+        if self.model is not None:
+            return self.model.encode(question, normalize_embeddings=True)
+        # 检索器的嵌入函数不一定归一化
+        embedding = np.asarray(self.embed_texts([question])[0], dtype=np.float32)
+        return embedding / max(float(np.linalg.norm(embedding)), 1e-12)
+
+    def lookup(self, route, question):
+        """查找语义相近的已缓存答案
+
+        返回 (缓存值或None, 问题向量)，未命中时可把向量传给store避免重复编码
+        """
+        embedding = self.embed(question)
+        numbers = NUMBER_PATTERN.findall(question)
+        with self._lock:
+            entries = self._namespaces[route]
+            self._evict_expired(entries)
+
+            best_key, best_score = None, self.threshold
+            if entries:
+                keys = list(entries.keys())
+                scores = np.stack([entries[k]["embedding"] for k in keys]) @ embedding
+                for key, score in zip(keys, scores):
+                    if score >= best_score and entries[key]["numbers"] == numbers:
+                        best_key, best_score = key, score
+
+            if best_key is None:
+                self._counters[route]["misses"] += 1
+                return None, embedding
+
+            entries.move_to_end(best_key)
+            self._counters[route]["hits"] += 1
+            print(f"语义缓存命中[{route}]: '{question}' ≈ '{best_key}' ({best_score:.3f})")
+            return entries[best_key]["value"], embedding
+
+    def store(self, route, question, value, embedding=None):
+        if embedding is None:
+            embedding = self.embed(question)
+        with self._lock:
+            entries = self._namespaces[route]
+            entries[question] = {
+                "embedding": embedding,
+                "numbers": NUMBER_PATTERN.findall(question),
+                "value": value,
+                "created_at": time.time()
+            }
+            entries.move_to_end(question)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def clear(self, route=None):
+        with self._lock:
+            if route is None:
+                self._namespaces.clear()
+            else:
+                self._namespaces.pop(route, None)
+
+    def stats(self):
+        """各命名空间的命中/未命中次数和当前条目数"""
+        with self._lock:
+            result = {}
+            for route in set(self._namespaces) | set(self._counters):
+                counter = self._counters[route]
+                total = counter["hits"] + counter["misses"]
+                result[route] = {
+                    "hits": counter["hits"],
+                    "misses": counter["misses"],
+                    "hit_rate": counter["hits"] / total if total else 0.0,
+                    "size": len(self._namespaces.get(route, ()))
+                }
+            return result
+
+    def _evict_expired(self, entries):
+        if self.ttl is None:
+            return
+        deadline = time.time() - self.ttl
+        # OrderedDict按最近使用排序，不一定按创建时间，需要全部检查
+        expired = [key for key, entry in entries.items() if entry["created_at"] < deadline]
+        for key in expired:
+            del entries[key]
@@ -0,0 +1,223 @@
+# 多副本生成进程池
+# 每个副本是一个独立进程，加载一份模型，绑定到一组CPU核心并设置自己的线程数；
+# 主进程负责检索和缓存，把prompt分发给当前在途请求最少的副本；
+# 生成长度上限由主进程汇总全部副本的回答长度学习，随任务一起下发
+
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+# 等待结果时检查副本进程是否存活的间隔（秒）
+LIVENESS_CHECK_INTERVAL = 1.0
+
+
+def assign_cores(num_replicas, threads_per_replica):
+    """把可用CPU核心按顺序切分给各副本，核心不够时循环复用"""
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+    if num_replicas * threads_per_replica > len(cores):
+        print(f"警告: {num_replicas}个副本 × {threads_per_replica}线程 超过可用核心数 {len(cores)}")
+    core_cycle = itertools.cycle(cores)
+    return [
+        sorted({next(core_cycle) for _ in range(threads_per_replica)})
+        for _ in range(num_replicas)
+    ]
+
+
+def _worker_main(worker_id, cores, num_threads, advisor_kwargs, task_queue, result_queue):
+    """副本进程入口：绑核、设置线程数、加载模型，然后循环处理生成任务
+
+    OMP_NUM_THREADS 要在启动进程前设置（spawn 子进程导入主模块时就已加载torch），这里只设置torch线程数
+    """
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    import torch
+    torch.set_num_threads(num_threads)
+    from legal_advisor import LegalAdvisor
+
+    try:
+        advisor = LegalAdvisor(**advisor_kwargs)
+    except Exception as e:
+        result_queue.put(("error", worker_id, f"{type(e).__name__}: {e}"))
+        return
+    result_queue.put(("ready", worker_id, None))
+
+    def run_task(request_id, prompt, route, stream, max_new_tokens):
+        try:
+            stats = {}
+            if stream:
+                pieces = []
+                for text in advisor._stream_response(prompt, route, stats, max_new_tokens):
+                    pieces.append(text)
+                    result_queue.put(("token", request_id, text))
+                result_queue.put(("done", request_id, ("".join(pieces), stats)))
+            else:
+                text = advisor._generate_response(prompt, route, stats, max_new_tokens)
+                result_queue.put(("done", request_id, (text, stats)))
+        except Exception as e:
+            result_queue.put(("error", request_id, f"{type(e).__name__}: {e}"))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        if advisor.scheduler is not None:
+            # 开启连续批处理时每个任务一个线程，同时在途的请求才能被调度器合并成批
+            threading.Thread(target=run_task, args=task, daemon=True).start()
+        else:
+            # 没有调度器时并发直接generate只会互相抢占绑定的核心，逐个处理
+            run_task(*task)
+
+
+class GenerationWorkerPool:
+    def __init__(self, num_replicas, threads_per_replica=None, advisor_kwargs=None):
+        """
+        参数:
+            num_replicas: 模型副本（进程）数
+            threads_per_replica: 每个副本的torch线程数，默认平分全部核心
+            advisor_kwargs: 副本内构造 LegalAdvisor 的参数（只用到生成相关部分）
+        """
+        if threads_per_replica is None:
+            threads_per_replica = max(1, (os.cpu_count() or 1) // num_replicas)
+        self.num_replicas = num_replicas
+        self.threads_per_replica = threads_per_replica
+
+        context = multiprocessing.get_context("spawn")
+        self._result_queue = context.Queue()
+        self._task_queues = []
+        self._processes = []
+        for worker_id, cores in enumerate(assign_cores(num_replicas, threads_per_replica)):
+            task_queue = context.Queue()
+            process = context.Process(
+                target=_worker_main,
+                args=(worker_id, cores, threads_per_replica, advisor_kwargs or {}, task_queue, self._result_queue),
+                daemon=True
+            )
+            # spawn 的子进程继承启动时的环境变量，OpenMP在子进程导入torch时按它确定线程数
+            previous = os.environ.get("OMP_NUM_THREADS")
+            os.environ["OMP_NUM_THREADS"] = str(threads_per_replica)
+            try:
+                process.start()
+            finally:
+                if previous is None:
+                    del os.environ["OMP_NUM_THREADS"]
+                else:
+                    os.environ["OMP_NUM_THREADS"] = previous
+            self._task_queues.append(task_queue)
+            self._processes.append(process)
+            print(f"生成副本 {worker_id}: 核心 {cores}, {threads_per_replica} 线程")
+
+        # 等待所有副本加载完模型；副本在加载阶段崩溃（如内存不足被杀）时不会再发消息，需要检查进程状态
+        ready = 0
+        while ready < num_replicas:
+            try:
+                message = self._result_queue.get(timeout=LIVENESS_CHECK_INTERVAL)
+            except queue.Empty:
+                for worker_id, process in enumerate(self._processes):
+                    if not process.is_alive():
+                        self.shutdown()
+                        raise RuntimeError(f"生成副本 {worker_id} 启动时退出，退出码 {process.exitcode}")
+                continue
+            if message[0] == "error":
+                self.shutdown()
+                raise RuntimeError(f"生成副本启动失败: {message[2]}")
+            ready += 1
+
+        self._in_flight = [0] * num_replicas
+        self._dead = set()  # 已退出的副本编号，不再分发请求
+        self._requests = {}  # request_id -> (副本编号, 结果队列)
+        self._request_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._dispatcher = threading.Thread(target=self._collect_results, daemon=True)
+        self._dispatcher.start()
+
+    def generate(self, prompt, route=None, max_new_tokens=None):
+        """阻塞生成，返回 (回答文本, 生成耗时统计)；max_new_tokens 为None时用副本自己的长度上限"""
+        results = self._submit(prompt, route, stream=False, max_new_tokens=max_new_tokens)
+        kind, payload = results.get()
+        if kind == "error":
+            raise RuntimeError(payload)
+        return payload
+
+    def stream(self, prompt, route=None, max_new_tokens=None):
+        """流式生成，逐段产出文本；结束后通过 StopIteration.value 返回生成耗时统计"""
+        results = self._submit(prompt, route, stream=True, max_new_tokens=max_new_tokens)
+        while True:
+            kind, payload = results.get()
+            if kind == "token":
+                yield payload
+            elif kind == "done":
+                return payload[1]
+            else:
+                raise RuntimeError(payload)
+
+    def load(self):
+        """各副本当前在途请求数"""
+        with self._lock:
+            return list(self._in_flight)
+
+    def shutdown(self):
+        for process, task_queue in zip(self._processes, self._task_queues):
+            if process.is_alive():
+                task_queue.put(None)
+        for process in self._processes:
+            process.join(timeout=LIVENESS_CHECK_INTERVAL * 5)
+            if process.is_alive():
+                process.terminate()
+
+    def _submit(self, prompt, route, stream, max_new_tokens=None):
+        results = queue.Queue()
+        with self._lock:
+            alive = [i for i in range(self.num_replicas) if i not in self._dead]
+            if not alive:
+                raise RuntimeError("所有生成副本均已退出")
+            # 分发给在途请求最少的副本
+            worker_id = min(alive, key=lambda i: self._in_flight[i])
+            self._in_flight[worker_id] += 1
+            request_id = next(self._request_ids)
+            self._requests[request_id] = (worker_id, results)
+        self._task_queues[worker_id].put((request_id, prompt, route, stream, max_new_tokens))
+        return results
+
+    def _collect_results(self):
+        last_check = time.monotonic()
+        while True:
+            # 其他副本持续输出时队列不会空，按时间间隔检查，避免漏掉已退出的副本
+            if time.monotonic() - last_check >= LIVENESS_CHECK_INTERVAL:
+                self._check_replicas()
+                last_check = time.monotonic()
+            try:
+                kind, request_id, payload = self._result_queue.get(timeout=LIVENESS_CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+            with self._lock:
+                if request_id not in self._requests:
+                    continue  # 所属副本已被判定退出，请求已经以错误结束
+                worker_id, results = self._requests[request_id]
+                if kind != "token":
+                    self._in_flight[worker_id] -= 1
+                    del self._requests[request_id]
+            results.put((kind, payload))
+
+    def _check_replicas(self):
+        """发现退出的副本（崩溃、被OOM杀掉）后，让分发给它的请求以错误结束，不再阻塞调用线程"""
+        failed = []
+        with self._lock:
+            for worker_id, process in enumerate(self._processes):
+                if worker_id in self._dead or process.is_alive():
+                    continue
+                self._dead.add(worker_id)
+                print(f"生成副本 {worker_id} 已退出，退出码 {process.exitcode}")
+                for request_id, (owner, results) in list(self._requests.items()):
+                    if owner == worker_id:
+                        del self._requests[request_id]
+                        failed.append((results, f"生成副本 {worker_id} 已退出（退出码 {process.exitcode}）"))
+                self._in_flight[worker_id] = 0
+        for results, message in failed:
+            results.put(("error", message))
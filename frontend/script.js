@@ -108,8 +108,8 @@ function sendMessage() {
     vectorResultsContainer.innerHTML = '';
     databaseResultsContainer.innerHTML = '';
     
-    // 发送请求到后端
-    fetch(`${API_BASE_URL}/ask`, {
+    // 发送请求到后端（流式接口，边生成边显示）
+    fetch(`${API_BASE_URL}/ask_stream`, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json'
@@ -123,31 +123,7 @@ function sendMessage() {
         if (!response.ok) {
             throw new Error(`HTTP错误! 状态码: ${response.status}`);
         }
-        return response.json();
-    })
-    .then(data => {
-        // 移除加载状态
-        removeLoadingMessage();
-        
-        if (data.error) {
-            throw new Error(data.error);
-        }
-        
-        // 添加AI回复
-        addMessage(data.answer, 'ai');
-        
-        // 显示各种类型的结果
-        if (data.search_results && data.search_results.length > 0) {
-            displaySearchResults(data.search_results, resultsContainer, '联网搜索结果');
-        }
-        
-        if (data.vector_results && data.vector_results.length > 0) {
-            displaySearchResults(data.vector_results, vectorResultsContainer, '向量检索结果');
-        }
-        
-        if (data.database_results && data.database_results.length > 0) {
-            displaySearchResults(data.database_results, databaseResultsContainer, '数据库检索结果');
-        }
+        return readEventStream(response, handleStreamEvent());
     })
     .catch(error => {
         // 移除加载状态
@@ -164,6 +140,77 @@ function sendMessage() {
     });
 }
 
+// 逐块读取SSE响应，每解析出一个事件就交给onEvent处理
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    let buffer = '';
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // 事件之间以空行分隔
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            const dataLines = rawEvent.split('\n')
+                .filter(line => line.startsWith('data: '))
+                .map(line => line.slice(6));
+            if (dataLines.length > 0) {
+                onEvent(JSON.parse(dataLines.join('\n')));
+            }
+        }
+    }
+}
+
+// 创建流式事件处理函数（每次提问一个，保存当前回答的DOM）
+function handleStreamEvent() {
+    let answerContent = null;
+    
+    return (data) => {
+        if (data.event === 'error') {
+            throw new Error(data.error);
+        }
+        
+        if (data.event === 'results') {
+            // 检索结果先于回答到达
+            if (data.search_results && data.search_results.length > 0) {
+                displaySearchResults(data.search_results, resultsContainer, '联网搜索结果');
+            }
+            
+            if (data.vector_results && data.vector_results.length > 0) {
+                displaySearchResults(data.vector_results, vectorResultsContainer, '向量检索结果');
+            }
+            
+            if (data.database_results && data.database_results.length > 0) {
+                displaySearchResults(data.database_results, databaseResultsContainer, '数据库检索结果');
+            }
+        } else if (data.event === 'token') {
+            // 收到第一个片段时把“思考中...”替换为回答
+            if (!answerContent) {
+                removeLoadingMessage();
+                answerContent = addMessage('', 'ai');
+            }
+            answerContent.textContent += data.text;
+            chatHistory.scrollTop = chatHistory.scrollHeight;
+        } else if (data.event === 'done') {
+            removeLoadingMessage();
+            if (!answerContent) {
+                answerContent = addMessage('', 'ai');
+            }
+            const stats = document.createElement('div');
+            stats.classList.add('message-stats');
+            stats.textContent = `首字耗时: ${data.first_token_time} | 总耗时: ${data.time}`;
+            answerContent.appendChild(stats);
+            console.log(`首字耗时: ${data.first_token_time}, 总耗时: ${data.time}`);
+        }
+    };
+}
+
 // 添加消息到聊天历史
 function addMessage(content, sender, isTemp = false) {
     const messageDiv = document.createElement('div');
@@ -186,6 +233,8 @@ function addMessage(content, sender, isTemp = false) {
     
     // 滚动到底部
     chatHistory.scrollTop = chatHistory.scrollHeight;
+    
+    return contentDiv;
 }
 
 // 移除加载消息
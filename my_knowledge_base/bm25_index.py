@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+BM25关键词索引（jieba分词）与向量检索的倒数排名融合
+
+纯向量检索容易漏掉精确的法律术语，MySQL的 LIKE '%q%' 又匹配不到换了说法的问题。
+这里对 text_chunker.py 生成的分块建立倒排索引，用BM25打分，再与向量检索结果做RRF融合。
+
+索引目录结构：
+    bm25.npz          term_offsets [V+1]、posting_docs [P]、posting_weights [P]
+                      第t个词的倒排表为 posting_docs[term_offsets[t]:term_offsets[t+1]]，
+                      posting_weights 是建索引时预先算好的BM25分量（idf * tf饱和项），查询只需累加
+    bm25_vocab.json   {"k1": ..., "b": ..., "terms": [按编号排列的词]}
+    documents.bin / offsets.npy / metadata.json   与平铺索引相同的文本和元数据存储
+"""
+
+import json
+import os
+import re
+from collections import Counter
+import numpy as np
+from typing import List, Dict, Union
+
+try:
+    from my_knowledge_base.flat_index import ChunkStore, group_by_filter, top_k, staged_index_dir
+except ImportError:  # 在 my_knowledge_base 目录下直接运行时
+    from flat_index import ChunkStore, group_by_filter, top_k, staged_index_dir
+
+BM25_INDEX_DIR = "bm25_index"  # 相对向量库目录的位置
+BM25_ARRAYS_FILE = "bm25.npz"
+BM25_VOCAB_FILE = "bm25_vocab.json"
+
+# RRF常数，取论文中的常用值
+RRF_K = 60
+
+# 至少包含一个汉字、字母或数字的词才计入索引
+WORD_PATTERN = re.compile(r'[\u4e00-\u9fffA-Za-z0-9]')
+
+
+def tokenize(text: str) -> List[str]:
+    """jieba搜索引擎模式分词，长词会再切出其中的短词，提高法律术语的召回"""
+    import jieba
+    return [
+        token.lower() for token in jieba.lcut_for_search(text)
+        if WORD_PATTERN.search(token)
+    ]
+
+
+def build_bm25_index(index_dir: str, ids: List[str], documents: List[str], metadatas: List[Dict],
+                     k1: float = 1.5, b: float = 0.75) -> None:
+    """对分块分词并写出数组化的BM25倒排索引"""
+    doc_terms = [Counter(tokenize(document)) for document in documents]
+    vocab = {}
+    for terms in doc_terms:
+        for term in terms:
+            vocab.setdefault(term, len(vocab))
+
+    postings = [[] for _ in range(len(vocab))]
+    for doc, terms in enumerate(doc_terms):
+        for term, tf in terms.items():
+            postings[vocab[term]].append((doc, tf))
+
+    num_docs = len(documents)
+    doc_lengths = np.array([sum(terms.values()) for terms in doc_terms], dtype=np.float32)
+    avgdl = float(doc_lengths.mean()) if num_docs else 1.0
+
+    term_offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    term_offsets[1:] = np.cumsum([len(posting) for posting in postings])
+    posting_docs = np.array([doc for posting in postings for doc, _ in posting], dtype=np.int32)
+    posting_tf = np.array([tf for posting in postings for _, tf in posting], dtype=np.float32)
+
+    # 预先计算每个倒排项的BM25分量
+    df = np.diff(term_offsets).astype(np.float32)
+    idf = np.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+    posting_idf = np.repeat(idf, np.diff(term_offsets))
+    norm = k1 * (1 - b + b * doc_lengths[posting_docs] / max(avgdl, 1e-6))
+    posting_weights = posting_idf * posting_tf * (k1 + 1) / (posting_tf + norm)
+
+    with staged_index_dir(index_dir) as staging:
+        ChunkStore.write(staging, ids, documents, metadatas)
+        np.savez(
+            os.path.join(staging, BM25_ARRAYS_FILE),
+            term_offsets=term_offsets,
+            posting_docs=posting_docs,
+            posting_weights=posting_weights.astype(np.float32)
+        )
+        with open(os.path.join(staging, BM25_VOCAB_FILE), 'w', encoding='utf-8') as f:
+            json.dump({"k1": k1, "b": b, "terms": list(vocab)}, f, ensure_ascii=False)
+    print(f"BM25索引已保存至: {index_dir}（{num_docs} 个文档，{len(vocab)} 个词，{len(posting_docs)} 个倒排项）")
+
+
+class BM25Index:
+    """加载到内存的BM25倒排索引，查询时只累加命中词的预计算分量"""
+
+    def __init__(self, index_dir: str):
+        import jieba
+        jieba.initialize()  # 提前加载词典，避免首个查询多等一秒
+        self.index_dir = index_dir
+        self.store = ChunkStore(index_dir)
+        arrays = np.load(os.path.join(index_dir, BM25_ARRAYS_FILE))
+        self.term_offsets = arrays["term_offsets"]
+        self.posting_docs = arrays["posting_docs"]
+        self.posting_weights = arrays["posting_weights"]
+        with open(os.path.join(index_dir, BM25_VOCAB_FILE), 'r', encoding='utf-8') as f:
+            self.vocab = {term: i for i, term in enumerate(json.load(f)["terms"])}
+
+    def __len__(self):
+        return len(self.store)
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.store), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            # 同一个词的倒排表里文档不重复，可以直接按下标累加
+            scores[self.posting_docs[start:end]] += self.posting_weights[start:end]
+        return scores
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 3,
+        filters: Union[Dict[str, Union[str, int]], List[Dict[str, Union[str, int]]]] = None
+    ) -> List[List[Dict]]:
+        """批量BM25检索，只返回至少命中一个词的文档；结果的 bm25_score 为BM25分数"""
+        search_results = [None] * len(queries)
+        for key, indices in group_by_filter(filters, len(queries)).items():
+            rows = self.store.rows(json.loads(key))
+            for query_index in indices:
+                scores = self.scores(queries[query_index])
+                if rows is not None:
+                    scores = scores[rows]
+                best = top_k(scores[None, :], k)[0]
+                results = []
+                for column in best:
+                    if scores[column] <= 0:
+                        break
+                    row = int(rows[column]) if rows is not None else int(column)
+                    result = self.store.result(len(results) + 1, row, 0.0)
+                    del result["similarity"]
+                    result["bm25_score"] = float(scores[column])
+                    results.append(result)
+                search_results[query_index] = results
+        return search_results
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict]], k: int, rrf_k: int = RRF_K) -> List[Dict]:
+    """倒数排名融合：score = Σ 1 / (rrf_k + 排名)，同一分块按文档ID（内容哈希）合并，保留各路的分数字段"""
+    fused = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            key = result.get("id") or result["content"]
+            entry = fused.setdefault(key, {**result, "rrf_score": 0.0})
+            for field, value in result.items():
+                entry.setdefault(field, value)
+            entry["rrf_score"] += 1 / (rrf_k + rank)
+
+    ranked = sorted(fused.values(), key=lambda entry: entry["rrf_score"], reverse=True)[:k]
+    for rank, entry in enumerate(ranked, start=1):
+        entry["rank"] = rank
+    return ranked
+
+
+def candidate_depth(k: int) -> int:
+    """融合前每一路取回的候选数"""
+    return max(4 * k, 20)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+跨重建、跨索引后端复用的磁盘嵌入缓存
+
+切换Chroma/平铺/FAISS后端、调整分块参数后重建时，大部分分块的文本和嵌入模型都没有变，
+不必重新编码。缓存以 (模型标识, 文本哈希) 为键，每个模型一个目录：
+    embeddings.f16      float16 向量按行追加的原始数组，读取时用 np.memmap 映射
+    keys.txt            每行一个文本的SHA-1，行号即向量所在行
+    cache_config.json   向量维度和模型路径
+先写向量再写键，中途中断时多出的向量行没有对应的键，读取时按两者较小的行数截断。
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+from typing import List, Union
+
+EMBEDDING_CACHE_DIR = "embedding_cache"  # 相对向量库目录的位置
+CACHE_VECTORS_FILE = "embeddings.f16"
+CACHE_KEYS_FILE = "keys.txt"
+CACHE_CONFIG_FILE = "cache_config.json"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+# 权重文件：重新训练/微调后大小可能不变，需要额外比较修改时间
+WEIGHT_FILE_SUFFIXES = (".safetensors", ".bin", ".onnx", ".pt", ".pth")
+
+
+def model_identity(embedding_model_path: str) -> str:
+    """模型标识：目录名 + 各文件（含子目录）的相对路径和大小 + 权重文件的修改时间 + 配置文件内容的哈希，
+    换模型、重新导出或替换同样大小的权重后标识随之改变"""
+    path = os.path.abspath(embedding_model_path).rstrip(os.sep)
+    digest = hashlib.sha1(os.path.basename(path).encode("utf-8"))
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full_path = os.path.join(root, name)
+                relative_path = os.path.relpath(full_path, path)
+                stat = os.stat(full_path)
+                digest.update(f"{relative_path}:{stat.st_size}".encode("utf-8"))
+                if name.endswith(WEIGHT_FILE_SUFFIXES):
+                    digest.update(f":{stat.st_mtime_ns}".encode("utf-8"))
+                elif name.endswith(".json"):
+                    with open(full_path, 'rb') as f:
+                        digest.update(f.read())
+    return f"{os.path.basename(path)}-{digest.hexdigest()[:12]}"
+
+
+class EmbeddingCache:
+    """某个嵌入模型的磁盘向量缓存，单进程写入"""
+
+    def __init__(self, cache_root: str, embedding_model_path: str):
+        self.model_id = model_identity(embedding_model_path)
+        self.cache_dir = os.path.join(cache_root, self.model_id)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.embedding_model_path = embedding_model_path
+        self.dim = None
+        self.rows = {}
+        self.vectors = None
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def _load(self) -> None:
+        if not os.path.exists(self._path(CACHE_CONFIG_FILE)):
+            return
+        with open(self._path(CACHE_CONFIG_FILE), 'r', encoding='utf-8') as f:
+            self.dim = json.load(f)["dim"]
+        keys = []
+        if os.path.exists(self._path(CACHE_KEYS_FILE)):
+            with open(self._path(CACHE_KEYS_FILE), 'r', encoding='utf-8') as f:
+                keys = f.read().split()
+        vectors_path = self._path(CACHE_VECTORS_FILE)
+        stored_rows = os.path.getsize(vectors_path) // (self.dim * 2) if os.path.exists(vectors_path) else 0
+        count = min(len(keys), stored_rows)
+        self.rows = {key: row for row, key in enumerate(keys[:count])}
+        self.vectors = np.memmap(vectors_path, dtype=np.float16, mode='r', shape=(count, self.dim)) if count else None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def lookup(self, keys: List[str]) -> List[Union[np.ndarray, None]]:
+        """按文本哈希取缓存的向量（float32），未命中的位置为None"""
+        found = []
+        for key in keys:
+            row = self.rows.get(key)
+            if row is None:
+                self.misses += 1
+                found.append(None)
+            else:
+                self.hits += 1
+                found.append(np.asarray(self.vectors[row], dtype=np.float32))
+        return found
+
+    def add(self, keys: List[str], embeddings: np.ndarray) -> None:
+        """追加新向量，已有的键跳过"""
+        new_rows, new_keys = [], {}
+        for position, key in enumerate(keys):
+            if key not in self.rows and key not in new_keys:
+                new_rows.append(position)
+                new_keys[key] = position
+        if not new_keys:
+            return
+        embeddings = np.asarray(embeddings, dtype=np.float32)[new_rows]
+        if self.dim is None:
+            self.dim = int(embeddings.shape[1])
+            with open(self._path(CACHE_CONFIG_FILE), 'w', encoding='utf-8') as f:
+                json.dump({"dim": self.dim, "model": self.embedding_model_path}, f, ensure_ascii=False)
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(f"向量维度 {embeddings.shape[1]} 与缓存维度 {self.dim} 不一致")
+
+        # 截掉上次中断时多写的向量行，保证行号与键对齐
+        self.vectors = None
+        with open(self._path(CACHE_VECTORS_FILE), 'ab') as f:
+            f.truncate(len(self.rows) * self.dim * 2)
+            f.write(embeddings.astype(np.float16).tobytes())
+        with open(self._path(CACHE_KEYS_FILE), 'a', encoding='utf-8') as f:
+            f.write("".join(f"{key}\n" for key in new_keys))
+        self._load()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self.rows)
+        }
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+建库时的多进程批量编码
+
+collection.add 每次只在一个核心上编码100个文档，全量重建远没有用满CPU。
+这里在写入索引之前，用多个编码进程把全部文档一次性编码好：每个进程加载一份嵌入模型
+（SentenceTransformer或ONNX导出目录），平分CPU核心作为自己的线程数，按大批次领取文档。
+传入磁盘嵌入缓存（embedding_cache.py）时，只有缓存中没有的文本才会进入编码进程。
+"""
+
+import multiprocessing
+import os
+import time
+import numpy as np
+from typing import List
+
+try:
+    from my_knowledge_base.onnx_encoder import OnnxEncoder, is_onnx_encoder
+    from my_knowledge_base.embedding_cache import EmbeddingCache, text_hash
+except ImportError:  # 在 my_knowledge_base 目录下直接运行时
+    from onnx_encoder import OnnxEncoder, is_onnx_encoder
+    from embedding_cache import EmbeddingCache, text_hash
+
+# 编码进程内加载的模型
+_encoder = None
+
+
+def default_num_workers() -> int:
+    """默认编码进程数：每个进程至少4个核心"""
+    return max(1, (os.cpu_count() or 1) // 4)
+
+
+def load_encoder(embedding_model_path: str, num_threads: int = None):
+    """加载嵌入模型：ONNX导出目录用 OnnxEncoder，否则用SentenceTransformer"""
+    if is_onnx_encoder(embedding_model_path):
+        return OnnxEncoder(embedding_model_path, num_threads=num_threads)
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(embedding_model_path, device="cpu")
+
+
+def _init_worker(embedding_model_path: str, num_threads: int) -> None:
+    """编码进程入口：设置torch线程数并加载模型（OMP_NUM_THREADS 在创建进程池前设置，这里导入torch时已经生效）"""
+    import torch
+    torch.set_num_threads(num_threads)
+    global _encoder
+    _encoder = load_encoder(embedding_model_path, num_threads)
+
+
+def _encode_batch(task):
+    texts, encode_batch_size = task
+    return np.asarray(_encoder.encode(texts, batch_size=encode_batch_size), dtype=np.float32)
+
+
+def encode_documents(documents: List[str], embedding_model_path: str, num_workers: int = None,
+                     batch_size: int = 1024, encode_batch_size: int = 64, embedding_function=None,
+                     cache: EmbeddingCache = None) -> np.ndarray:
+    """编码全部文档，返回 [N, D] float32 向量，顺序与输入一致；给定磁盘缓存时先查缓存，只编码未命中的文档
+
+    参数:
+        documents: 文档文本
+        embedding_model_path: 嵌入模型路径或ONNX导出目录
+        num_workers: 编码进程数，默认 CPU核心数/4；1表示在当前进程编码
+        batch_size: 每个进程每次领取的文档数
+        encode_batch_size: 模型单次前向的文档数
+        embedding_function: 单进程编码时直接使用的已加载嵌入函数，避免重复加载模型
+        cache: 磁盘嵌入缓存（EmbeddingCache），新编码的向量会写回缓存
+    """
+    if cache is None:
+        return _encode_uncached(documents, embedding_model_path, num_workers, batch_size,
+                                encode_batch_size, embedding_function)
+
+    keys = [text_hash(document) for document in documents]
+    hits_before = cache.hits
+    cached = cache.lookup(keys)
+    missing = [i for i, embedding in enumerate(cached) if embedding is None]
+    hits = cache.hits - hits_before
+    print(f"嵌入缓存命中: {hits}/{len(documents)}"
+          f"（{hits / len(documents) if documents else 0.0:.1%}，缓存共 {len(cache)} 条）")
+    if missing:
+        computed = _encode_uncached([documents[i] for i in missing], embedding_model_path, num_workers,
+                                    batch_size, encode_batch_size, embedding_function)
+        cache.add([keys[i] for i in missing], computed)
+        for position, i in enumerate(missing):
+            cached[i] = computed[position]
+    if not cached:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.vstack(cached).astype(np.float32)
+
+
+def _encode_uncached(documents: List[str], embedding_model_path: str, num_workers: int = None,
+                     batch_size: int = 1024, encode_batch_size: int = 64, embedding_function=None) -> np.ndarray:
+    num_workers = num_workers or default_num_workers()
+    batches = [documents[i:i + batch_size] for i in range(0, len(documents), batch_size)]
+    if not batches:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    start_time = time.time()
+    done = 0
+    results = []
+
+    def report(batch_embeddings):
+        nonlocal done
+        results.append(batch_embeddings)
+        done += len(batch_embeddings)
+        print(f"编码文档: {done}/{len(documents)}（{done / max(time.time() - start_time, 1e-9):.1f} 文档/s）")
+
+    if num_workers <= 1:
+        if embedding_function is None:
+            model = load_encoder(embedding_model_path)
+            embedding_function = lambda texts: model.encode(texts, batch_size=encode_batch_size)
+        for batch in batches:
+            report(np.asarray(embedding_function(batch), dtype=np.float32))
+        return np.vstack(results)
+
+    num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+    print(f"启动 {num_workers} 个编码进程，每个 {num_threads} 线程，每批 {batch_size} 个文档")
+    context = multiprocessing.get_context("spawn")
+    # 与 backend/worker_pool.py 相同：spawn 的子进程继承创建时的环境变量，OpenMP在子进程导入torch时按它确定线程数
+    previous = os.environ.get("OMP_NUM_THREADS")
+    os.environ["OMP_NUM_THREADS"] = str(num_threads)
+    try:
+        pool = context.Pool(num_workers, initializer=_init_worker, initargs=(embedding_model_path, num_threads))
+    finally:
+        if previous is None:
+            del os.environ["OMP_NUM_THREADS"]
+        else:
+            os.environ["OMP_NUM_THREADS"] = previous
+    with pool:
+        # imap 按提交顺序返回，结果与文档一一对应
+        for batch_embeddings in pool.imap(_encode_batch, [(batch, encode_batch_size) for batch in batches]):
+            report(batch_embeddings)
+    return np.vstack(results)
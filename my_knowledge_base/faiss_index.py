@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+FAISS倒排向量索引（IVF-Flat / IVF-PQ）
+
+知识库扩展到大量法律、司法解释和法规后，分块数会到百万级，单个Chroma集合和精确检索都不再合适。
+IVF先把向量聚成 nlist 个簇，查询时只扫描最近的 nprobe 个簇；IVF-PQ进一步把每个向量
+压缩成 m 个字节级编码，内存占用约为原来的 1/(4*D/m)。
+
+索引目录结构：
+    faiss.index         faiss.write_index 写出的索引，向量编号即行号
+    faiss_config.json   索引类型、检索参数（nprobe）和构建参数（options，追加/同步重建时沿用）
+    documents.bin / offsets.npy / metadata.json   与平铺索引相同的文本和元数据存储
+"""
+
+import json
+import math
+import os
+import shutil
+import threading
+from collections import OrderedDict
+import numpy as np
+from typing import List, Dict, Union
+
+try:
+    from my_knowledge_base.flat_index import (
+        ChunkStore, normalize_rows, group_by_filter, partition_order, top_k, staged_index_dir
+    )
+except ImportError:  # 在 my_knowledge_base 目录下直接运行时
+    from flat_index import ChunkStore, normalize_rows, group_by_filter, partition_order, top_k, staged_index_dir
+
+FAISS_INDEX_FILE = "faiss.index"
+FAISS_CONFIG_FILE = "faiss_config.json"
+FAISS_INDEX_TYPES = ("ivf_flat", "ivf_pq")
+
+# 过滤后行数不超过该值时，取出这些行的向量直接算内积（精确检索），不走IVF的 nprobe 个簇；
+# 小分区的向量散落在很多簇中，只扫描 nprobe 个簇会返回不足k条结果
+EXACT_FILTER_MAX_ROWS = 50000
+# 按过滤条件缓存重建向量的总字节上限（LRU淘汰），超过上限的单个分区每次查询时重建
+FILTER_VECTOR_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def _import_faiss():
+    try:
+        import faiss
+    except ImportError:
+        raise ImportError("FAISS后端需要安装 faiss-cpu: pip install faiss-cpu")
+    return faiss
+
+
+def default_nlist(num_vectors: int) -> int:
+    """簇数取 4*sqrt(N)，并保证每个簇至少有39个训练样本"""
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+
+def default_pq_m(dim: int) -> int:
+    """PQ子空间数：每个子空间8维左右，且必须整除向量维度"""
+    m = max(1, dim // 8)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def make_faiss_index(embeddings, index_type: str = "ivf_flat", nlist: int = None,
+                     pq_m: int = None, pq_bits: int = 8):
+    """训练并填充一个内积（余弦）度量的IVF索引，向量编号为行号"""
+    if index_type not in FAISS_INDEX_TYPES:
+        raise ValueError(f"不支持的FAISS索引类型: {index_type}，可选: {', '.join(FAISS_INDEX_TYPES)}")
+    faiss = _import_faiss()
+    vectors = normalize_rows(embeddings)
+    num_vectors, dim = vectors.shape
+    nlist = nlist or default_nlist(num_vectors)
+
+    quantizer = faiss.IndexFlatIP(dim)
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+    else:
+        # 每个子空间的码本有 2^pq_bits 个中心，训练样本不足时减少位数
+        pq_bits = min(pq_bits, max(1, int(math.log2(max(num_vectors, 2)))))
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m or default_pq_m(dim), pq_bits,
+                                 faiss.METRIC_INNER_PRODUCT)
+    index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def build_faiss_index(index_dir: str, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict],
+                      index_type: str = "ivf_flat", nlist: int = None, nprobe: int = 8,
+                      pq_m: int = None, pq_bits: int = 8) -> None:
+    """训练FAISS索引并连同文本、元数据一起写入索引目录（行按分区排序，与平铺索引一致，写完后整体替换）"""
+    faiss = _import_faiss()
+    order = partition_order(metadatas)
+    index = make_faiss_index(np.asarray(embeddings, dtype=np.float32)[order], index_type, nlist, pq_m, pq_bits)
+    with staged_index_dir(index_dir) as staging:
+        ChunkStore.write(
+            staging,
+            [ids[row] for row in order],
+            [documents[row] for row in order],
+            [metadatas[row] for row in order]
+        )
+        faiss.write_index(index, os.path.join(staging, FAISS_INDEX_FILE))
+        with open(os.path.join(staging, FAISS_CONFIG_FILE), 'w', encoding='utf-8') as f:
+            json.dump({
+                "index_type": index_type,
+                "nlist": index.nlist,
+                "nprobe": nprobe,
+                # 调用时给定的构建参数（nlist等为None表示按数据量取默认值），重建时原样传回 build_faiss_index
+                "options": {"index_type": index_type, "nlist": nlist, "nprobe": nprobe, "pq_m": pq_m, "pq_bits": pq_bits}
+            }, f)
+    print(f"FAISS索引({index_type}, nlist={index.nlist})已保存至: {index_dir}")
+
+
+class FaissIndex:
+    """从索引目录加载的FAISS索引，查询接口与 FlatIndex 相同"""
+
+    def __init__(self, index_dir: str, nprobe: int = None):
+        faiss = _import_faiss()
+        self.index_dir = index_dir
+        self.store = ChunkStore(index_dir)
+        self.index = faiss.read_index(os.path.join(index_dir, FAISS_INDEX_FILE))
+        with open(os.path.join(index_dir, FAISS_CONFIG_FILE), 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+        self.nprobe = nprobe or self.config.get("nprobe", 8)
+        self._faiss = faiss
+        # reconstruct 需要向量编号到簇内位置的映射；加载时建好，避免查询线程并发修改索引
+        self.index.make_direct_map()
+        # 过滤条件 -> 重建的向量，小分区精确检索用，按总字节数LRU淘汰
+        self._filter_vectors = OrderedDict()
+        self._filter_vector_bytes = 0
+        self._filter_lock = threading.Lock()
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def write_options(self) -> Dict:
+        """构建本索引时的 build_faiss_index 参数，重建时沿用；旧版配置没有记录时从索引本身推断"""
+        if "options" in self.config:
+            return dict(self.config["options"])
+        options = {"index_type": self.config["index_type"], "nprobe": self.config.get("nprobe", 8)}
+        if self.config["index_type"] == "ivf_pq":
+            options.update(pq_m=self.index.pq.M, pq_bits=self.index.pq.nbits)
+        return options
+
+    def _partition_vectors(self, key: str, rows: np.ndarray) -> np.ndarray:
+        """取出过滤后各行的向量（IVF-PQ为解码后的近似向量），按过滤条件LRU缓存"""
+        if len(rows) == 0:
+            return np.zeros((0, self.index.d), dtype=np.float32)
+        with self._filter_lock:
+            if key in self._filter_vectors:
+                self._filter_vectors.move_to_end(key)
+                return self._filter_vectors[key]
+        vectors = self.index.reconstruct_batch(rows.astype(np.int64))
+        if vectors.nbytes > FILTER_VECTOR_CACHE_BYTES:
+            return vectors
+        with self._filter_lock:
+            if key not in self._filter_vectors:
+                self._filter_vectors[key] = vectors
+                self._filter_vector_bytes += vectors.nbytes
+            while self._filter_vector_bytes > FILTER_VECTOR_CACHE_BYTES:
+                _, evicted = self._filter_vectors.popitem(last=False)
+                self._filter_vector_bytes -= evicted.nbytes
+        return vectors
+
+    def _search_selected(self, queries: np.ndarray, k: int, filter_conditions: Dict, num_rows: int) -> tuple:
+        """带 IDSelector 的IVF检索；结果不足 min(k, 过滤后行数) 条的查询改为扫描全部簇重查"""
+        ranges = self.store.ranges(filter_conditions)
+        selector = None  # 检索结束前要一直持有，否则底层对象会被提前释放
+        if ranges is not None and len(ranges) == 1:
+            selector = self._faiss.IDSelectorRange(*ranges[0])
+        elif filter_conditions:
+            selector = self._faiss.IDSelectorBatch(self.store.rows(filter_conditions).astype(np.int64))
+
+        def search(batch, nprobe):
+            params = self._faiss.SearchParametersIVF(nprobe=nprobe)
+            if selector is not None:
+                params.sel = selector
+            return self.index.search(batch, k, params=params)
+
+        distances, labels = search(queries, self.nprobe)
+        short = np.flatnonzero((labels >= 0).sum(axis=1) < min(k, num_rows))
+        if len(short) and self.nprobe < self.index.nlist:
+            distances[short], labels[short] = search(queries[short], self.index.nlist)
+        return distances, labels
+
+    def search_batch(
+        self,
+        query_embeddings,
+        k: int = 3,
+        filters: Union[Dict[str, Union[str, int]], List[Dict[str, Union[str, int]]]] = None
+    ) -> List[List[Dict]]:
+        """批量检索；过滤后行数较少时对这些行做精确内积检索，
+        否则通过 IDSelector 在簇内扫描时跳过不满足条件的向量（单个连续分区时用区间判断代替逐个ID查表）"""
+        queries = normalize_rows(query_embeddings)
+        search_results = [None] * queries.shape[0]
+        for key, indices in group_by_filter(filters, queries.shape[0]).items():
+            filter_conditions = json.loads(key)
+            rows = self.store.rows(filter_conditions)
+            if rows is not None and len(rows) <= EXACT_FILTER_MAX_ROWS:
+                scores = queries[indices] @ self._partition_vectors(key, rows).T
+                columns = top_k(scores, k)
+                distances = np.take_along_axis(scores, columns, axis=1)
+                labels = rows[columns]
+            else:
+                num_rows = len(self) if rows is None else len(rows)
+                distances, labels = self._search_selected(queries[indices], k, filter_conditions, num_rows)
+            for position, query_index in enumerate(indices):
+                found = [(int(row), float(score)) for row, score in zip(labels[position], distances[position]) if row >= 0]
+                search_results[query_index] = [
+                    self.store.result(rank + 1, row, score)
+                    for rank, (row, score) in enumerate(found)
+                ]
+        return search_results
+
+
+def append_faiss_index(index_dir: str, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict],
+                       metadata_updates: Dict[str, Dict] = None) -> None:
+    """向已有FAISS索引追加向量（沿用已训练的簇中心和码本），并合并文本和元数据；
+    metadata_updates（文档ID -> 新元数据）用于只有元数据变化的已有分块，向量不变，只改写元数据存储"""
+    existing = FaissIndex(index_dir)
+    if ids:
+        existing.index.add(normalize_rows(embeddings))
+    store = existing.store
+    metadata_updates = metadata_updates or {}
+    with staged_index_dir(index_dir) as staging:
+        ChunkStore.write(
+            staging,
+            store.ids + list(ids),
+            [store.document(row) for row in range(len(store))] + list(documents),
+            [metadata_updates.get(doc_id, metadata) for doc_id, metadata in zip(store.ids, store.metadatas)]
+            + list(metadatas)
+        )
+        existing._faiss.write_index(existing.index, os.path.join(staging, FAISS_INDEX_FILE))
+        shutil.copy2(os.path.join(index_dir, FAISS_CONFIG_FILE), os.path.join(staging, FAISS_CONFIG_FILE))
+    print(f"FAISS索引已追加 {len(ids)} 个向量，更新元数据 {len(metadata_updates)} 个，共 {existing.index.ntotal} 个")
@@ -0,0 +1,491 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+NumPy平铺向量索引（精确检索）
+
+民法典只有几千个分块，直接对float16向量矩阵做一次矩阵-向量乘法求精确top-k，
+比HNSW图检索加SQLite元数据查询更快，而且没有近似误差。
+
+索引目录结构：
+    embeddings.npy   归一化后的float16向量矩阵 [N, D]（PCA压缩时为 [N, d]），以mmap方式加载
+    full_embeddings.npy  可选，float32全精度向量 [N, D]，只读取候选行做重打分
+    pca.npz          PCA压缩时的均值、主成分和每行的 x·μ
+    compression.json 压缩方式和重打分参数
+    documents.bin    所有分块文本的UTF-8编码首尾相接
+    offsets.npy      int64 [N+1]，第i个分块文本为 documents.bin[offsets[i]:offsets[i+1]]
+    metadata.json    {"ids": [...], "metadatas": [...]}
+
+元数据过滤：加载时为每个可过滤字段的每个取值预先计算布尔掩码，查询时按掩码取出候选行。
+层级分区：写索引时按 (section0, section1)（编/章）把同一分区的分块排在相邻行，
+只按这两个字段过滤的查询直接扫描分区对应的连续行区间，不必按行号逐行取出向量。
+
+写索引：全部文件先写到同级的临时目录，写完后整体替换索引目录（见 staged_index_dir），
+服务进程仍映射着的旧文件不会被截断或覆盖。
+"""
+
+import json
+import operator
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+import numpy as np
+from typing import List, Dict, Union
+
+EMBEDDINGS_FILE = "embeddings.npy"
+DOCUMENTS_FILE = "documents.bin"
+OFFSETS_FILE = "offsets.npy"
+METADATA_FILE = "metadata.json"
+FULL_EMBEDDINGS_FILE = "full_embeddings.npy"
+PCA_FILE = "pca.npz"
+COMPRESSION_CONFIG_FILE = "compression.json"
+
+# 向量压缩方式：float16 完整维度；pca 在语料上拟合PCA降维后以float16保存
+COMPRESSION_TYPES = ("float16", "pca")
+DEFAULT_PCA_DIM = 128
+# 重打分的候选数为 k 的倍数
+DEFAULT_RESCORE_FACTOR = 4
+
+# 预先计算过滤掩码的元数据字段
+FILTER_FIELDS = ("source", "file_type", "original_name", "title",
+                 "section0", "section1", "section2", "section3", "content_type")
+
+# 支持的 Chroma where 比较运算符（$and/$or 在 ChunkStore.mask 中单独处理）
+WHERE_OPERATORS = {
+    "$eq": operator.eq, "$ne": operator.ne,
+    "$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le,
+    "$in": lambda value, values: value in values,
+    "$nin": lambda value, values: value not in values,
+}
+
+# 分区字段：写索引时按这些字段排序，使每个分区占据连续的行
+PARTITION_FIELDS = ("section0", "section1")
+
+# 分区被追加写入打散成过多区间时，退回按行号取向量
+MAX_PARTITION_RUNS = 64
+
+# 分块计算相似度，避免把整个float16矩阵一次性转成float32
+SCORE_BLOCK_ROWS = 65536
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """按行L2归一化，内积即余弦相似度"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def group_by_filter(filters, num_queries: int) -> Dict[str, List[int]]:
+    """把查询按过滤条件分组，返回 {过滤条件JSON: [查询下标]}，相同条件的查询可以合并检索"""
+    if filters is None or isinstance(filters, dict):
+        filters = [filters] * num_queries
+    groups = {}
+    for i, filter_conditions in enumerate(filters):
+        key = json.dumps(filter_conditions or {}, sort_keys=True, ensure_ascii=False)
+        groups.setdefault(key, []).append(i)
+    return groups
+
+
+def partition_order(metadatas: List[Dict]) -> np.ndarray:
+    """按分区字段分组后的行顺序：分区按首次出现的先后排列，分区内保持原顺序"""
+    first_seen = {}
+    keys = []
+    for row, metadata in enumerate(metadatas):
+        values = tuple(str(metadata.get(field, "")) for field in PARTITION_FIELDS)
+        key = tuple(first_seen.setdefault(values[:depth + 1], row) for depth in range(len(values)))
+        keys.append(key + (row,))
+    return np.array(sorted(range(len(metadatas)), key=keys.__getitem__), dtype=np.int64)
+
+
+def _value_runs(values: np.ndarray) -> Dict[str, List[tuple]]:
+    """取值 -> 该取值占据的连续行区间 [(start, end), ...]"""
+    runs = {}
+    if len(values) == 0:
+        return runs
+    boundaries = np.flatnonzero(values[1:] != values[:-1]) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [len(values)]])
+    for start, end in zip(starts, ends):
+        runs.setdefault(values[start], []).append((int(start), int(end)))
+    return runs
+
+
+def _intersect_runs(left: List[tuple], right: List[tuple]) -> List[tuple]:
+    """两组有序区间的交集"""
+    result, i, j = [], 0, 0
+    while i < len(left) and j < len(right):
+        start, end = max(left[i][0], right[j][0]), min(left[i][1], right[j][1])
+        if start < end:
+            result.append((start, end))
+        if left[i][1] < right[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+@contextmanager
+def staged_index_dir(index_dir: str):
+    """在 index_dir 的同级临时目录中写出索引，全部写完后整体替换 index_dir
+
+    服务进程以mmap映射着旧索引的文件，原地覆盖会截断被映射的文件（SIGBUS，或读到新旧混杂的数据）。
+    旧目录先改名再删除，已经建立的映射仍指向原来的文件，直到检索器按版本文件重新加载。
+    新目录中没有版本文件（index_version.json），由调用方在替换完成后写入；写入过程中出错时丢弃临时目录，原索引不变。
+    """
+    index_dir = os.path.abspath(index_dir).rstrip(os.sep)
+    parent, name = os.path.split(index_dir)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{name}.staging-", dir=parent)
+    os.chmod(staging, 0o755)  # mkdtemp 默认只有所有者可访问
+    try:
+        yield staging
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    retired = None
+    if os.path.exists(index_dir):
+        retired = f"{staging}.old"
+        os.rename(index_dir, retired)
+    os.rename(staging, index_dir)
+    if retired:
+        shutil.rmtree(retired, ignore_errors=True)
+
+
+class ChunkStore:
+    """分块文本和元数据的紧凑存储，按行号读取，附带预计算的过滤掩码"""
+
+    def __init__(self, index_dir: str):
+        with open(os.path.join(index_dir, METADATA_FILE), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.ids = data["ids"]
+        self.metadatas = data["metadatas"]
+        self.offsets = np.load(os.path.join(index_dir, OFFSETS_FILE))
+        documents_path = os.path.join(index_dir, DOCUMENTS_FILE)
+        self._documents = (
+            np.memmap(documents_path, dtype=np.uint8, mode='r')
+            if os.path.getsize(documents_path) else np.zeros(0, dtype=np.uint8)
+        )
+
+        # 字段 -> 取值 -> 布尔掩码；分区字段另外记录每个取值的连续行区间
+        self.masks = {}
+        self.partitions = {}
+        for field in FILTER_FIELDS:
+            values = np.array([str(metadata.get(field, "")) for metadata in self.metadatas], dtype=object)
+            self.masks[field] = {value: values == value for value in set(values)}
+            if field in PARTITION_FIELDS:
+                self.partitions[field] = _value_runs(values)
+        self._rows_cache = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def document(self, row: int) -> str:
+        return bytes(self._documents[self.offsets[row]:self.offsets[row + 1]]).decode('utf-8')
+
+    def mask(self, filter_conditions: Dict) -> np.ndarray:
+        """按 Chroma 的 where 语法过滤，返回布尔掩码：多个字段取交集，支持 $and/$or 和 WHERE_OPERATORS 中的比较运算符；
+        不支持的写法抛出 ValueError，避免静默地匹配不到任何结果"""
+        mask = np.ones(len(self), dtype=bool)
+        for field, value in filter_conditions.items():
+            if field in ("$and", "$or"):
+                if not isinstance(value, list) or not value:
+                    raise ValueError(f"{field} 需要非空的条件列表: {value!r}")
+                masks = [self.mask(condition) for condition in value]
+                mask &= np.logical_and.reduce(masks) if field == "$and" else np.logical_or.reduce(masks)
+            elif field.startswith("$"):
+                raise ValueError(f"不支持的过滤运算符: {field}")
+            elif isinstance(value, dict):
+                for op, operand in value.items():
+                    mask &= self._field_mask(field, op, operand)
+            else:
+                mask &= self._field_mask(field, "$eq", value)
+        return mask
+
+    def _field_mask(self, field: str, op: str, operand) -> np.ndarray:
+        if op not in WHERE_OPERATORS:
+            raise ValueError(f"不支持的过滤运算符: {op}")
+        if op in ("$in", "$nin") and not isinstance(operand, list):
+            raise ValueError(f"{op} 需要值列表: {operand!r}")
+        if field in self.masks and op in ("$eq", "$ne", "$in", "$nin"):
+            # 预先计算过掩码的字段直接按值取掩码
+            values = operand if op in ("$in", "$nin") else [operand]
+            mask = np.zeros(len(self), dtype=bool)
+            for value in values:
+                mask |= self.masks[field].get(str(value), False)
+            if op in ("$ne", "$nin"):
+                # 与 Chroma 一致：缺少该字段（掩码中记为空字符串）的分块不参与匹配
+                return ~(mask | self.masks[field].get("", False))
+            return mask
+        compare = WHERE_OPERATORS[op]
+        return np.array([field in metadata and compare(metadata[field], operand) for metadata in self.metadatas],
+                        dtype=bool)
+
+    def rows(self, filter_conditions: Dict[str, Union[str, int]] = None) -> Union[np.ndarray, None]:
+        """满足过滤条件的行号，没有过滤条件时返回None（表示全部行）"""
+        if not filter_conditions:
+            return None
+        key = json.dumps(filter_conditions, sort_keys=True, ensure_ascii=False)
+        if key not in self._rows_cache:
+            self._rows_cache[key] = np.flatnonzero(self.mask(filter_conditions))
+        return self._rows_cache[key]
+
+    def ranges(self, filter_conditions: Dict[str, Union[str, int]] = None) -> Union[List[tuple], None]:
+        """只按分区字段过滤时，返回满足条件的连续行区间；其他情况返回None（改用 rows）"""
+        if not filter_conditions or any(field not in self.partitions or isinstance(value, dict)
+                                        for field, value in filter_conditions.items()):
+            return None
+        ranges = None
+        for field, value in filter_conditions.items():
+            runs = self.partitions[field].get(str(value), [])
+            ranges = runs if ranges is None else _intersect_runs(ranges, runs)
+        return ranges if len(ranges) <= MAX_PARTITION_RUNS else None
+
+    def result(self, rank: int, row: int, similarity: float) -> Dict:
+        """与 search_vector_db 相同的结果格式"""
+        return {
+            "rank": rank,
+            "id": self.ids[row],
+            "content": self.document(row),
+            "metadata": self.metadatas[row],
+            "similarity": float(similarity)
+        }
+
+    @staticmethod
+    def write(index_dir: str, ids: List[str], documents: List[str], metadatas: List[Dict]) -> None:
+        """写出文本和元数据文件；index_dir 应是 staged_index_dir 给出的临时目录，不能是正在服务的索引目录"""
+        os.makedirs(index_dir, exist_ok=True)
+        encoded = [document.encode('utf-8') for document in documents]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(data) for data in encoded])
+        with open(os.path.join(index_dir, DOCUMENTS_FILE), 'wb') as f:
+            for data in encoded:
+                f.write(data)
+        np.save(os.path.join(index_dir, OFFSETS_FILE), offsets)
+        with open(os.path.join(index_dir, METADATA_FILE), 'w', encoding='utf-8') as f:
+            json.dump({"ids": list(ids), "metadatas": list(metadatas)}, f, ensure_ascii=False)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """每行分数最高的k个下标（按分数降序）"""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+class FlatIndex:
+    """float16 mmap 向量矩阵上的精确top-k检索
+
+    以压缩方式（float16 或 PCA降维）建索引时，常驻内存的只有压缩后的向量；
+    如果保存了全精度向量，先用压缩向量取 k*rescore_factor 个候选，再读取候选行的全精度向量重新打分。
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.store = ChunkStore(index_dir)
+        self.embeddings = np.load(os.path.join(index_dir, EMBEDDINGS_FILE), mmap_mode='r')
+        config_path = os.path.join(index_dir, COMPRESSION_CONFIG_FILE)
+        self.config = {"compression": "float16", "rescore_factor": DEFAULT_RESCORE_FACTOR}
+        if os.path.exists(config_path):
+            with open(config_path, 'r', encoding='utf-8') as f:
+                self.config.update(json.load(f))
+        self.pca = None
+        if self.config["compression"] == "pca":
+            arrays = np.load(os.path.join(index_dir, PCA_FILE))
+            self.pca = {name: arrays[name] for name in ("mean", "components", "bias")}
+        full_path = os.path.join(index_dir, FULL_EMBEDDINGS_FILE)
+        self.full_embeddings = np.load(full_path, mmap_mode='r') if os.path.exists(full_path) else None
+
+    def __len__(self):
+        return len(self.store)
+
+    def write_options(self) -> Dict:
+        """重建本索引时沿用的 write_flat_index 压缩参数"""
+        options = {
+            "compression": self.config["compression"],
+            "rescore": self.full_embeddings is not None,
+            "rescore_factor": self.config["rescore_factor"]
+        }
+        if self.pca is not None:
+            options["pca_dim"] = self.config["pca_dim"]
+        return options
+
+    def vectors(self) -> np.ndarray:
+        """全部行的完整维度向量（float32副本，不引用mmap，重写索引文件时仍可安全使用）"""
+        if self.full_embeddings is not None:
+            return np.array(self.full_embeddings, dtype=np.float32)
+        if self.pca is not None:
+            raise ValueError(f"PCA平铺索引缺少全精度向量文件: {FULL_EMBEDDINGS_FILE}")
+        return np.array(self.embeddings, dtype=np.float32)
+
+    def scores(self, queries: np.ndarray, rows: Union[np.ndarray, slice] = None) -> np.ndarray:
+        """查询与（部分）行的余弦相似度 [Q, N]；rows 为切片时直接在mmap上取连续行，不复制
+
+        PCA索引中：x·q = (x-μ)·(q-μ) + x·μ + q·μ - μ·μ，降维后的内积加上每行预存的 x·μ，
+        省去的 q·μ - μ·μ 对同一查询是常数，不影响排序。
+        """
+        matrix = self.embeddings if rows is None else self.embeddings[rows]
+        if self.pca is not None:
+            queries = (queries - self.pca["mean"]) @ self.pca["components"].T
+        scores = np.empty((queries.shape[0], matrix.shape[0]), dtype=np.float32)
+        for start in range(0, matrix.shape[0], SCORE_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+            scores[:, start:start + block.shape[0]] = queries @ block.T
+        if self.pca is not None:
+            scores += self.pca["bias"] if rows is None else self.pca["bias"][rows]
+        return scores
+
+    def search_rows(
+        self,
+        query_embeddings,
+        k: int = 3,
+        filters: Union[Dict[str, Union[str, int]], List[Dict[str, Union[str, int]]]] = None
+    ) -> List[List[tuple]]:
+        """批量检索，返回每个查询的 [(行号, 相似度), ...]"""
+        queries = normalize_rows(query_embeddings)
+        rescore = self.full_embeddings is not None
+        shortlist = k * self.config["rescore_factor"] if rescore else k
+        search_results = [None] * queries.shape[0]
+        for key, indices in group_by_filter(filters, queries.shape[0]).items():
+            filter_conditions = json.loads(key)
+            ranges = self.store.ranges(filter_conditions)
+            if ranges is not None:
+                # 只扫描分区对应的连续行
+                rows = np.concatenate([np.arange(start, end) for start, end in ranges] + [np.zeros(0, dtype=np.int64)])
+                scores = np.hstack(
+                    [self.scores(queries[indices], slice(start, end)) for start, end in ranges]
+                    + [np.zeros((len(indices), 0), dtype=np.float32)]
+                )
+            else:
+                rows = self.store.rows(filter_conditions)
+                scores = self.scores(queries[indices], rows)
+            for position, best in enumerate(top_k(scores, shortlist)):
+                found = [int(rows[column] if rows is not None else column) for column in best]
+                if rescore:
+                    search_results[indices[position]] = self._rescore(queries[indices[position]], found, k)
+                else:
+                    search_results[indices[position]] = [
+                        (row, float(scores[position, column])) for row, column in zip(found, best)
+                    ]
+        return search_results
+
+    def _rescore(self, query: np.ndarray, rows: List[int], k: int) -> List[tuple]:
+        """读取候选行的全精度向量精确打分，返回前k个"""
+        if not rows:
+            return []
+        rows = np.sort(np.asarray(rows, dtype=np.int64))  # 按行号顺序读mmap
+        exact = np.asarray(self.full_embeddings[rows], dtype=np.float32) @ query
+        best = top_k(exact[None, :], k)[0]
+        return [(int(rows[column]), float(exact[column])) for column in best]
+
+    def search_batch(
+        self,
+        query_embeddings,
+        k: int = 3,
+        filters: Union[Dict[str, Union[str, int]], List[Dict[str, Union[str, int]]]] = None
+    ) -> List[List[Dict]]:
+        """批量精确检索，参数与返回格式同 Retriever.search_batch"""
+        return [
+            [self.store.result(rank + 1, row, similarity) for rank, (row, similarity) in enumerate(found)]
+            for found in self.search_rows(query_embeddings, k, filters)
+        ]
+
+
+def fit_pca(vectors: np.ndarray, dim: int, sample_size: int = 100000, seed: int = 0) -> tuple:
+    """在语料向量（最多抽样 sample_size 行）上拟合PCA，返回 (均值 [D], 主成分 [dim, D], 保留的方差比例)"""
+    rng = np.random.default_rng(seed)
+    sample = vectors if len(vectors) <= sample_size else vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    mean = sample.mean(axis=0)
+    _, singular_values, components = np.linalg.svd(sample - mean, full_matrices=False)
+    dim = min(dim, components.shape[0])
+    variance = singular_values ** 2
+    return mean.astype(np.float32), components[:dim].astype(np.float32), float(variance[:dim].sum() / variance.sum())
+
+
+def write_flat_index(index_dir: str, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict],
+                     compression: str = "float16", pca_dim: int = DEFAULT_PCA_DIM, rescore: bool = None,
+                     rescore_factor: int = DEFAULT_RESCORE_FACTOR) -> None:
+    """写出平铺索引（按分区排序，向量归一化后压缩保存），写完后整体替换 index_dir
+
+    参数:
+        compression: float16（完整维度）或 pca（在语料上拟合PCA降到 pca_dim 维，以float16保存）
+        rescore: 是否另存float32全精度向量供候选重打分；pca 默认开启，float16 默认关闭
+        rescore_factor: 重打分时候选数为 k 的倍数
+    """
+    if compression not in COMPRESSION_TYPES:
+        raise ValueError(f"不支持的压缩方式: {compression}，可选: {', '.join(COMPRESSION_TYPES)}")
+    rescore = compression == "pca" if rescore is None else rescore
+    if compression == "pca" and not rescore:
+        raise ValueError("PCA平铺索引需要保存全精度向量（rescore=True）")
+
+    order = partition_order(metadatas)
+    vectors = normalize_rows(embeddings)[order]
+    config = {"compression": compression, "rescore_factor": rescore_factor}
+    with staged_index_dir(index_dir) as staging:
+        ChunkStore.write(
+            staging,
+            [ids[row] for row in order],
+            [documents[row] for row in order],
+            [metadatas[row] for row in order]
+        )
+        if compression == "pca":
+            mean, components, explained = fit_pca(vectors, pca_dim)
+            np.save(os.path.join(staging, EMBEDDINGS_FILE), ((vectors - mean) @ components.T).astype(np.float16))
+            np.savez(os.path.join(staging, PCA_FILE), mean=mean, components=components, bias=vectors @ mean)
+            config.update({"pca_dim": int(components.shape[0]), "explained_variance": explained})
+            print(f"PCA降维: {vectors.shape[1]} -> {components.shape[0]} 维，保留方差 {explained:.2%}")
+        else:
+            np.save(os.path.join(staging, EMBEDDINGS_FILE), vectors.astype(np.float16))
+        if rescore:
+            np.save(os.path.join(staging, FULL_EMBEDDINGS_FILE), vectors)
+        with open(os.path.join(staging, COMPRESSION_CONFIG_FILE), 'w', encoding='utf-8') as f:
+            json.dump(config, f)
+
+
+def compression_report(index: FlatIndex, reference: np.ndarray = None, k: int = 10,
+                       num_queries: int = 200, seed: int = 0) -> Dict:
+    """评估压缩平铺索引：以全精度精确检索为基准的recall@k、每百万分块的内存占用、单查询延迟
+
+    reference 为与索引行对齐的全精度向量，默认取索引中保存的全精度向量；查询取库中向量加小扰动。
+    """
+    exact_vectors = normalize_rows(reference) if reference is not None else index.vectors()
+    num_rows, dim = exact_vectors.shape
+    report = {"compression": index.config["compression"], "rows": num_rows, "dim": dim}
+    resident_bytes = index.embeddings.shape[1] * index.embeddings.dtype.itemsize
+    if index.pca is not None:
+        resident_bytes += index.pca["bias"].dtype.itemsize
+    report["resident_mb_per_million"] = resident_bytes * 1e6 / 1024 / 1024
+    report["full_precision_mb_per_million"] = dim * 4 * 1e6 / 1024 / 1024
+    if num_rows == 0:
+        return report
+
+    rng = np.random.default_rng(seed)
+    queries = normalize_rows(
+        exact_vectors[rng.integers(0, num_rows, num_queries)]
+        + rng.normal(scale=0.05, size=(num_queries, dim)).astype(np.float32)
+    )
+    exact = top_k(queries @ exact_vectors.T, k)
+
+    latencies, found = [], []
+    for query in queries:
+        start = time.perf_counter()
+        found.append(index.search_rows(query[None, :], k)[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+    report[f"recall@{k}"] = float(np.mean([
+        len({row for row, _ in result} & set(truth.tolist())) / len(truth)
+        for result, truth in zip(found, exact)
+    ]))
+    report["median_latency_ms"] = float(np.median(latencies))
+
+    print(f"压缩方式: {report['compression']} | recall@{k} {report[f'recall@{k}']:.4f} | "
+          f"单查询中位数 {report['median_latency_ms']:.3f}ms")
+    print(f"常驻向量内存: 每百万分块 {report['resident_mb_per_million']:.0f}MB"
+          f"（float32全精度为 {report['full_precision_mb_per_million']:.0f}MB"
+          f"{'，另存于磁盘供重打分' if index.full_embeddings is not None else ''}）")
+    return report
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+ChatLaw-Text2Vec 查询编码器的 ONNX / int8 导出与推理
+
+CPU服务器上，全精度SentenceTransformer的查询编码占了向量检索路由的大部分耗时。
+这里把Transformer主体导出为ONNX，再做int8动态量化，由ONNX Runtime执行；
+池化（mean/cls/max）和归一化用NumPy实现，与原SentenceTransformer的配置一致。
+
+导出目录结构：
+    model.onnx / model_int8.onnx   导出的fp32模型和量化后的模型
+    onnx_encoder.json              池化方式、是否归一化、最大长度、输入名、使用的模型文件
+    tokenizer 文件                 与原模型相同的分词器
+
+使用方式：
+    python onnx_encoder.py --model ../embedding_model/ChatLaw-Text2Vec --output ../embedding_model/ChatLaw-Text2Vec-onnx
+之后把 embedding_model_path 指向导出目录，建库和检索都会自动使用ONNX编码器。
+"""
+
+import argparse
+import json
+import os
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from typing import List, Union
+
+ENCODER_CONFIG_FILE = "onnx_encoder.json"
+FP32_MODEL_FILE = "model.onnx"
+INT8_MODEL_FILE = "model_int8.onnx"
+
+# 导出后与原模型比较的最低余弦相似度
+MIN_COSINE_SIMILARITY = 0.99
+
+SAMPLE_TEXTS = [
+    "离婚时夫妻共同财产怎么分割？",
+    "第一千零八十七条　离婚时，夫妻的共同财产由双方协议处理；协议不成的，由人民法院根据财产的具体情况，按照照顾子女、女方和无过错方权益的原则判决。",
+    "租赁期限届满，承租人继续使用租赁物，出租人没有提出异议的，原租赁合同继续有效，但是租赁期限为不定期。",
+    "遗嘱需要满足什么形式？",
+    "合同无效的情形",
+]
+
+
+def is_onnx_encoder(model_path: Union[str, None]) -> bool:
+    """目录中是否是导出的ONNX编码器"""
+    return bool(model_path) and os.path.exists(os.path.join(model_path, ENCODER_CONFIG_FILE))
+
+
+class OnnxEncoder:
+    """ONNX Runtime 执行的句向量编码器，encode 接口与 SentenceTransformer.encode 一致"""
+
+    def __init__(self, model_dir: str, model_file: str = None, num_threads: int = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, ENCODER_CONFIG_FILE), 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file or self.config["model_file"]),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = self.config["input_names"]
+        self.max_seq_length = self.config["max_seq_length"]
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        embeddings = np.zeros((len(sentences), 0), dtype=np.float32)
+        if sentences:
+            # 按长度排序后分批，减少同一批内的填充
+            order = np.argsort([-len(sentence) for sentence in sentences])
+            batches = []
+            for start in range(0, len(sentences), batch_size):
+                batch = [sentences[i] for i in order[start:start + batch_size]]
+                batches.append(self._encode_batch(batch))
+            embeddings = np.empty((len(sentences), batches[0].shape[1]), dtype=np.float32)
+            embeddings[order] = np.vstack(batches)
+        if self.config["normalize"] or normalize_embeddings:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings[0] if single else embeddings
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np"
+        )
+        feeds = {name: inputs[name].astype(np.int64) for name in self.input_names}
+        hidden = self.session.run(None, feeds)[0]
+        return _pool(hidden, inputs["attention_mask"], self.config["pooling"])
+
+
+class OnnxEmbeddingFunction(EmbeddingFunction[Documents]):
+    """可替代 SentenceTransformerEmbeddingFunction 传给Chroma集合的嵌入函数"""
+
+    def __init__(self, model_dir: str, **kwargs):
+        self.encoder = OnnxEncoder(model_dir, **kwargs)
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return list(self.encoder.encode(list(input)))
+
+
+def _pool(hidden: np.ndarray, attention_mask: np.ndarray, pooling: str) -> np.ndarray:
+    mask = attention_mask[..., None].astype(np.float32)
+    if pooling == "cls":
+        return hidden[:, 0]
+    if pooling == "max":
+        return np.where(mask > 0, hidden, -1e9).max(axis=1)
+    return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+
+def export_onnx_encoder(model_path: str, output_dir: str, quantize: bool = True, opset: int = 14) -> str:
+    """导出SentenceTransformer的Transformer主体为ONNX，可选int8动态量化，返回导出目录"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    model = SentenceTransformer(model_path, device="cpu")
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    pooling = next(module for module in model if isinstance(module, Pooling))
+    pooling_mode = pooling.get_pooling_mode_str()
+    if pooling_mode not in ("mean", "cls", "max"):
+        raise ValueError(f"不支持的池化方式: {pooling_mode}")
+
+    sample = tokenizer(SAMPLE_TEXTS[:2], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class EncoderWrapper(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *inputs):
+            return self.transformer(**dict(zip(input_names, inputs))).last_hidden_state
+
+    os.makedirs(output_dir, exist_ok=True)
+    fp32_path = os.path.join(output_dir, FP32_MODEL_FILE)
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            EncoderWrapper(),
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset
+        )
+    print(f"已导出: {fp32_path}")
+
+    model_file = FP32_MODEL_FILE
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(fp32_path, os.path.join(output_dir, INT8_MODEL_FILE), weight_type=QuantType.QInt8)
+        model_file = INT8_MODEL_FILE
+        print(f"已量化: {os.path.join(output_dir, INT8_MODEL_FILE)}")
+
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, ENCODER_CONFIG_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            "source_model": model_path,
+            "pooling": pooling_mode,
+            "normalize": any(isinstance(module, Normalize) for module in model),
+            "max_seq_length": model.max_seq_length,
+            "input_names": input_names,
+            "model_file": model_file
+        }, f, ensure_ascii=False, indent=2)
+
+    check_onnx_encoder(model, output_dir)
+    return output_dir
+
+
+def check_onnx_encoder(model, output_dir: str, texts: List[str] = None) -> float:
+    """与原模型逐条比较余弦相似度，返回最小值；低于阈值时报错"""
+    texts = texts or SAMPLE_TEXTS
+    expected = model.encode(texts, normalize_embeddings=True)
+    actual = OnnxEncoder(output_dir).encode(texts, normalize_embeddings=True)
+    similarities = (expected * actual).sum(axis=1)
+    minimum = float(similarities.min())
+    print(f"与原模型的余弦相似度: 最小 {minimum:.5f}, 平均 {float(similarities.mean()):.5f}")
+    if minimum < MIN_COSINE_SIMILARITY:
+        raise ValueError(f"ONNX编码器与原模型的余弦相似度 {minimum:.5f} 低于 {MIN_COSINE_SIMILARITY}")
+    return minimum
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="导出ChatLaw-Text2Vec查询编码器为ONNX（int8）")
+    parser.add_argument("--model", default="../embedding_model/ChatLaw-Text2Vec")
+    parser.add_argument("--output", default="../embedding_model/ChatLaw-Text2Vec-onnx")
+    parser.add_argument("--no-quantize", action="store_true", help="只导出fp32模型，不做int8量化")
+    args = parser.parse_args()
+    export_onnx_encoder(args.model, args.output, quantize=not args.no_quantize)
@@ -2,39 +2,118 @@
 # -*- coding: utf-8 -*-
 
 """
-向量数据库构建与搜索系统（ChromaDB + MiniLM）
+向量数据库构建与搜索系统
 
 功能特点：
-1. 使用轻量级ChromaDB向量数据库，支持本地持久化
-2. 直接集成Sentence Transformers的MiniLM嵌入模型
-3. 元数据过滤优化，利用法律文档结构信息
-4. 支持增量更新和高效搜索
-5. 低显存占用（<1GB内存处理百万级向量）
+1. 三种索引后端：Chroma集合（HNSW）、NumPy平铺索引（float16/PCA压缩）、FAISS IVF索引
+2. 嵌入模型默认使用 ChatLaw-Text2Vec（Sentence Transformers），也可加载ONNX导出目录
+3. 可选BM25关键词索引，与向量检索结果做倒数排名融合（混合检索）
+4. 元数据过滤优化，利用法律文档结构信息
+5. 按内容哈希去重，支持追加、增量同步（只编码变化的分块）和多进程编码
+6. 常驻检索器：模型只加载一次，查询向量LRU缓存，索引重建后自动重新加载
 
 使用方式：
 直接运行脚本，按提示选择操作模式
 """
 
+import hashlib
 import json
 import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+import numpy as np
 import chromadb
 from chromadb.utils import embedding_functions
 from typing import List, Dict, Union
 
+try:
+    from my_knowledge_base.flat_index import FlatIndex, write_flat_index, group_by_filter, compression_report
+    from my_knowledge_base.embedding_pool import encode_documents, default_num_workers
+    from my_knowledge_base.embedding_cache import EmbeddingCache, EMBEDDING_CACHE_DIR
+except ImportError:  # 在 my_knowledge_base 目录下直接运行本脚本时
+    from flat_index import FlatIndex, write_flat_index, group_by_filter, compression_report
+    from embedding_pool import encode_documents, default_num_workers
+    from embedding_cache import EmbeddingCache, EMBEDDING_CACHE_DIR
+
 # 配置常量
 EMBEDDING_MODEL_NAME = "../embedding_model/ChatLaw-Text2Vec"
 VECTOR_DB_PATH = "./vector_db/chroma_data"
 COLLECTION_NAME = "law_documents"
+INDEX_VERSION_FILE = "index_version.json"
+FLAT_INDEX_DIR = "flat_index"  # 平铺索引相对向量库目录的位置
+FAISS_INDEX_DIR = "faiss_index"  # FAISS索引相对向量库目录的位置
+INDEX_BACKENDS = ("chroma", "flat", "faiss")
+INDEX_VERSION_CHECK_INTERVAL = 5  # 检索器检查索引版本文件的间隔（秒），避免每次查询都读取解析
+# 参与计算文档ID的层级元数据，分块位置（chunk_path）变化不会改变ID
+CONTENT_ID_FIELDS = ("original_name", "title", "section0", "section1", "section2", "section3", "content_type")
 
-def create_vector_db(metadata_path: str, vector_db_path: str, mode: str = 'create') -> None:
-    """创建或更新ChromaDB向量数据库
-    
-    参数:
-        metadata_path: 包含分块数据的JSON文件路径
-        vector_db_path: 向量数据库保存路径
-        mode: 操作模式 ('create'新建/覆盖 或 'append'追加)
-    """
-    # 加载分块数据
+def write_index_version(vector_db_path: str, build_stats: Dict = None) -> str:
+    """记录向量库的构建版本（每次重建/更新后调用），供下游缓存判断是否失效；build_stats 为可选的构建统计"""
+    version = f"{time.time_ns()}"
+    with open(os.path.join(vector_db_path, INDEX_VERSION_FILE), 'w', encoding='utf-8') as f:
+        json.dump({"version": version, "build_stats": build_stats or {}}, f)
+    return version
+
+def get_build_stats(vector_db_path: str) -> Dict:
+    """读取上次构建时记录的统计（如编码吞吐），没有时返回空字典"""
+    version_path = os.path.join(vector_db_path, INDEX_VERSION_FILE)
+    if not os.path.exists(version_path):
+        return {}
+    with open(version_path, 'r', encoding='utf-8') as f:
+        return json.load(f).get("build_stats", {})
+
+def get_index_version(vector_db_path: str) -> Union[str, None]:
+    """读取向量库的构建版本，没有版本文件时退回到Chroma数据文件的修改时间"""
+    version_path = os.path.join(vector_db_path, INDEX_VERSION_FILE)
+    if os.path.exists(version_path):
+        with open(version_path, 'r', encoding='utf-8') as f:
+            return json.load(f)["version"]
+    sqlite_path = os.path.join(vector_db_path, "chroma.sqlite3")
+    if os.path.exists(sqlite_path):
+        stat = os.stat(sqlite_path)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+    return None
+
+def _bm25_index_module():
+    """按需导入BM25关键词索引（依赖jieba）"""
+    try:
+        from my_knowledge_base import bm25_index
+    except ImportError:  # 在 my_knowledge_base 目录下直接运行本脚本时
+        import bm25_index
+    return bm25_index
+
+def _faiss_index_module():
+    """按需导入FAISS后端（faiss-cpu 是可选依赖）"""
+    try:
+        from my_knowledge_base import faiss_index
+    except ImportError:  # 在 my_knowledge_base 目录下直接运行本脚本时
+        import faiss_index
+    return faiss_index
+
+def make_embedding_function(embedding_model_path: str = None):
+    """根据模型目录选择嵌入函数：ONNX导出目录（onnx_encoder.py 生成）用ONNX Runtime，否则用SentenceTransformer"""
+    embedding_model_path = embedding_model_path or EMBEDDING_MODEL_NAME
+    try:
+        from my_knowledge_base import onnx_encoder
+    except ImportError:  # 在 my_knowledge_base 目录下直接运行本脚本时
+        import onnx_encoder
+    if onnx_encoder.is_onnx_encoder(embedding_model_path):
+        return onnx_encoder.OnnxEmbeddingFunction(embedding_model_path)
+    return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=embedding_model_path)
+
+def chunk_content_id(text: str, metadata: Dict) -> str:
+    """由分块文本和层级元数据计算稳定的文档ID，与分块在列表中的位置无关"""
+    key = json.dumps(
+        [text] + [metadata.get(field, "") for field in CONTENT_ID_FIELDS],
+        ensure_ascii=False
+    )
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def load_chunks(metadata_path: str):
+    """读取分块元数据，返回去重后的 (ids, 文本, 元数据)"""
     with open(metadata_path, 'r', encoding='utf-8') as f:
         chunks = json.load(f)
     
@@ -44,10 +123,10 @@ def create_vector_db(metadata_path: str, vector_db_path: str, mode: str = 'creat
     documents = []
     metadatas = []
     ids = []
+    seen = set()
     
-    for idx, chunk in enumerate(chunks):
-        documents.append(chunk["text"])
-        metadatas.append({
+    for chunk in chunks:
+        metadata = {
             "source": chunk["metadata"]["source"],
             "file_type": chunk["metadata"]["file_type"],
             "original_name": chunk["metadata"]["original_name"],
@@ -59,14 +138,153 @@ def create_vector_db(metadata_path: str, vector_db_path: str, mode: str = 'creat
             "content_type": chunk["metadata"]["content_type"],
             "chunk_path": chunk["metadata"]["chunk_path"],
             "char_count": chunk["metadata"]["char_count"]
-        })
-        ids.append(f"doc_{idx}")
+        }
+        doc_id = chunk_content_id(chunk["text"], metadata)
+        if doc_id in seen:
+            continue  # 文本和层级完全相同的重复分块只保留一个
+        seen.add(doc_id)
+        documents.append(chunk["text"])
+        metadatas.append(metadata)
+        ids.append(doc_id)
 
-    # 初始化Chroma客户端和嵌入模型
-    client = chromadb.PersistentClient(path=vector_db_path)
-    sentence_transformer_ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name=EMBEDDING_MODEL_NAME
+    if len(ids) < len(chunks):
+        print(f"跳过 {len(chunks) - len(ids)} 个重复分块")
+    return ids, documents, metadatas
+
+def create_vector_db(metadata_path: str, vector_db_path: str, mode: str = 'create',
+                     index_backend: str = "chroma", index_options: Dict = None,
+                     embedding_model_path: str = None, num_workers: int = None,
+                     embed_batch_size: int = 1024, insert_batch_size: int = 5000,
+                     embedding_cache: bool = True) -> None:
+    """创建或更新ChromaDB向量数据库
+
+    先用多进程编码池一次性算好全部向量，再批量写入预先计算的向量，分阶段（加载/编码/写入）报告文档/s。
+    文档ID由分块文本和层级元数据的哈希得到，追加和同步模式只编码库中还没有的分块。
+    
+    参数:
+        metadata_path: 包含分块数据的JSON文件路径
+        vector_db_path: 向量数据库保存路径
+        mode: 操作模式 ('create'新建/覆盖；'append'追加新分块，本次分块所属来源文件中已不存在的旧分块一并删除，
+              其他来源的分块保持不变；'sync'增量同步：以本次分块为全集，追加新分块并删除其余所有分块)
+        index_backend: 索引后端 chroma / flat / faiss，后两者不经过Chroma直接写出数组索引
+        index_options: FAISS索引参数（index_type、nlist、nprobe、pq_m、pq_bits）；
+                       平铺索引的压缩参数（compression=float16/pca、pca_dim、rescore、rescore_factor）
+        embedding_model_path: 嵌入模型路径（可选），指向ONNX导出目录时使用量化编码器
+        num_workers: 编码进程数，默认 CPU核心数/4；1表示在当前进程编码
+        embed_batch_size: 每个编码进程每次领取的文档数
+        insert_batch_size: 每次写入Chroma的文档数（不超过Chroma允许的最大批量）
+        embedding_cache: 是否使用 向量库目录/embedding_cache 下的磁盘嵌入缓存，重建和切换后端时复用已编码的向量
+    """
+    if index_backend not in INDEX_BACKENDS:
+        raise ValueError(f"不支持的索引后端: {index_backend}，可选: {', '.join(INDEX_BACKENDS)}")
+    if mode not in ('create', 'append', 'sync'):
+        raise ValueError(f"不支持的操作模式: {mode}，可选: create / append / sync")
+    # 加载分块数据
+    load_start = time.time()
+    ids, documents, metadatas = load_chunks(metadata_path)
+    stages = [("加载", len(documents), time.time() - load_start)]
+
+    # 多进程编码时模型只在编码进程中加载；写入时都使用预先计算的向量，Chroma集合不需要嵌入函数
+    num_workers = num_workers or default_num_workers()
+    sentence_transformer_ef = make_embedding_function(embedding_model_path) if num_workers <= 1 else None
+    # 与已有索引比较，只编码新增的分块
+    existing = {} if mode == 'create' else _existing_metadatas(index_backend, vector_db_path, sentence_transformer_ef)
+    new_rows = [row for row, doc_id in enumerate(ids) if doc_id not in existing]
+    current_ids = set(ids)
+    if mode == 'sync':
+        deleted_ids = [doc_id for doc_id in existing if doc_id not in current_ids]
+    else:
+        # 来源文件修改后重新分块，改动的分块得到新的ID；同一来源中已不存在的旧分块在追加时一并删除
+        current_sources = {metadata["source"] for metadata in metadatas}
+        deleted_ids = [
+            doc_id for doc_id, metadata in existing.items()
+            if doc_id not in current_ids and metadata.get("source") in current_sources
+        ]
+    changed_rows = [
+        row for row, doc_id in enumerate(ids)
+        if doc_id in existing and existing[doc_id] != metadatas[row]
+    ]
+    if mode != 'create':
+        print(f"差异: 新增 {len(new_rows)}，删除 {len(deleted_ids)}，元数据变化 {len(changed_rows)}，"
+              f"未变 {len(ids) - len(new_rows) - len(changed_rows)}（库中原有 {len(existing)}）")
+        if existing and not (new_rows or deleted_ids or changed_rows):
+            print("索引已是最新，无需更新")
+            return
+
+    embed_start = time.time()
+    cache = EmbeddingCache(os.path.join(vector_db_path, EMBEDDING_CACHE_DIR),
+                           embedding_model_path or EMBEDDING_MODEL_NAME) if embedding_cache else None
+    new_embeddings = encode_documents(
+        [documents[row] for row in new_rows],
+        embedding_model_path or EMBEDDING_MODEL_NAME,
+        num_workers=num_workers,
+        batch_size=embed_batch_size,
+        embedding_function=sentence_transformer_ef,
+        cache=cache
     )
+    stages.append(("编码", len(new_rows), time.time() - embed_start))
+    encoded = cache.misses if cache else len(new_rows)  # 实际经过模型的文档数
+
+    # 数组索引写入时整个目录被替换，旧的构建统计要在写入前读出
+    build_stats = get_build_stats(get_index_path(vector_db_path, index_backend))
+    insert_start = time.time()
+    if index_backend != "chroma":
+        # FAISS同步重建时未变分块的向量通过嵌入缓存取回（未命中时重新编码），不用索引中重构出的有损向量
+        encode = lambda texts: encode_documents(
+            texts, embedding_model_path or EMBEDDING_MODEL_NAME, num_workers=num_workers,
+            batch_size=embed_batch_size, embedding_function=sentence_transformer_ef, cache=cache
+        )
+        index_dir = _create_array_index(index_backend, ids, documents, metadatas, new_rows, new_embeddings,
+                                        vector_db_path, mode, index_options or {},
+                                        {ids[row]: metadatas[row] for row in changed_rows}, encode, deleted_ids)
+    else:
+        index_dir = vector_db_path
+        _write_chroma_collection(vector_db_path, mode, sentence_transformer_ef, ids, documents, metadatas,
+                                 new_rows, new_embeddings, deleted_ids, changed_rows, insert_batch_size)
+    stages.append(("写入", len(new_rows), time.time() - insert_start))
+    _report_stages(stages)
+
+    # 记录模型编码吞吐，供之后估算全量重建耗时；实际编码的文档太少时沿用上次记录的吞吐
+    embed_rate = build_stats.get("embed_docs_per_s")
+    if encoded >= 100 or (encoded and not embed_rate):
+        embed_rate = encoded / max(stages[1][2], 1e-9)
+    build_stats = {"embed_docs_per_s": embed_rate, "documents": len(ids)}
+    if cache:
+        build_stats["embedding_cache"] = cache.stats()
+    write_index_version(index_dir, build_stats)
+    if embed_rate and encoded < len(ids):
+        full_seconds = len(ids) / embed_rate
+        print(f"全量重新编码 {len(ids)} 个文档约需 {full_seconds:.1f}s，本次实际编码 {encoded} 个，"
+              f"节省约 {full_seconds - encoded / embed_rate:.1f}s")
+
+def _existing_metadatas(index_backend: str, vector_db_path: str, embedding_function,
+                        batch_size: int = 5000) -> Dict[str, Dict]:
+    """读取已有索引中的 文档ID -> 元数据；索引不存在时返回空字典"""
+    if index_backend != "chroma":
+        index_dir = get_index_path(vector_db_path, index_backend)
+        if get_index_version(index_dir) is None:
+            return {}
+        store = _load_array_index(index_backend, index_dir).store
+        return dict(zip(store.ids, store.metadatas))
+
+    client = chromadb.PersistentClient(path=vector_db_path)
+    try:
+        collection = client.get_collection(name=COLLECTION_NAME, embedding_function=embedding_function)
+    except Exception:
+        return {}
+    existing = {}
+    total = collection.count()
+    for offset in range(0, total, batch_size):
+        batch = collection.get(limit=batch_size, offset=offset, include=["metadatas"])
+        existing.update(zip(batch["ids"], batch["metadatas"]))
+    return existing
+
+def _write_chroma_collection(vector_db_path: str, mode: str, embedding_function, ids: List[str],
+                             documents: List[str], metadatas: List[Dict], new_rows: List[int],
+                             new_embeddings: np.ndarray, deleted_ids: List[str], changed_rows: List[int],
+                             insert_batch_size: int) -> None:
+    """按操作模式写入Chroma集合：新增预先编码的分块，删除已不存在的分块，只更新元数据变化的分块"""
+    client = chromadb.PersistentClient(path=vector_db_path)
     
     # 处理操作模式
     if mode == 'create':
@@ -78,103 +296,481 @@ def create_vector_db(metadata_path: str, vector_db_path: str, mode: str = 'creat
         
         collection = client.create_collection(
             name=COLLECTION_NAME,
-            embedding_function=sentence_transformer_ef,
+            embedding_function=embedding_function,
             metadata={"hnsw:space": "cosine"}  # 使用余弦相似度
         )
         print(f"创建新集合: {COLLECTION_NAME}")
     else:
-        # 追加模式
+        # 追加/同步模式
         try:
             collection = client.get_collection(
                 name=COLLECTION_NAME,
-                embedding_function=sentence_transformer_ef
+                embedding_function=embedding_function
             )
             print(f"加载现有集合: {COLLECTION_NAME}")
         except:
             print("集合不存在，创建新集合")
             collection = client.create_collection(
                 name=COLLECTION_NAME,
-                embedding_function=sentence_transformer_ef
+                embedding_function=embedding_function,
+                metadata={"hnsw:space": "cosine"}
             )
-    
-    # 批量添加文档
-    batch_size = 100
-    for i in range(0, len(documents), batch_size):
-        batch_docs = documents[i:i+batch_size]
-        batch_metas = metadatas[i:i+batch_size]
-        batch_ids = ids[i:i+batch_size]
-        
+
+    batch_size = min(insert_batch_size, client.get_max_batch_size())
+    for i in range(0, len(deleted_ids), batch_size):
+        collection.delete(ids=deleted_ids[i:i+batch_size])
+    if deleted_ids:
+        print(f"删除文档: {len(deleted_ids)}")
+    for i in range(0, len(changed_rows), batch_size):
+        rows = changed_rows[i:i+batch_size]
+        collection.update(ids=[ids[row] for row in rows], metadatas=[metadatas[row] for row in rows])
+    if changed_rows:
+        print(f"更新元数据: {len(changed_rows)}")
+
+    # 批量写入预先计算的向量，Chroma不再调用嵌入函数
+    for i in range(0, len(new_rows), batch_size):
+        rows = new_rows[i:i+batch_size]
         collection.add(
-            documents=batch_docs,
-            metadatas=batch_metas,
-            ids=batch_ids
+            documents=[documents[row] for row in rows],
+            embeddings=new_embeddings[i:i+batch_size],
+            metadatas=[metadatas[row] for row in rows],
+            ids=[ids[row] for row in rows]
         )
-        print(f"添加文档: {i+1}-{min(i+batch_size, len(documents))}/{len(documents)}")
+        print(f"添加文档: {i+1}-{i+len(rows)}/{len(new_rows)}")
     
     print(f"向量数据库已保存至: {vector_db_path}")
     print(f"集合统计: {collection.count()} 个文档")
 
-def search_vector_db(
-    query: str, 
-    vector_db_path: str, 
-    k: int = 3,
-    filter_conditions: Dict[str, Union[str, int]] = None,
-    embedding_model_path: str = None  # 添加新参数
-) -> List[Dict]:
-    """在向量数据库中执行相似性搜索
+def _report_stages(stages: List) -> None:
+    """打印建库各阶段的耗时和吞吐"""
+    total = sum(seconds for _, _, seconds in stages)
+    for name, count, seconds in stages:
+        print(f"{name}: {seconds:.2f}s（{count / max(seconds, 1e-9):.1f} 文档/s）")
+    print(f"总耗时: {total:.2f}s")
+
+def _load_array_index(index_backend: str, index_dir: str):
+    if index_backend == "faiss":
+        return _faiss_index_module().FaissIndex(index_dir)
+    return FlatIndex(index_dir)
+
+def _create_array_index(index_backend: str, ids: List[str], documents: List[str], metadatas: List[Dict],
+                        new_rows: List[int], new_embeddings: np.ndarray, vector_db_path: str, mode: str,
+                        index_options: Dict, metadata_updates: Dict[str, Dict] = None, encode=None,
+                        deleted_ids: List[str] = None) -> str:
+    """写出平铺索引或FAISS索引，返回索引目录
+
+    create 用当前全部分块建索引；append 在已有索引后追加新分块，改写只有元数据变化的已有分块，
+    并删除 deleted_ids（被修改后的来源文件替换掉的旧分块）；
+    sync 按当前分块重建，未变的分块沿用已有向量：平铺索引直接读取，FAISS（存的是量化后的向量）
+    通过 encode（文本 -> 向量，经过嵌入缓存）取回。未指定 index_options 时沿用已有索引的构建参数。
+    """
+    index_dir = get_index_path(vector_db_path, index_backend)
+    exists = get_index_version(index_dir) is not None
+    faiss_index = _faiss_index_module() if index_backend == "faiss" else None
+    new_ids = [ids[row] for row in new_rows]
+    new_documents = [documents[row] for row in new_rows]
+    new_metadatas = [metadatas[row] for row in new_rows]
+
+    if mode == 'create' or not exists:
+        ids, documents, metadatas, embeddings = new_ids, new_documents, new_metadatas, new_embeddings
+    elif index_backend == "faiss" and mode == 'append' and not deleted_ids:
+        # 沿用已训练的簇中心和码本，只追加新向量并改写变化的元数据
+        faiss_index.append_faiss_index(index_dir, new_ids, new_embeddings, new_documents, new_metadatas,
+                                       metadata_updates)
+        return index_dir
+    else:
+        existing = _load_array_index(index_backend, index_dir)
+        store = existing.store
+        if not index_options:
+            index_options = existing.write_options()  # 沿用已有索引的压缩方式/构建参数
+        if mode == 'append':
+            metadata_updates = metadata_updates or {}
+            deleted = set(deleted_ids or ())
+            kept = [row for row, doc_id in enumerate(store.ids) if doc_id not in deleted]
+            ids = [store.ids[row] for row in kept] + new_ids
+            documents = [store.document(row) for row in kept] + new_documents
+            metadatas = [metadata_updates.get(store.ids[row], store.metadatas[row]) for row in kept] + new_metadatas
+            if index_backend == "faiss":
+                # IVF索引的向量编号即行号，删除后行号变化，按剩余分块重建（向量经嵌入缓存取回）
+                print(f"删除 {len(deleted)} 个被替换的旧分块，FAISS索引按剩余 {len(kept)} 个分块和新分块重建")
+                kept_embeddings = encode([store.document(row) for row in kept])
+            else:
+                kept_embeddings = existing.vectors()[kept]
+            parts = [part for part in (kept_embeddings, new_embeddings) if len(part)]
+            embeddings = np.vstack(parts) if parts else kept_embeddings
+        else:
+            new_positions = {row: position for position, row in enumerate(new_rows)}
+            kept_rows = [row for row in range(len(ids)) if row not in new_positions]
+            if index_backend == "faiss":
+                # 文档ID由文本哈希得到，未变分块的文本即当前文本
+                print(f"取回未变分块的向量: {len(kept_rows)}")
+                kept_embeddings = encode([documents[row] for row in kept_rows])
+            else:
+                existing_rows = {doc_id: row for row, doc_id in enumerate(store.ids)}
+                existing_embeddings = existing.vectors()
+                kept_embeddings = existing_embeddings[[existing_rows[ids[row]] for row in kept_rows]]
+            kept_positions = {row: position for position, row in enumerate(kept_rows)}
+            embeddings = np.stack([
+                new_embeddings[new_positions[row]] if row in new_positions
+                else kept_embeddings[kept_positions[row]]
+                for row in range(len(ids))
+            ])
+
+    if index_backend == "flat":
+        write_flat_index(index_dir, ids, embeddings, documents, metadatas, **index_options)
+        if index_options:
+            # 压缩存储时报告recall@k（以本次的全精度向量为基准）、内存占用和查询延迟
+            index = FlatIndex(index_dir)
+            positions = {doc_id: position for position, doc_id in enumerate(ids)}
+            reference = np.asarray(embeddings, dtype=np.float32)[[positions[doc_id] for doc_id in index.store.ids]]
+            compression_report(index, reference)
+    else:
+        faiss_index.build_faiss_index(index_dir, ids, embeddings, documents, metadatas, **index_options)
+    print(f"{index_backend} 索引已保存至: {index_dir}（{len(ids)} 个文档）")
+    return index_dir
+
+def create_bm25_index(metadata_paths: Union[str, List[str]], vector_db_path: str) -> str:
+    """对 text_chunker.py 输出的分块构建BM25关键词索引，保存在 向量库目录/bm25_index
     
     参数:
-        query: 查询文本
+        metadata_paths: 一个或多个分块元数据JSON文件路径（可包含多部法律法规）
         vector_db_path: 向量数据库路径
-        k: 返回的最相似结果数量
-        filter_conditions: 元数据过滤条件
-        embedding_model_path: 嵌入模型路径（可选）
     """
-    # 使用传入的模型路径，如果没有则使用默认值
-    model_name = embedding_model_path if embedding_model_path else EMBEDDING_MODEL_NAME
+    bm25_index = _bm25_index_module()
+    if isinstance(metadata_paths, str):
+        metadata_paths = [metadata_paths]
+    # 与向量索引相同的分块读取和去重，两路检索的文档ID一一对应，融合时按ID合并
+    ids, documents, metadatas, seen = [], [], [], set()
+    for metadata_path in metadata_paths:
+        for doc_id, document, metadata in zip(*load_chunks(metadata_path)):
+            if doc_id not in seen:
+                seen.add(doc_id)
+                ids.append(doc_id)
+                documents.append(document)
+                metadatas.append(metadata)
+
+    index_dir = get_index_path(vector_db_path, "bm25")
+    start_time = time.time()
+    bm25_index.build_bm25_index(index_dir, ids, documents, metadatas)
+    write_index_version(index_dir)
+    print(f"BM25索引构建耗时: {time.time()-start_time:.2f}s")
+    return index_dir
+
+def get_index_path(vector_db_path: str, index_backend: str = "chroma") -> str:
+    """索引后端的数据目录（也是其索引版本文件所在目录）；index_backend="bm25" 时为混合检索的BM25索引目录"""
+    if index_backend == "chroma":
+        return vector_db_path
+    if index_backend == "bm25":
+        return os.path.join(vector_db_path, _bm25_index_module().BM25_INDEX_DIR)
+    if index_backend == "faiss":
+        return os.path.join(vector_db_path, FAISS_INDEX_DIR)
+    return os.path.join(vector_db_path, FLAT_INDEX_DIR)
+
+def export_flat_index(vector_db_path: str, index_dir: str = None, batch_size: int = 1000,
+                      embedding_model_path: str = None) -> str:
+    """把Chroma集合中的向量、文本和元数据导出为NumPy平铺索引
     
-    # 初始化Chroma客户端
+    参数:
+        vector_db_path: 向量数据库路径
+        index_dir: 导出目录，默认为 向量库目录/flat_index
+        batch_size: 每次从集合读取的文档数
+        embedding_model_path: 嵌入模型路径（可选，需与建库时一致）
+    """
+    index_dir = index_dir or get_index_path(vector_db_path, "flat")
     client = chromadb.PersistentClient(path=vector_db_path)
-    sentence_transformer_ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name=model_name  # 使用动态模型路径
+    collection = client.get_collection(
+        name=COLLECTION_NAME,
+        embedding_function=make_embedding_function(embedding_model_path)
     )
-    
-    try:
-        collection = client.get_collection(
-            name=COLLECTION_NAME,
-            embedding_function=sentence_transformer_ef
+
+    ids, embeddings, documents, metadatas = [], [], [], []
+    total = collection.count()
+    for offset in range(0, total, batch_size):
+        batch = collection.get(
+            limit=batch_size,
+            offset=offset,
+            include=["embeddings", "documents", "metadatas"]
         )
-    except:
-        print(f"错误：未找到集合 {COLLECTION_NAME}")
-        return []
-    
-    # 构建查询条件
-    where_clause = {}
-    if filter_conditions:
-        for key, value in filter_conditions.items():
-            where_clause[key] = value
-    
-    # 执行查询
-    results = collection.query(
-        query_texts=[query],
-        n_results=k,
-        where=where_clause if where_clause else None,
-        include=["documents", "metadatas", "distances"]
-    )
-    
-    # 处理结果
+        ids.extend(batch["ids"])
+        embeddings.extend(batch["embeddings"])
+        documents.extend(batch["documents"])
+        metadatas.extend(batch["metadatas"])
+        print(f"读取文档: {min(offset + batch_size, total)}/{total}")
+
+    write_flat_index(index_dir, ids, embeddings, documents, metadatas)
+    write_index_version(index_dir)
+    print(f"平铺索引已导出至: {index_dir}（{len(ids)} 个文档）")
+    return index_dir
+
+def normalize_query_text(text: str) -> str:
+    """查询文本规范化：全角转半角（NFKC）、合并连续空白"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize("NFKC", text)).strip()
+
+class QueryEncoder:
+    """查询编码器：嵌入函数只加载一次，前向计算加锁串行；由 get_query_encoder 按模型共享给检索器和语义答案缓存"""
+
+    def __init__(self, embedding_model_path: str = None):
+        self.embedding_function = make_embedding_function(embedding_model_path)
+        self._lock = threading.Lock()
+
+    def __call__(self, texts: List[str]) -> List:
+        with self._lock:
+            return self.embedding_function(texts)
+
+class Retriever:
+    """常驻进程内的检索器
+
+    Chroma客户端、集合和嵌入模型只打开/加载一次，之后每次查询只做一次编码和一次向量检索。
+    嵌入模型的前向计算加锁串行，Chroma查询本身是线程安全的，可供多个并发请求共享。
+    向量库重建（索引版本变化）后会自动重新打开集合；版本文件每 version_check_interval 秒最多读取一次。
+    查询向量按规范化后的文本做LRU缓存，重复的查询不再经过嵌入模型。
+
+    index_backend:
+        chroma  Chroma集合（HNSW近似检索）
+        flat    NumPy平铺索引（float16精确检索），由 export_flat_index 导出或 create_vector_db 直接构建
+        faiss   FAISS IVF-Flat / IVF-PQ 索引，由 create_vector_db(index_backend="faiss") 构建
+
+    hybrid=True 时同时用BM25关键词索引（由 create_bm25_index 构建）检索，两路结果做倒数排名融合。
+    """
+
+    def __init__(self, vector_db_path: str, embedding_model_path: str = None, query_cache_size: int = 1024,
+                 index_backend: str = "chroma", hybrid: bool = False,
+                 version_check_interval: float = INDEX_VERSION_CHECK_INTERVAL):
+        if index_backend not in INDEX_BACKENDS:
+            raise ValueError(f"不支持的索引后端: {index_backend}，可选: {', '.join(INDEX_BACKENDS)}")
+        self.vector_db_path = vector_db_path
+        self.embedding_model_path = embedding_model_path or EMBEDDING_MODEL_NAME
+        self.index_backend = index_backend
+        self.index_path = get_index_path(vector_db_path, index_backend)
+        self.client = chromadb.PersistentClient(path=vector_db_path) if index_backend == "chroma" else None
+        self.encoder = get_query_encoder(self.embedding_model_path)
+        self.embedding_function = self.encoder.embedding_function
+        self.hybrid = hybrid
+        self.bm25_path = os.path.join(vector_db_path, _bm25_index_module().BM25_INDEX_DIR) if hybrid else None
+        self.index = None
+        self.bm25 = None
+        self._index_version = None
+        self._bm25_version = None
+        self._index_lock = threading.Lock()
+        self.version_check_interval = version_check_interval
+        self._checked_versions = {}  # 索引目录 -> (上次检查的时间, 读到的版本)
+
+        # 查询向量LRU缓存，0表示不缓存
+        self.query_cache_size = query_cache_size
+        self._query_cache = OrderedDict()  # 规范化文本 -> 向量
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._cache_lock = threading.Lock()
+
+    def _check_version(self, path: str) -> Union[str, None]:
+        """返回索引目录的版本；距上次读取不足 version_check_interval 秒时直接沿用上次读到的版本"""
+        now = time.time()
+        with self._index_lock:
+            checked = self._checked_versions.get(path)
+            if checked is not None and now - checked[0] < self.version_check_interval:
+                return checked[1]
+        version = get_index_version(path)
+        with self._index_lock:
+            self._checked_versions[path] = (now, version)
+        return version
+
+    def _get_index(self):
+        """返回当前的Chroma集合或平铺索引；不存在时返回None，重建后重新加载"""
+        version = self._check_version(self.index_path)
+        with self._index_lock:
+            if self.index is None or version != self._index_version:
+                try:
+                    if self.index_backend == "chroma":
+                        self.index = self.client.get_collection(
+                            name=COLLECTION_NAME,
+                            embedding_function=self.embedding_function
+                        )
+                    elif self.index_backend == "faiss":
+                        self.index = _faiss_index_module().FaissIndex(self.index_path)
+                    else:
+                        self.index = FlatIndex(self.index_path)
+                    self._index_version = version
+                except Exception:
+                    # 重建替换索引目录的瞬间读不到文件时继续使用已加载的索引，下次查询再重新加载
+                    pass
+            return self.index
+
+    def _get_bm25(self):
+        """返回BM25索引；不存在时返回None，重建后重新加载"""
+        version = self._check_version(self.bm25_path)
+        with self._index_lock:
+            if self.bm25 is None or version != self._bm25_version:
+                try:
+                    self.bm25 = _bm25_index_module().BM25Index(self.bm25_path)
+                    self._bm25_version = version
+                except Exception:
+                    pass  # 同 _get_index：重建过程中读不到时沿用已加载的索引
+            return self.bm25
+
+    def embed(self, texts: List[str]) -> List:
+        """用嵌入模型编码查询文本"""
+        return self.encoder(texts)
+
+    def embed_queries(self, queries: List[str]) -> List:
+        """编码查询文本，命中缓存的直接返回，其余的一次批量编码"""
+        keys = [normalize_query_text(query) for query in queries]
+        embeddings = [None] * len(keys)
+        missing = []
+        with self._cache_lock:
+            for i, key in enumerate(keys):
+                if key in self._query_cache:
+                    self._query_cache.move_to_end(key)
+                    embeddings[i] = self._query_cache[key]
+                    self._cache_hits += 1
+                else:
+                    missing.append(i)
+                    self._cache_misses += 1
+
+        if missing:
+            missing_keys = list(dict.fromkeys(keys[i] for i in missing))
+            computed = dict(zip(missing_keys, self.embed(missing_keys)))
+            for i in missing:
+                embeddings[i] = computed[keys[i]]
+            if self.query_cache_size:
+                with self._cache_lock:
+                    for key, embedding in computed.items():
+                        self._query_cache[key] = embedding
+                        self._query_cache.move_to_end(key)
+                    while len(self._query_cache) > self.query_cache_size:
+                        self._query_cache.popitem(last=False)
+        return embeddings
+
+    def cache_stats(self) -> Dict:
+        """查询向量缓存的命中统计"""
+        with self._cache_lock:
+            total = self._cache_hits + self._cache_misses
+            return {
+                "hits": self._cache_hits,
+                "misses": self._cache_misses,
+                "hit_rate": self._cache_hits / total if total else 0.0,
+                "size": len(self._query_cache),
+                "max_size": self.query_cache_size
+            }
+
+    def search(
+        self,
+        query: str,
+        k: int = 3,
+        filter_conditions: Dict[str, Union[str, int]] = None,
+        query_embedding=None
+    ) -> List[Dict]:
+        """执行相似性搜索，返回格式与 search_vector_db 相同；query_embedding 为已算好的查询向量时不再编码"""
+        return self.search_batch(
+            [query], k=k, filters=filter_conditions,
+            query_embeddings=None if query_embedding is None else [query_embedding]
+        )[0]
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 3,
+        filters: Union[Dict[str, Union[str, int]], List[Dict[str, Union[str, int]]]] = None,
+        query_embeddings: List = None
+    ) -> List[List[Dict]]:
+        """批量相似性搜索：所有查询一次批量编码，过滤条件相同的查询合并为一次检索
+
+        参数:
+            queries: 查询文本列表
+            k: 每个查询返回的结果数量
+            filters: 所有查询共用的过滤条件，或与queries一一对应的过滤条件列表
+            query_embeddings: 已算好的查询向量（如语义答案缓存查找时的问题向量），传入时不再编码
+        返回:
+            与queries顺序对应的结果列表，每项格式与 search 相同
+        """
+        if not queries:
+            return []
+        index = self._get_index()
+        if index is None:
+            print(f"错误：未找到{'集合 ' + COLLECTION_NAME if self.index_backend == 'chroma' else '索引 ' + self.index_path}")
+            return [[] for _ in queries]
+
+        embeddings = self.embed_queries(queries) if query_embeddings is None else list(query_embeddings)
+        if not self.hybrid:
+            return self._vector_search_batch(index, embeddings, k, filters)
+
+        bm25_index = _bm25_index_module()
+        depth = bm25_index.candidate_depth(k)
+        vector_results = self._vector_search_batch(index, embeddings, depth, filters)
+        bm25 = self._get_bm25()
+        if bm25 is None:
+            print(f"警告：未找到BM25索引 {self.bm25_path}，只使用向量检索")
+            return [results[:k] for results in vector_results]
+        keyword_results = bm25.search_batch(queries, k=depth, filters=filters)
+        return [
+            bm25_index.reciprocal_rank_fusion([vector, keyword], k)
+            for vector, keyword in zip(vector_results, keyword_results)
+        ]
+
+    def _vector_search_batch(self, index, embeddings, k, filters):
+        if self.index_backend != "chroma":
+            return index.search_batch(embeddings, k=k, filters=filters)
+
+        # 按过滤条件分组，每组只调用一次 collection.query
+        search_results = [None] * len(embeddings)
+        for key, indices in group_by_filter(filters, len(embeddings)).items():
+            # 构建查询条件
+            where_clause = json.loads(key)
+            results = index.query(
+                query_embeddings=[embeddings[i] for i in indices],
+                n_results=k,
+                where=where_clause if where_clause else None,
+                include=["documents", "metadatas", "distances"]
+            )
+            for query_index, i in enumerate(indices):
+                search_results[i] = _format_query_results(results, query_index)
+        return search_results
+
+
+_retrievers = {}
+_retrievers_lock = threading.Lock()
+_query_encoders = {}
+_query_encoders_lock = threading.Lock()  # 创建检索器时持有 _retrievers_lock，这里不能复用同一把锁
+
+def get_query_encoder(embedding_model_path: str = None) -> QueryEncoder:
+    """按嵌入模型返回进程内共享的查询编码器，首次调用时加载模型（不打开任何索引）"""
+    key = embedding_model_path or EMBEDDING_MODEL_NAME
+    with _query_encoders_lock:
+        if key not in _query_encoders:
+            _query_encoders[key] = QueryEncoder(key)
+        return _query_encoders[key]
+
+def _retriever_key(vector_db_path: str, embedding_model_path: str, index_backend: str, hybrid: bool) -> tuple:
+    return (os.path.abspath(vector_db_path), embedding_model_path or EMBEDDING_MODEL_NAME, index_backend, hybrid)
+
+def get_retriever(vector_db_path: str, embedding_model_path: str = None, query_cache_size: int = 1024,
+                  index_backend: str = "chroma", hybrid: bool = False) -> Retriever:
+    """按 (向量库路径, 嵌入模型, 索引后端, 是否混合检索) 返回进程内共享的检索器，首次调用时创建（query_cache_size 只在创建时生效）"""
+    key = _retriever_key(vector_db_path, embedding_model_path, index_backend, hybrid)
+    with _retrievers_lock:
+        if key not in _retrievers:
+            _retrievers[key] = Retriever(vector_db_path, embedding_model_path, query_cache_size, index_backend, hybrid)
+        return _retrievers[key]
+
+def peek_retriever(vector_db_path: str, embedding_model_path: str = None, index_backend: str = "chroma",
+                   hybrid: bool = False) -> Union[Retriever, None]:
+    """返回已创建的共享检索器，尚未创建时返回None（不加载模型，供统计接口使用）"""
+    with _retrievers_lock:
+        return _retrievers.get(_retriever_key(vector_db_path, embedding_model_path, index_backend, hybrid))
+
+def _format_query_results(results: Dict, query_index: int) -> List[Dict]:
+    """把 collection.query 中第 query_index 个查询的结果整理成列表"""
     search_results = []
-    for i in range(len(results["ids"][0])):
-        doc_id = results["ids"][0][i]
-        content = results["documents"][0][i]
-        metadata = results["metadatas"][0][i]
-        distance = results["distances"][0][i]
+    for i in range(len(results["ids"][query_index])):
+        content = results["documents"][query_index][i]
+        metadata = results["metadatas"][query_index][i]
+        distance = results["distances"][query_index][i]
         
         # 转换距离为相似度分数 (1 - 余弦距离)
         similarity = 1 - distance
         
         search_results.append({
             "rank": i+1,
+            "id": results["ids"][query_index][i],
             "content": content,
             "metadata": metadata,
             "similarity": float(similarity)  # 转换为Python float
@@ -182,6 +778,53 @@ def search_vector_db(
     
     return search_results
 
+def search_vector_db(
+    query: str, 
+    vector_db_path: str, 
+    k: int = 3,
+    filter_conditions: Dict[str, Union[str, int]] = None,
+    embedding_model_path: str = None,  # 添加新参数
+    index_backend: str = "chroma",
+    hybrid: bool = False
+) -> List[Dict]:
+    """在向量数据库中执行相似性搜索
+    
+    参数:
+        query: 查询文本
+        vector_db_path: 向量数据库路径
+        k: 返回的最相似结果数量
+        filter_conditions: 元数据过滤条件
+        embedding_model_path: 嵌入模型路径（可选），指向ONNX导出目录时使用量化编码器
+        index_backend: 索引后端，chroma / flat / faiss
+        hybrid: 是否与BM25关键词检索做倒数排名融合
+    """
+    # 复用进程内的检索器，不再每次查询都重新打开数据库和加载嵌入模型
+    retriever = get_retriever(vector_db_path, embedding_model_path, index_backend=index_backend, hybrid=hybrid)
+    return retriever.search(query, k=k, filter_conditions=filter_conditions)
+
+def search_vector_db_batch(
+    queries: List[str],
+    vector_db_path: str,
+    k: int = 3,
+    filters: Union[Dict[str, Union[str, int]], List[Dict[str, Union[str, int]]]] = None,
+    embedding_model_path: str = None,
+    index_backend: str = "chroma",
+    hybrid: bool = False
+) -> List[List[Dict]]:
+    """批量执行相似性搜索，一次编码所有查询，返回与queries对应的结果列表
+    
+    参数:
+        queries: 查询文本列表
+        vector_db_path: 向量数据库路径
+        k: 每个查询返回的最相似结果数量
+        filters: 共用的元数据过滤条件，或每个查询各自的过滤条件列表
+        embedding_model_path: 嵌入模型路径（可选），指向ONNX导出目录时使用量化编码器
+        index_backend: 索引后端，chroma / flat / faiss
+        hybrid: 是否与BM25关键词检索做倒数排名融合
+    """
+    retriever = get_retriever(vector_db_path, embedding_model_path, index_backend=index_backend, hybrid=hybrid)
+    return retriever.search_batch(queries, k=k, filters=filters)
+
 def interactive_search(vector_db_path: str) -> None:
     """提供交互式搜索界面（显示完整内容和相似度）"""
     print("\n=== 法律文档交互式搜索 ===")
@@ -269,22 +912,37 @@ def main_menu():
         print("\n=== 法律文档向量数据库系统 ===")
         print("1. 新建/覆盖数据库")
         print("2. 追加到现有数据库")
-        print("3. 执行搜索")
-        print("4. 退出系统")
+        print("3. 增量同步（只编码变化的分块，删除已不存在的分块）")
+        print("4. 执行搜索")
+        print("5. 导出NumPy平铺索引")
+        print("6. 构建BM25关键词索引")
+        print("7. 退出系统")
         
-        choice = input("请选择操作(1-4): ").strip()
+        choice = input("请选择操作(1-7): ").strip()
         
-        if choice == '1':
+        if choice in ('1', '2', '3'):
             metadata_path = input("输入元数据JSON路径(默认: ./chunk_output/民法典/metadata.json): ") \
                 or "./chunk_output/docx/民法典/metadata.json"
-            create_vector_db(metadata_path, VECTOR_DB_PATH, 'create')
-        elif choice == '2':
+            index_backend = input(f"输入索引后端({'/'.join(INDEX_BACKENDS)}，默认: chroma): ").strip() or "chroma"
+            embedding_model_path = input(f"输入嵌入模型路径(默认: {EMBEDDING_MODEL_NAME}，可填ONNX导出目录): ").strip() or None
+            mode = {'1': 'create', '2': 'append', '3': 'sync'}[choice]
+            index_options = None
+            if index_backend == "flat":
+                compression = input("输入平铺索引的向量压缩方式(float16/pca，默认: float16): ").strip() or "float16"
+                if compression == "pca":
+                    pca_dim = input("输入PCA维度(默认: 128): ").strip()
+                    index_options = {"compression": "pca", "pca_dim": int(pca_dim or 128)}
+            create_vector_db(metadata_path, VECTOR_DB_PATH, mode, index_backend, index_options,
+                             embedding_model_path=embedding_model_path)
+        elif choice == '4':
+            interactive_search(VECTOR_DB_PATH)
+        elif choice == '5':
+            export_flat_index(VECTOR_DB_PATH)
+        elif choice == '6':
             metadata_path = input("输入元数据JSON路径(默认: ./chunk_output/民法典/metadata.json): ") \
                 or "./chunk_output/docx/民法典/metadata.json"
-            create_vector_db(metadata_path, VECTOR_DB_PATH, 'append')
-        elif choice == '3':
-            interactive_search(VECTOR_DB_PATH)
-        elif choice == '4':
+            create_bm25_index(metadata_path, VECTOR_DB_PATH)
+        elif choice == '7':
             print("退出系统")
             break
         else:
@@ -29,6 +29,13 @@ LEGAL_ADVISOR_PROFILE = """
 最后总会加上一句："还有什么法律问题我可以帮您解答吗？(*^▽^*)"
 """
 
+# 所有提示共享的固定开头（角色设定 + 背景信息标题），生成端会预先计算并复用它的KV缓存
+# 在"】"之前截断：这里前后分别是汉字和标点，单独分词与在完整提示中分词的结果一致
+PROMPT_PREFIX = f"""
+{LEGAL_ADVISOR_PROFILE}
+
+【背景信息"""
+
 def construct_prompt_template(context, query):
     """构建统一提示模板"""
     return f"""
@@ -0,0 +1,127 @@
+# 基准测试脚本共用的工具：项目路径、命令行通用参数、测试问题和分块的加载、计时与分位数统计
+# 各脚本在导入项目模块之前先 from bench_utils import ...（python tests/xxx.py 运行时 tests 目录已在 sys.path 中），
+# 导入时把项目根目录和 backend 目录加入 sys.path
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+for path in (BASE_DIR, BASE_DIR / "backend"):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+CHUNKS_PATH = BASE_DIR / "my_knowledge_base" / "chunk_output" / "docx" / "民法典" / "metadata.json"
+
+# 通用命令行参数：名称 -> (参数, 默认值)
+COMMON_OPTIONS = {
+    "model": ("--model", "./model/Qwen3-0.6B"),
+    "embedding_model": ("--embedding-model", "./embedding_model/ChatLaw-Text2Vec"),
+    "vector_db": ("--vector-db", "./my_knowledge_base/vector_db/chroma_data"),
+}
+
+# (问题, 相关法条) 样例，生成类测试用它们拼出prompt
+SAMPLES = [
+    ("离婚时夫妻共同财产怎么分割？", "第一千零八十七条　离婚时，夫妻的共同财产由双方协议处理；协议不成的，由人民法院根据财产的具体情况，按照照顾子女、女方和无过错方权益的原则判决。"),
+    ("遗嘱需要满足什么形式？", "第一千一百三十四条　自书遗嘱由遗嘱人亲笔书写，签名，注明年、月、日。"),
+    ("租房合同到期后继续住怎么算？", "第七百三十四条　租赁期限届满，承租人继续使用租赁物，出租人没有提出异议的，原租赁合同继续有效，但是租赁期限为不定期。"),
+    ("邻居装修影响采光怎么办？", "第二百九十三条　建造建筑物，不得违反国家有关工程建设标准，不得妨碍相邻建筑物的通风、采光和日照。"),
+]
+
+# 不带上下文的短问题，检索和并发测试使用
+QUERIES = [question for question, _ in SAMPLES] + [
+    "合同无效的情形有哪些？",
+    "未成年人的监护人有哪些职责？",
+    "借钱不还可以起诉吗？",
+    "交通事故的赔偿责任怎么划分？",
+]
+
+
+def base_parser(*options):
+    """带通用参数的命令行解析器，options 取 COMMON_OPTIONS 中的名称"""
+    parser = argparse.ArgumentParser()
+    for option in options:
+        flag, default = COMMON_OPTIONS[option]
+        parser.add_argument(flag, default=default)
+    return parser
+
+
+def sample_context(context):
+    """与向量路由相同的背景信息标题"""
+    return f"检索到的相关法律条文:\n\n{context}"
+
+
+def load_chunk_texts(limit=None):
+    """知识库分块的文本"""
+    with open(CHUNKS_PATH, 'r', encoding='utf-8') as f:
+        texts = [chunk["text"] for chunk in json.load(f)]
+    return texts[:limit] if limit else texts
+
+
+def load_article_queries(limit=None, texts=None):
+    """各分块中法条的首句（去掉条文编号，截取40字）当作查询；给定limit时在全部句子中均匀取样"""
+    sentences = [
+        line.split('　', 1)[-1][:40]
+        for text in (texts if texts is not None else load_chunk_texts())
+        for line in text.split('\n') if line.startswith('第')
+    ]
+    if not limit:
+        return sentences
+    return sentences[::max(1, len(sentences) // limit)][:limit]
+
+
+def chat_text(tokenizer, prompt):
+    """与线上相同的对话模板（关闭思考模式）"""
+    return tokenizer.apply_chat_template(
+        [{"role": "user", "content": prompt}],
+        tokenize=False,
+        add_generation_prompt=True,
+        enable_thinking=False
+    )
+
+
+def load_generation_model(model_path, **model_kwargs):
+    """加载生成模型和分词器，返回 (tokenizer, model)"""
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model_kwargs = {"torch_dtype": "auto", "device_map": "auto", **model_kwargs}
+    model = AutoModelForCausalLM.from_pretrained(model_path, **model_kwargs)
+    return tokenizer, model
+
+
+def production_generate_kwargs(tokenizer):
+    """线上直连生成传给 model.generate 的额外参数：不覆盖模型自带的生成配置（Qwen3默认采样），只加回答的停止串"""
+    from legal_advisor import ANSWER_STOP_STRINGS
+    return {"stop_strings": list(ANSWER_STOP_STRINGS), "tokenizer": tokenizer}
+
+
+def timed(function, inputs):
+    """逐个输入调用function，返回 (结果列表, 每次耗时ms列表)"""
+    results, latencies = [], []
+    for value in inputs:
+        start = time.perf_counter()
+        results.append(function(value))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, latencies
+
+
+def median_ms(function, inputs, warmup=True):
+    """逐个输入调用function的耗时中位数(ms)，默认先用第一个输入预热一次"""
+    if warmup:
+        function(inputs[0])
+    return statistics.median(timed(function, inputs)[1])
+
+
+def percentile(values, p):
+    """p分位数，取排序后最接近该位置的样本值"""
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def latency_summary(latencies_ms):
+    return (f"平均 {statistics.mean(latencies_ms):.1f}ms | 中位数 {statistics.median(latencies_ms):.1f}ms | "
+            f"p95 {percentile(latencies_ms, 95):.1f}ms | 最大 {max(latencies_ms):.1f}ms")
@@ -0,0 +1,43 @@
+# 批量向量检索与逐条检索的耗时对比
+# 用法（在项目根目录运行）: python tests/benchmark_batch_search.py --vector-db ./my_knowledge_base/vector_db/chroma_data --embedding-model ./embedding_model/ChatLaw-Text2Vec
+# 查询向量缓存关闭，两种方式都完整经过嵌入模型；同时校验两种方式返回的结果一致
+
+import time
+
+from bench_utils import base_parser, load_article_queries
+from my_knowledge_base.vector_db import Retriever
+
+
+def main():
+    parser = base_parser("vector_db", "embedding_model")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 32, 128])
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    # 用各分块中的法条句子当作查询
+    sentences = load_article_queries()
+
+    retriever = Retriever(args.vector_db, args.embedding_model, query_cache_size=0)
+    retriever.search(sentences[0], k=args.k)  # 预热
+
+    for batch_size in args.batch_sizes:
+        queries = sentences[:batch_size]
+
+        start = time.perf_counter()
+        single = [retriever.search(query, k=args.k) for query in queries]
+        single_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batched = retriever.search_batch(queries, k=args.k)
+        batch_time = time.perf_counter() - start
+
+        same = all(
+            [r["metadata"]["chunk_path"] for r in a] == [r["metadata"]["chunk_path"] for r in b]
+            for a, b in zip(single, batched)
+        )
+        print(f"{len(queries):>4} 个查询 | 逐条: {single_time * 1000:.1f}ms | 批量: {batch_time * 1000:.1f}ms | "
+              f"加速 {single_time / batch_time:.2f}x | 结果一致: {same}")
+
+
+if __name__ == "__main__":
+    main()
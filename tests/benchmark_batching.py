@@ -0,0 +1,67 @@
+# 连续批处理吞吐测试
+# 用法（在项目根目录运行）: python tests/benchmark_batching.py --model ./model/Qwen3-0.6B
+# 对比逐请求 model.generate 与 GenerationScheduler 在不同并发数下的总吞吐(tokens/s)
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_utils import QUERIES, base_parser, chat_text, load_generation_model
+from generation_scheduler import GenerationScheduler
+
+
+def build_inputs(tokenizer, question, device):
+    return tokenizer([chat_text(tokenizer, question)], return_tensors="pt").to(device)
+
+
+def run_baseline(model, tokenizer, concurrency, max_new_tokens):
+    """每个请求各自调用 model.generate（当前/ask的行为）"""
+    def worker(i):
+        inputs = build_inputs(tokenizer, QUERIES[i % len(QUERIES)], model.device)
+        output = model.generate(**inputs, max_new_tokens=max_new_tokens)
+        return output.shape[1] - inputs.input_ids.shape[1]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return sum(pool.map(worker, range(concurrency)))
+
+
+def run_scheduler(scheduler, model, tokenizer, concurrency, max_new_tokens):
+    """所有请求提交到同一个连续批处理调度器"""
+    requests = [
+        scheduler.submit(
+            build_inputs(tokenizer, QUERIES[i % len(QUERIES)], model.device).input_ids,
+            max_new_tokens
+        )
+        for i in range(concurrency)
+    ]
+    return sum(len(request.result()) for request in requests)
+
+
+def main():
+    parser = base_parser("model")
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    tokenizer, model = load_generation_model(args.model)
+    scheduler = GenerationScheduler(model, tokenizer, max_batch_size=max(args.concurrency))
+
+    # 预热一次，避免首次调用的初始化开销影响结果
+    run_baseline(model, tokenizer, 1, 8)
+
+    print(f"{'并发数':>6} | {'逐请求 tokens/s':>16} | {'连续批处理 tokens/s':>20} | {'加速比':>6}")
+    for concurrency in args.concurrency:
+        start = time.perf_counter()
+        tokens = run_baseline(model, tokenizer, concurrency, args.max_new_tokens)
+        baseline_tps = tokens / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        tokens = run_scheduler(scheduler, model, tokenizer, concurrency, args.max_new_tokens)
+        batched_tps = tokens / (time.perf_counter() - start)
+
+        print(f"{concurrency:>6} | {baseline_tps:>16.2f} | {batched_tps:>20.2f} | {batched_tps / baseline_tps:>5.2f}x")
+
+    scheduler.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# 平铺索引向量压缩方式对比：float16 / PCA降维，有无全精度重打分
+# 用法（在项目根目录运行）: python tests/benchmark_compression.py --vector-db ./my_knowledge_base/vector_db/chroma_data --pca-dims 64 128 256
+# 向量取自Chroma集合中的原始float32向量，recall@k 以float32精确检索为基准；
+# 报告每百万分块的常驻向量内存（全精度向量只在磁盘上，重打分时读取候选行）和单查询延迟
+
+import tempfile
+
+from bench_utils import base_parser
+import numpy as np
+import chromadb
+from my_knowledge_base.vector_db import COLLECTION_NAME
+from my_knowledge_base.flat_index import FlatIndex, compression_report, normalize_rows, write_flat_index
+
+
+def main():
+    parser = base_parser("vector_db")
+    parser.add_argument("--pca-dims", type=int, nargs="+", default=[64, 128, 256])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    collection = chromadb.PersistentClient(path=args.vector_db).get_collection(name=COLLECTION_NAME)
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    embeddings = normalize_rows(np.asarray(data["embeddings"], dtype=np.float32))
+    print(f"文档数: {len(embeddings)}, 向量维度: {embeddings.shape[1]}")
+
+    configs = [
+        {"compression": "float16", "rescore": False},
+        {"compression": "float16", "rescore": True},
+    ] + [{"compression": "pca", "pca_dim": dim} for dim in args.pca_dims]
+
+    rows = []
+    for options in configs:
+        with tempfile.TemporaryDirectory() as tmp:
+            print(f"\n{options}")
+            write_flat_index(tmp, data["ids"], embeddings, data["documents"], data["metadatas"], **options)
+            index = FlatIndex(tmp)
+            positions = {doc_id: position for position, doc_id in enumerate(data["ids"])}
+            reference = embeddings[[positions[doc_id] for doc_id in index.store.ids]]
+            report = compression_report(index, reference, k=args.k, num_queries=args.queries)
+            rows.append((options, report))
+
+    print(f"\n{'配置':<40} | recall@{args.k} | 常驻MB/百万 | 延迟ms")
+    for options, report in rows:
+        label = ", ".join(f"{key}={value}" for key, value in options.items())
+        print(f"{label:<40} | {report[f'recall@{args.k}']:8.4f} | {report['resident_mb_per_million']:10.0f} | "
+              f"{report['median_latency_ms']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
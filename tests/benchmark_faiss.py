@@ -0,0 +1,120 @@
+# FAISS IVF-Flat / IVF-PQ 与精确检索的对比：构建耗时、内存占用、查询延迟、recall@k
+# 用法（在项目根目录运行）: python tests/benchmark_faiss.py --vector-db ./my_knowledge_base/vector_db/chroma_data --scale 1000000
+# 向量取自Chroma集合；--scale 大于文档数时，在真实向量上加噪声扩充到指定规模，模拟接入更多法规后的体量。
+# 查询取库中向量加小扰动，基准为 IndexFlatIP 的精确top-k。
+# 最后用真实分块和元数据写出FAISS索引目录，检查按 section0/section1 过滤的每个分区都返回 min(k, 分区大小) 条结果
+
+import os
+import tempfile
+import time
+
+from bench_utils import base_parser
+import faiss
+import numpy as np
+import psutil
+import chromadb
+from my_knowledge_base.vector_db import COLLECTION_NAME
+from my_knowledge_base.flat_index import normalize_rows
+from my_knowledge_base.faiss_index import FaissIndex, build_faiss_index, make_faiss_index, default_nlist
+
+
+def load_vectors(vector_db_path, scale, seed=0):
+    client = chromadb.PersistentClient(path=vector_db_path)
+    collection = client.get_collection(name=COLLECTION_NAME)
+    vectors = normalize_rows(collection.get(include=["embeddings"])["embeddings"])
+    if scale and scale > len(vectors):
+        rng = np.random.default_rng(seed)
+        base = vectors[rng.integers(0, len(vectors), scale)]
+        vectors = normalize_rows(base + rng.normal(scale=0.05, size=base.shape).astype(np.float32))
+    return vectors
+
+
+def rss_mb():
+    return psutil.Process().memory_info().rss / 1024 / 1024
+
+
+def index_size_mb(index):
+    """序列化后的大小，近似常驻内存占用"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index")
+        faiss.write_index(index, path)
+        return os.path.getsize(path) / 1024 / 1024
+
+
+def evaluate(name, index, queries, exact, k, nprobe=None):
+    if nprobe is not None:
+        index.nprobe = nprobe
+    index.search(queries[:10], k)  # 预热
+    start = time.perf_counter()
+    labels = np.stack([index.search(query[None, :], k)[1][0] for query in queries])
+    latency_ms = (time.perf_counter() - start) / len(queries) * 1000
+    recall = np.mean([len(set(found) & set(truth)) / k for found, truth in zip(labels, exact)])
+    suffix = f" nprobe={nprobe}" if nprobe is not None else ""
+    print(f"{name + suffix:<22} | {latency_ms:8.3f}ms/查询 | recall@{k} {recall:.4f}")
+
+
+def check_filtered(vector_db_path, k, fields=("section0", "section1")):
+    """每个分区取一条查询，过滤检索的结果数应为 min(k, 分区大小)"""
+    collection = chromadb.PersistentClient(path=vector_db_path).get_collection(name=COLLECTION_NAME)
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    vectors = normalize_rows(data["embeddings"])
+    rng = np.random.default_rng(2)
+    for index_type in ("ivf_flat", "ivf_pq"):
+        with tempfile.TemporaryDirectory() as tmp:
+            build_faiss_index(tmp, data["ids"], vectors, data["documents"], data["metadatas"], index_type=index_type)
+            index = FaissIndex(tmp)
+            checked = 0
+            for field in fields:
+                for value in index.store.partitions[field]:
+                    if not value:
+                        continue
+                    filter_conditions = {field: value}
+                    size = len(index.store.rows(filter_conditions))
+                    query = vectors[rng.integers(0, len(vectors))]
+                    found = index.search_batch([query], k=k, filters=filter_conditions)[0]
+                    assert len(found) == min(k, size), f"{index_type} {field}={value}: {len(found)} 条，应为 {min(k, size)}"
+                    assert all(result["metadata"][field] == value for result in found)
+                    checked += 1
+            print(f"{index_type}: {checked} 个分区的过滤检索结果数均为 min({k}, 分区大小)")
+
+
+def main():
+    parser = base_parser("vector_db")
+    parser.add_argument("--scale", type=int, default=0, help="扩充到的向量数，0表示只用真实向量")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.vector_db, args.scale)
+    num_vectors, dim = vectors.shape
+    rng = np.random.default_rng(1)
+    queries = normalize_rows(
+        vectors[rng.integers(0, num_vectors, args.queries)]
+        + rng.normal(scale=0.05, size=(args.queries, dim)).astype(np.float32)
+    )
+    print(f"向量数: {num_vectors}, 维度: {dim}, nlist: {default_nlist(num_vectors)}")
+
+    exact_index = faiss.IndexFlatIP(dim)
+    exact_index.add(vectors)
+    exact = exact_index.search(queries, args.k)[1]
+    print(f"{'精确检索(IndexFlatIP)':<22} | 内存 {index_size_mb(exact_index):.1f}MB")
+    evaluate("精确检索", exact_index, queries, exact, args.k)
+
+    for index_type in ("ivf_flat", "ivf_pq"):
+        before = rss_mb()
+        start = time.perf_counter()
+        index = make_faiss_index(vectors, index_type)
+        build_time = time.perf_counter() - start
+        size_mb = index_size_mb(index)
+        print(f"\n{index_type}: 构建 {build_time:.2f}s | 索引大小 {size_mb:.1f}MB "
+              f"(每百万向量约 {size_mb / num_vectors * 1e6:.0f}MB) | 进程内存增加 {rss_mb() - before:.1f}MB")
+        for nprobe in args.nprobe:
+            evaluate(index_type, index, queries, exact, args.k, nprobe)
+
+    print()
+    check_filtered(args.vector_db, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# NumPy平铺索引与Chroma的检索延迟和召回率对比
+# 用法（在项目根目录运行）: python tests/benchmark_flat_index.py --vector-db ./my_knowledge_base/vector_db/chroma_data --embedding-model ./embedding_model/ChatLaw-Text2Vec
+# 平铺索引不存在时先从Chroma集合导出；查询向量预先算好，只比较索引检索本身的耗时。
+# 召回率以Chroma中原始float32向量的精确检索为基准：recall@k = 与精确top-k重合的比例
+
+import os
+import statistics
+
+from bench_utils import base_parser, load_article_queries, timed
+import numpy as np
+from my_knowledge_base.vector_db import Retriever, export_flat_index, get_index_path
+from my_knowledge_base.flat_index import FlatIndex, normalize_rows, top_k
+
+
+def recall(results, exact_ids, k):
+    hits = [len({r["metadata"]["chunk_path"] for r in result[:k]} & truth) / len(truth)
+            for result, truth in zip(results, exact_ids) if truth]
+    return sum(hits) / len(hits)
+
+
+def main():
+    parser = base_parser("vector_db", "embedding_model")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--filter-section", default="第五编　婚姻家庭", help="过滤测试使用的 section0 取值")
+    args = parser.parse_args()
+
+    index_dir = get_index_path(args.vector_db, "flat")
+    if not os.path.exists(index_dir):
+        export_flat_index(args.vector_db, embedding_model_path=args.embedding_model)
+
+    chroma = Retriever(args.vector_db, args.embedding_model, query_cache_size=0)
+    collection = chroma._get_index()
+    flat = FlatIndex(index_dir)
+    print(f"文档数: {len(flat)}, 向量维度: {flat.embeddings.shape[1]}")
+
+    queries = load_article_queries(args.queries)
+    embeddings = chroma.embed(queries)
+
+    # 以Chroma中保存的原始float32向量做精确检索作为基准
+    stored = collection.get(ids=flat.store.ids, include=["embeddings"])
+    order = {doc_id: i for i, doc_id in enumerate(stored["ids"])}
+    matrix = normalize_rows(np.asarray(stored["embeddings"])[[order[doc_id] for doc_id in flat.store.ids]])
+    chunk_paths = [metadata["chunk_path"] for metadata in flat.store.metadatas]
+
+    for filter_conditions in (None, {"section0": args.filter_section}):
+        if filter_conditions:
+            rows = flat.store.rows(filter_conditions)
+        else:
+            rows = np.arange(len(flat))
+        exact = top_k(normalize_rows(embeddings) @ matrix[rows].T, args.k)
+        exact_ids = [{chunk_paths[rows[column]] for column in best} for best in exact]
+
+        def chroma_search(embedding):
+            result = collection.query(
+                query_embeddings=[embedding],
+                n_results=args.k,
+                where=filter_conditions,
+                include=["metadatas"]
+            )
+            return [{"metadata": metadata} for metadata in result["metadatas"][0]]
+
+        def flat_search(embedding):
+            return flat.search_batch([embedding], k=args.k, filters=filter_conditions)[0]
+
+        chroma_results, chroma_ms = timed(chroma_search, embeddings)
+        flat_results, flat_ms = timed(flat_search, embeddings)
+        _, batch_ms = timed(lambda _: flat.search_batch(embeddings, k=args.k, filters=filter_conditions), range(3))
+
+        label = f"过滤 section0={args.filter_section}（{len(rows)} 个文档）" if filter_conditions else "不过滤"
+        print(f"\n[{label}]")
+        print(f"Chroma   : 平均 {statistics.mean(chroma_ms):.3f}ms/查询 | recall@{args.k} {recall(chroma_results, exact_ids, args.k):.4f}")
+        print(f"平铺索引 : 平均 {statistics.mean(flat_ms):.3f}ms/查询 | recall@{args.k} {recall(flat_results, exact_ids, args.k):.4f}")
+        print(f"平铺索引批量 {len(queries)} 个查询: {min(batch_ms):.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# BM25 / 向量 / 混合检索的延迟与命中对比
+# 用法（在项目根目录运行）: python tests/benchmark_hybrid.py --vector-db ./my_knowledge_base/vector_db/chroma_data --embedding-model ./embedding_model/ChatLaw-Text2Vec
+# BM25索引不存在时先从分块元数据构建；命中以 evaluate_rag.py 默认测试集的 expected_sections 为准
+
+import os
+import statistics
+import time
+
+from bench_utils import CHUNKS_PATH, base_parser
+from my_knowledge_base.vector_db import Retriever, create_bm25_index
+from my_knowledge_base.bm25_index import BM25Index, BM25_INDEX_DIR
+from my_knowledge_base.evaluate_rag import DEFAULT_GOLDEN_SET
+
+
+def section_hit(results, expected_sections):
+    """结果中是否有分块属于期望的编（"合同编" 匹配 section0 "第三编　合同"）"""
+    names = [section.rstrip("编") for section in expected_sections]
+    return any(name in result["metadata"].get("section0", "") for result in results for name in names)
+
+
+def run(name, search, k):
+    latencies, hits = [], 0
+    for item in DEFAULT_GOLDEN_SET:
+        start = time.perf_counter()
+        results = search(item["query"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += section_hit(results[:k], item["expected_sections"])
+    print(f"{name:<6} | 中位数 {statistics.median(latencies):7.2f}ms | 最大 {max(latencies):7.2f}ms | "
+          f"编命中 {hits}/{len(DEFAULT_GOLDEN_SET)}")
+
+
+def main():
+    parser = base_parser("vector_db", "embedding_model")
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    bm25_dir = os.path.join(args.vector_db, BM25_INDEX_DIR)
+    if not os.path.exists(bm25_dir):
+        create_bm25_index(str(CHUNKS_PATH), args.vector_db)
+
+    start = time.perf_counter()
+    bm25 = BM25Index(bm25_dir)
+    print(f"BM25索引加载: {(time.perf_counter() - start) * 1000:.1f}ms（{len(bm25)} 个文档，{len(bm25.vocab)} 个词）")
+
+    vector = Retriever(args.vector_db, args.embedding_model)
+    hybrid = Retriever(args.vector_db, args.embedding_model, hybrid=True)
+    for item in DEFAULT_GOLDEN_SET:
+        # 预热查询向量缓存，下面的向量/混合检索延迟只包含检索和融合本身
+        vector.search(item["query"], k=args.k)
+        hybrid.search(item["query"], k=args.k)
+
+    run("BM25", lambda query: bm25.search_batch([query], k=args.k)[0], args.k)
+    run("向量", lambda query: vector.search(query, k=args.k), args.k)
+    run("混合", lambda query: hybrid.search(query, k=args.k), args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# SentenceTransformer 与 ONNX（fp32 / int8）查询编码器的延迟和一致性对比
+# 用法（在项目根目录运行）: python tests/benchmark_onnx_encoder.py --model ./embedding_model/ChatLaw-Text2Vec --onnx ./embedding_model/ChatLaw-Text2Vec-onnx
+# ONNX目录不存在时先导出；测试文本取自民法典分块，分别测 batch=1（在线查询）和 batch=64（建库）的编码耗时
+
+import os
+import statistics
+
+from bench_utils import COMMON_OPTIONS, base_parser, load_article_queries, load_chunk_texts, timed
+from sentence_transformers import SentenceTransformer
+from my_knowledge_base.onnx_encoder import (
+    OnnxEncoder, export_onnx_encoder, is_onnx_encoder, FP32_MODEL_FILE, INT8_MODEL_FILE, MIN_COSINE_SIMILARITY
+)
+
+
+def time_encode(encode, batches, repeat):
+    encode(batches[0])  # 预热
+    return timed(encode, batches * repeat)[1]
+
+
+def main():
+    parser = base_parser()
+    parser.add_argument("--model", default=COMMON_OPTIONS["embedding_model"][1])
+    parser.add_argument("--onnx", default="./embedding_model/ChatLaw-Text2Vec-onnx")
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if not is_onnx_encoder(args.onnx):
+        export_onnx_encoder(args.model, args.onnx)
+
+    texts = load_chunk_texts(args.texts)
+    # 条文首句作为短查询
+    queries = load_article_queries(texts=texts) or texts
+    model = SentenceTransformer(args.model, device="cpu")
+    encoders = {"SentenceTransformer": model}
+    for name, model_file in (("ONNX fp32", FP32_MODEL_FILE), ("ONNX int8", INT8_MODEL_FILE)):
+        if os.path.exists(os.path.join(args.onnx, model_file)):
+            encoders[name] = OnnxEncoder(args.onnx, model_file=model_file)
+
+    reference = model.encode(texts, normalize_embeddings=True)
+    print(f"文本数: {len(texts)}，查询数: {len(queries)}")
+    for name, encoder in encoders.items():
+        embeddings = encoder.encode(texts, normalize_embeddings=True)
+        similarities = (reference * embeddings).sum(axis=1)
+        status = "通过" if similarities.min() >= MIN_COSINE_SIMILARITY else "未通过"
+        print(f"{name:<20} | 余弦相似度 最小 {similarities.min():.5f} 平均 {similarities.mean():.5f} ({status})")
+
+    for batch_size, inputs in ((1, queries), (64, texts)):
+        batches = [inputs[i:i + batch_size] for i in range(0, len(inputs), batch_size)]
+        if batch_size == 1:
+            batches = batches[:64]
+        print(f"\nbatch={batch_size}")
+        for name, encoder in encoders.items():
+            latencies = time_encode(
+                lambda batch: encoder.encode(batch, batch_size=batch_size, normalize_embeddings=True),
+                batches, args.repeat
+            )
+            median = statistics.median(latencies)
+            print(f"{name:<20} | 中位数 {median:8.2f}ms/批 | {batch_size / median * 1000:8.1f} 条/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# 分区子索引的过滤检索延迟：按 section0/section1 分区扫描连续行 vs 按掩码取行 vs 不过滤（以及Chroma where过滤）
+# 用法（在项目根目录运行）: python tests/benchmark_partitions.py --vector-db ./my_knowledge_base/vector_db/chroma_data --scale 1 10 100
+# 平铺索引不存在时先从Chroma集合导出；--scale 把语料复制N份（向量加小扰动）写入临时平铺索引，分区大小随之成倍增加。
+# 查询取库中向量加小扰动，不需要加载嵌入模型
+
+import os
+import tempfile
+
+from bench_utils import base_parser, median_ms
+import numpy as np
+import chromadb
+from my_knowledge_base.vector_db import COLLECTION_NAME, export_flat_index, get_index_path
+from my_knowledge_base.flat_index import FlatIndex, normalize_rows, top_k, write_flat_index
+
+
+def build_scaled_index(flat, scale, index_dir, seed=0):
+    """语料复制scale份写成新的平铺索引，每份向量加不同的扰动"""
+    rng = np.random.default_rng(seed)
+    rows = np.tile(np.arange(len(flat)), scale)
+    vectors = flat.vectors()[rows]
+    if scale > 1:
+        vectors = normalize_rows(vectors + rng.normal(scale=0.05, size=vectors.shape).astype(np.float32))
+    write_flat_index(
+        index_dir,
+        [f"{flat.store.ids[row]}-{copy}" for copy in range(scale) for row in range(len(flat))],
+        vectors,
+        [flat.store.document(row) for row in rows],
+        [flat.store.metadatas[row] for row in rows]
+    )
+    return FlatIndex(index_dir)
+
+
+def gather_search(index, query, k, filter_conditions):
+    """分区之前的做法：按掩码得到行号，逐行取出向量后计算"""
+    rows = index.store.rows(filter_conditions)
+    scores = index.scores(normalize_rows(query), rows)
+    return [float(scores[0, column]) for column in top_k(scores, k)[0]]
+
+
+def run(index, queries, k, fields, collection=None):
+    print(f"\n文档数: {len(index)}")
+    unfiltered = median_ms(lambda query: index.search_batch([query], k=k), queries)
+    print(f"{'不过滤':<28} | {len(index):>8} 行 | 中位数 {unfiltered:7.3f}ms")
+    for field in fields:
+        partitions = sorted(
+            ((value, sum(end - start for start, end in runs)) for value, runs in index.store.partitions[field].items() if value),
+            key=lambda item: item[1]
+        )
+        if not partitions:
+            print(f"{field} 没有非空取值，跳过")
+            continue
+        # 取最小、中位、最大三个分区
+        for value, size in dict.fromkeys([partitions[0], partitions[len(partitions) // 2], partitions[-1]]):
+            filter_conditions = {field: value}
+            partitioned = median_ms(lambda query: index.search_batch([query], k=k, filters=filter_conditions), queries)
+            gathered = median_ms(lambda query: gather_search(index, query, k, filter_conditions), queries)
+            line = (f"{field}={value[:12]:<20} | {size:>8} 行 | 分区 {partitioned:7.3f}ms | "
+                    f"按掩码取行 {gathered:7.3f}ms")
+            if collection is not None:
+                chroma_ms = median_ms(
+                    lambda query: collection.query(query_embeddings=[query.tolist()], n_results=k,
+                                                   where=filter_conditions, include=["metadatas"]),
+                    queries
+                )
+                line += f" | Chroma where {chroma_ms:7.3f}ms"
+            print(line)
+
+            # 分区扫描与按掩码取行的相似度应完全一致
+            found = [result["similarity"] for result in index.search_batch([queries[0]], k=k, filters=filter_conditions)[0]]
+            assert np.allclose(found, gather_search(index, queries[0], k, filter_conditions), atol=1e-6)
+
+
+def main():
+    parser = base_parser("vector_db")
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--fields", nargs="+", default=["section0", "section1"])
+    args = parser.parse_args()
+
+    index_dir = get_index_path(args.vector_db, "flat")
+    if not os.path.exists(index_dir):
+        export_flat_index(args.vector_db)
+    base = FlatIndex(index_dir)
+    rng = np.random.default_rng(1)
+    vectors = base.vectors()
+    queries = normalize_rows(
+        vectors[rng.integers(0, len(base), args.queries)]
+        + rng.normal(scale=0.05, size=(args.queries, vectors.shape[1])).astype(np.float32)
+    )
+
+    collection = chromadb.PersistentClient(path=args.vector_db).get_collection(name=COLLECTION_NAME)
+    for scale in args.scale:
+        with tempfile.TemporaryDirectory() as tmp:
+            index = build_scaled_index(base, scale, tmp)
+            run(index, queries, args.k, args.fields, collection if scale == 1 else None)
+
+
+if __name__ == "__main__":
+    main()
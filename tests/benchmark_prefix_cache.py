@@ -0,0 +1,59 @@
+# 人设前缀KV缓存的prefill耗时对比
+# 用法（在项目根目录运行）: python tests/benchmark_prefix_cache.py --model ./model/Qwen3-0.6B
+
+import time
+
+from bench_utils import SAMPLES, base_parser, chat_text, load_generation_model, sample_context
+import torch
+from transformers import DynamicCache
+from prompt_templates import construct_prompt_template, PROMPT_PREFIX
+from prefix_cache import PrefixKVCache
+
+
+def sync(device):
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+
+
+@torch.no_grad()
+def main():
+    parser = base_parser("model")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    tokenizer, model = load_generation_model(args.model)
+
+    text = chat_text(tokenizer, construct_prompt_template("", ""))
+    prefix_text = text[:text.index(PROMPT_PREFIX) + len(PROMPT_PREFIX)]
+    prefix_cache = PrefixKVCache(model, tokenizer, prefix_text)
+    print(f"前缀长度: {len(prefix_cache)} tokens")
+
+    full_times, cached_times = [], []
+    for _ in range(args.runs):
+        for question, context in SAMPLES:
+            input_ids = tokenizer(
+                [chat_text(tokenizer, construct_prompt_template(sample_context(context), question))],
+                return_tensors="pt"
+            ).input_ids.to(model.device)
+            assert prefix_cache.matches(input_ids), "prompt的分词结果与缓存前缀不一致"
+
+            sync(model.device)
+            start = time.perf_counter()
+            model(input_ids=input_ids, past_key_values=DynamicCache(), use_cache=True)
+            sync(model.device)
+            full_times.append(time.perf_counter() - start)
+
+            sync(model.device)
+            start = time.perf_counter()
+            cache = prefix_cache.get(input_ids)
+            model(input_ids=input_ids[:, len(prefix_cache):], past_key_values=cache, use_cache=True)
+            sync(model.device)
+            cached_times.append(time.perf_counter() - start)
+
+    full_ms = sum(full_times) / len(full_times) * 1000
+    cached_ms = sum(cached_times) / len(cached_times) * 1000
+    print(f"完整prefill: {full_ms:.2f}ms | 复用前缀缓存(含拷贝): {cached_ms:.2f}ms | 节省: {full_ms - cached_ms:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
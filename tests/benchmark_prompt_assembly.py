@@ -0,0 +1,49 @@
+# 预分词提示拼装的CPU耗时对比
+# 用法（在项目根目录运行）: python tests/benchmark_prompt_assembly.py --model ./model/Qwen3-0.6B
+# 以知识库分块拼出长背景信息，对比 套模板+整体分词 与 PromptAssembler 的每请求耗时，并校验token完全一致
+
+import time
+
+from bench_utils import base_parser, chat_text, load_chunk_texts, sample_context
+from transformers import AutoTokenizer
+from prompt_templates import construct_prompt_template
+from prompt_assembler import PromptAssembler
+
+
+def full_encode(tokenizer, prompt):
+    return tokenizer([chat_text(tokenizer, prompt)], return_tensors="pt")
+
+
+def main():
+    parser = base_parser("model")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1, 3, 8])
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    assembler = PromptAssembler(tokenizer)
+    chunks = load_chunk_texts()
+
+    for num_chunks in args.chunks:
+        context = sample_context("\n\n".join(chunks[10:10 + num_chunks]))
+        prompt = construct_prompt_template(context, "离婚时夫妻共同财产怎么分割？")
+
+        expected = full_encode(tokenizer, prompt).input_ids[0].tolist()
+        assert assembler.encode(prompt).input_ids[0].tolist() == expected, "拼装结果与完整分词不一致"
+
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            full_encode(tokenizer, prompt)
+        full_ms = (time.perf_counter() - start) / args.runs * 1000
+
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            assembler.encode(prompt)
+        assembled_ms = (time.perf_counter() - start) / args.runs * 1000
+
+        print(f"{len(expected):>5} tokens | 完整分词: {full_ms:.3f}ms | 预分词拼装: {assembled_ms:.3f}ms | "
+              f"每请求节省: {full_ms - assembled_ms:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
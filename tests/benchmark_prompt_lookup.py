@@ -0,0 +1,58 @@
+# prompt lookup（n-gram辅助解码）速度测试
+# 用法（在项目根目录运行）: python tests/benchmark_prompt_lookup.py --model ./model/Qwen3-0.6B
+# 使用 evaluate_rag.py 中的标注问题，检索向量库作为上下文，对比解码速度(tokens/s)
+# 与线上直连生成相同：使用模型自带的生成配置（Qwen3默认采样）和回答停止串，草拟token的接受率与线上一致；
+# 每种配置前重置随机种子，减少采样带来的波动
+
+import time
+
+from bench_utils import base_parser, chat_text, load_generation_model, production_generate_kwargs
+import torch
+from my_knowledge_base.evaluate_rag import DEFAULT_GOLDEN_SET
+from my_knowledge_base.vector_db import search_vector_db
+from prompt_templates import construct_prompt_template
+
+
+def decode_speed(model, tokenizer, prompts, max_new_tokens, seed=0, **generate_kwargs):
+    torch.manual_seed(seed)
+    generate_kwargs = {**production_generate_kwargs(tokenizer), **generate_kwargs}
+    tokens, elapsed = 0, 0.0
+    for text in prompts:
+        inputs = tokenizer([text], return_tensors="pt").to(model.device)
+        start = time.perf_counter()
+        output = model.generate(**inputs, max_new_tokens=max_new_tokens, **generate_kwargs)
+        elapsed += time.perf_counter() - start
+        tokens += output.shape[1] - inputs.input_ids.shape[1]
+    return tokens / elapsed
+
+
+def main():
+    parser = base_parser("model", "embedding_model", "vector_db")
+    parser.add_argument("--max-new-tokens", type=int, default=256)
+    parser.add_argument("--num-tokens", type=int, nargs="+", default=[5, 10, 20])
+    args = parser.parse_args()
+
+    tokenizer, model = load_generation_model(args.model)
+
+    prompts = []
+    for item in DEFAULT_GOLDEN_SET:
+        context = search_vector_db(
+            query=item["query"],
+            vector_db_path=args.vector_db,
+            embedding_model_path=args.embedding_model,
+            k=3
+        )
+        prompts.append(chat_text(tokenizer, construct_prompt_template(context, item["query"])))
+
+    # 预热
+    decode_speed(model, tokenizer, prompts[:1], 8)
+
+    baseline = decode_speed(model, tokenizer, prompts, args.max_new_tokens)
+    print(f"普通解码: {baseline:.2f} tokens/s")
+    for num_tokens in args.num_tokens:
+        speed = decode_speed(model, tokenizer, prompts, args.max_new_tokens, prompt_lookup_num_tokens=num_tokens)
+        print(f"prompt lookup (草拟{num_tokens}个token): {speed:.2f} tokens/s ({speed / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# 向量检索每次查询的延迟：每次重建客户端和嵌入模型 vs 常驻的 Retriever
+# 用法（在项目根目录运行）: python tests/benchmark_retriever.py --vector-db ./my_knowledge_base/vector_db/chroma_data --embedding-model ./embedding_model/ChatLaw-Text2Vec
+
+import time
+
+from bench_utils import QUERIES, base_parser, latency_summary, timed
+import chromadb
+from chromadb.utils import embedding_functions
+from my_knowledge_base.vector_db import COLLECTION_NAME, Retriever
+
+
+def search_rebuild(query, vector_db_path, embedding_model_path, k):
+    """原来的实现：每次查询都新建客户端、加载嵌入模型"""
+    client = chromadb.PersistentClient(path=vector_db_path)
+    embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
+        model_name=embedding_model_path
+    )
+    collection = client.get_collection(name=COLLECTION_NAME, embedding_function=embedding_function)
+    return collection.query(query_texts=[query], n_results=k)
+
+
+def main():
+    parser = base_parser("vector_db", "embedding_model")
+    parser.add_argument("--runs", type=int, default=4)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    queries = QUERIES * args.runs
+
+    _, latencies = timed(lambda query: search_rebuild(query, args.vector_db, args.embedding_model, args.k), queries)
+    print(f"每次重建: {latency_summary(latencies)}")
+
+    start = time.perf_counter()
+    retriever = Retriever(args.vector_db, args.embedding_model)
+    print(f"Retriever 初始化（仅一次）: {(time.perf_counter() - start) * 1000:.1f}ms")
+    _, latencies = timed(lambda query: retriever.search(query, k=args.k), queries)
+    print(f"常驻Retriever: {latency_summary(latencies)}")
+
+
+if __name__ == "__main__":
+    main()
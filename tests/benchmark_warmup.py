@@ -0,0 +1,67 @@
+# 冷启动与预热后的首个请求延迟对比
+# 用法（在项目根目录运行）: python tests/benchmark_warmup.py --model ./model/Qwen3-0.6B [--static-cache] [--compile]
+# 每种配置在独立子进程中运行，保证"首个请求"确实是进程内第一次生成
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from bench_utils import SAMPLES, base_parser, sample_context
+
+
+def run_child(args):
+    from legal_advisor import LegalAdvisor
+    from prompt_templates import construct_prompt_template
+
+    start = time.perf_counter()
+    advisor = LegalAdvisor(
+        model_path=args.model,
+        semantic_cache=False,
+        exact_cache_path=None,
+        warmup=args.warmup,
+        static_cache=args.static_cache,
+        compile_model=args.compile
+    )
+    startup = time.perf_counter() - start
+
+    question, context = SAMPLES[0]
+    prompt = construct_prompt_template(sample_context(context), question)
+    latencies = []
+    for _ in range(3):
+        start = time.perf_counter()
+        advisor._generate_response(prompt, "vector")
+        latencies.append(time.perf_counter() - start)
+    print(json.dumps({"startup": startup, "latencies": latencies}))
+
+
+def main():
+    parser = base_parser("model")
+    parser.add_argument("--static-cache", action="store_true")
+    parser.add_argument("--compile", action="store_true")
+    parser.add_argument("--warmup", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    for warmup in (False, True):
+        command = [sys.executable, __file__, "--child", "--model", args.model]
+        if warmup:
+            command.append("--warmup")
+        if args.static_cache:
+            command.append("--static-cache")
+        if args.compile:
+            command.append("--compile")
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        first, *rest = result["latencies"]
+        print(f"{'预热' if warmup else '冷启动'}: 启动 {result['startup']:.2f}s | 首个请求 {first:.2f}s | "
+              f"后续请求平均 {sum(rest) / len(rest):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
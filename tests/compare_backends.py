@@ -0,0 +1,74 @@
+# 推理后端对比：tokens/s、内存占用、与fp32基线的回答一致率
+# 用法（在项目根目录运行）:
+#   python tests/compare_backends.py --model ./model/Qwen3-0.6B --onnx ./model/Qwen3-0.6B-onnx
+
+import difflib
+import gc
+import time
+
+from bench_utils import SAMPLES, base_parser, chat_text, sample_context
+import psutil
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+from inference_backend import load_model
+from prompt_templates import construct_prompt_template
+
+
+def rss_mb():
+    return psutil.Process().memory_info().rss / 1024 / 1024
+
+
+def run_backend(backend, args, tokenizer):
+    gc.collect()
+    base_memory = rss_mb()
+    if backend == "fp32":
+        model = AutoModelForCausalLM.from_pretrained(args.model, torch_dtype=torch.float32)
+    else:
+        model = load_model(args.model, backend, args.onnx)
+    memory = rss_mb() - base_memory
+
+    answers, tokens, elapsed = [], 0, 0.0
+    for question, context in SAMPLES:
+        text = chat_text(tokenizer, construct_prompt_template(sample_context(context), question))
+        inputs = tokenizer([text], return_tensors="pt").to(model.device)
+        start = time.perf_counter()
+        # 贪心解码，保证不同后端的回答可以直接比较
+        output = model.generate(**inputs, max_new_tokens=args.max_new_tokens, do_sample=False)
+        elapsed += time.perf_counter() - start
+        new_tokens = output[0][inputs.input_ids.shape[1]:]
+        tokens += len(new_tokens)
+        answers.append(tokenizer.decode(new_tokens, skip_special_tokens=True))
+
+    del model
+    gc.collect()
+    return {"tokens_per_sec": tokens / elapsed, "memory_mb": memory, "answers": answers}
+
+
+def main():
+    parser = base_parser("model")
+    parser.add_argument("--onnx", default="./model/Qwen3-0.6B-onnx")
+    parser.add_argument("--backends", nargs="+", default=["int8", "onnx"])
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    torch.manual_seed(0)
+
+    # fp32 基线（CPU）
+    print("运行 fp32 基线...")
+    baseline = run_backend("fp32", args, tokenizer)
+
+    print(f"\n{'后端':>6} | {'tokens/s':>9} | {'内存(MB)':>9} | {'回答一致率':>9}")
+    print(f"{'fp32':>6} | {baseline['tokens_per_sec']:>9.2f} | {baseline['memory_mb']:>9.0f} | {1.0:>9.2%}")
+    for backend in args.backends:
+        print(f"运行 {backend} ...")
+        result = run_backend(backend, args, tokenizer)
+        agreement = sum(
+            difflib.SequenceMatcher(None, a, b).ratio()
+            for a, b in zip(baseline["answers"], result["answers"])
+        ) / len(SAMPLES)
+        print(f"{backend:>6} | {result['tokens_per_sec']:>9.2f} | {result['memory_mb']:>9.0f} | {agreement:>9.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# 生成副本布局扫描：副本数 × 每副本线程数
+# 用法（在项目根目录运行）: python tests/sweep_worker_pool.py --model ./model/Qwen3-0.6B --requests 32 --concurrency 8
+# 对每种布局启动一个进程池，用固定的并发请求测吞吐量和p95延迟，最后分别给出吞吐最高和p95延迟最低的布局
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_utils import SAMPLES, base_parser, percentile, sample_context
+from prompt_templates import construct_prompt_template
+from worker_pool import GenerationWorkerPool
+
+
+def default_layouts(num_cores):
+    """副本数×线程数 不超过核心数的所有2的幂组合"""
+    layouts = []
+    replicas = 1
+    while replicas <= num_cores:
+        layouts.append((replicas, num_cores // replicas))
+        replicas *= 2
+    return layouts
+
+
+def run_layout(args, replicas, threads):
+    pool = GenerationWorkerPool(
+        replicas,
+        threads,
+        advisor_kwargs={
+            "model_path": args.model,
+            "max_new_tokens": args.max_new_tokens,
+            "route_max_new_tokens": {},
+            "semantic_cache": False,
+            "exact_cache_path": None,
+            "context_token_budget": None
+        }
+    )
+    prompts = [
+        construct_prompt_template(sample_context(context), question)
+        for question, context in SAMPLES
+    ]
+
+    def one_request(i):
+        start = time.perf_counter()
+        _, stats = pool.generate(prompts[i % len(prompts)], "vector")
+        return time.perf_counter() - start, stats["generated_tokens"]
+
+    try:
+        # 每个副本先跑一个请求，排除首个请求的初始化开销
+        with ThreadPoolExecutor(max_workers=replicas) as executor:
+            list(executor.map(one_request, range(replicas)))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            results = list(executor.map(one_request, range(args.requests)))
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.shutdown()
+
+    latencies = [latency for latency, _ in results]
+    total_tokens = sum(num_tokens for _, num_tokens in results)
+    return {
+        "requests_per_s": len(results) / elapsed,
+        "tokens_per_s": total_tokens / elapsed,
+        "p95": percentile(latencies, 95)
+    }
+
+
+def main():
+    parser = base_parser("model")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--layouts", nargs="+", default=None, help="形如 2x4 的布局列表，默认按核心数自动生成")
+    args = parser.parse_args()
+
+    num_cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    if args.layouts:
+        layouts = [tuple(int(n) for n in layout.split("x")) for layout in args.layouts]
+    else:
+        layouts = default_layouts(num_cores)
+    print(f"可用核心: {num_cores}, 请求数: {args.requests}, 并发: {args.concurrency}")
+
+    summary = []
+    for replicas, threads in layouts:
+        result = run_layout(args, replicas, threads)
+        summary.append(((replicas, threads), result))
+        print(f"{replicas:>2} 副本 × {threads:>2} 线程 | {result['requests_per_s']:.2f} 请求/s | "
+              f"{result['tokens_per_s']:.1f} tokens/s | p95 {result['p95']:.2f}s")
+
+    (replicas, threads), best = max(summary, key=lambda item: item[1]["tokens_per_s"])
+    print(f"吞吐最高的布局: {replicas} 副本 × {threads} 线程 ({best['tokens_per_s']:.1f} tokens/s, p95 {best['p95']:.2f}s)")
+    (replicas, threads), fastest = min(summary, key=lambda item: item[1]["p95"])
+    print(f"p95延迟最低的布局: {replicas} 副本 × {threads} 线程 (p95 {fastest['p95']:.2f}s, {fastest['tokens_per_s']:.1f} tokens/s)")
+
+
+if __name__ == "__main__":
+    main()